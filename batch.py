@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import contextlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from config import duration
+from data.providers import ProviderFromSource
+from models.cost_matrices import CostMatrices
+from models.world_cache import CachedWorld
+from models.sparse_cost_matrices import SparseCostMatrices
+from solver.tsp_solver import TSPSolver, GetRoute
+from solver.solve_pool import OBJECTIVES, BlendMatrices, RecordFromRoute
+from solver.sparse_solver import SparseSolveAll
+from main import get_next_example_dir, plot_initial_network, plot_collage
+
+# Scenario fields that can be given as a list, to run every combination of them
+EXPANDS = ["locations", "nodes", "seed", "congestion", "duration", "sparse"]
+
+DEFAULTS = {"name": "scenario", "locations": "random", "nodes": 50, "seed": 0, "congestion": 0,
+            "duration": duration, "sparse": 0, "objectives": OBJECTIVES}
+
+def LoadScenarios(path):
+    """
+    Reads a scenario file and returns the list of scenarios to run, each a dict with every field of DEFAULTS filled in.
+
+    The file is either JSON Lines (one scenario per line), or JSON holding a list of scenarios, or {"defaults": {...},
+    "scenarios": [...]} to set shared values once. A scenario can have
+
+    - name, for telling the results apart
+    - locations, a source like main.py --locations ("random", "clustered", "openai" or a file), and nodes for how many
+    - seed (for the locations and the world, null for an unseeded world) and congestion (extra congestion zones)
+    - duration, the solver time budget in seconds per objective
+    - sparse, a k nearest neighbour count to use SparseCostMatrices instead of the full matrices
+    - objectives, a dict of name -> [distance, time, safety] weights, or a plain list of weight vectors
+
+    Any of the fields in EXPANDS can be a list, in which case the scenario is run for every combination, eg. "seed": [0, 1, 2]
+    with "nodes": [50, 200] is six runs.
+
+    """
+    with open(path) as f:
+        if path.endswith(".jsonl"):
+            data = [json.loads(line) for line in f if line.strip()]
+        else:
+            data = json.load(f)
+
+    defaults = dict(DEFAULTS)
+    if isinstance(data, dict):
+        defaults.update(data.get("defaults", {}))
+        data = data["scenarios"]
+
+    scenarios = []
+    for entry in data:
+        scenario = {**defaults, **entry}
+        if not isinstance(scenario["objectives"], dict):
+            scenario["objectives"] = {f"weights {k}": w for k, w in enumerate(scenario["objectives"])}
+
+        options = [scenario[key] if isinstance(scenario[key], list) else [scenario[key]] for key in EXPANDS]
+        for values in itertools.product(*options):
+            scenarios.append({**scenario, **dict(zip(EXPANDS, values)), "id": len(scenarios)})
+    return scenarios
+
+def RunScenario(scenario, figures=None, routes=False):
+    """
+    Runs one scenario - locations, world, and a solve per objective - and returns one result dict per objective. A tour that
+    had to use an infeasible route has a null time.
+
+    With figures set to a folder, the usual four PNGs go into the next "<n> - Example - <N>" folder inside it. Anything the
+    world or plots print goes to stderr, so it never gets mixed into the JSON Lines on stdout.
+
+    """
+    with contextlib.redirect_stdout(sys.stderr):
+        start = time.perf_counter()
+        location = ProviderFromSource(scenario["locations"], scenario["nodes"], seed=scenario["seed"] or 0).get()
+        objectives = scenario["objectives"]
+
+        if scenario["sparse"]:
+            world = SparseCostMatrices(location, k=scenario["sparse"], seed=scenario["seed"],
+                                       congestion_zones=scenario["congestion"])
+            world_time = time.perf_counter() - start
+            records = SparseSolveAll(world, objectives, scenario["duration"])
+        else:
+            if scenario["seed"] is None:
+                world = CostMatrices(location, congestion_zones=scenario["congestion"])
+            else:
+                world = CachedWorld(location, scenario["seed"], congestion_zones=scenario["congestion"])
+            world_time = time.perf_counter() - start
+
+            stacked = np.stack([world.Quantized(name) for name in ("distance", "time", "safety")])
+            matrices = [world.distance, world.time, world.safety]
+            records = {}
+            for name, weights in objectives.items():
+                solve_start = time.perf_counter()
+                manager, routing, solution = TSPSolver(BlendMatrices(stacked, weights), duration=scenario["duration"])
+                records[name] = RecordFromRoute(name, weights, GetRoute(manager, routing, solution), matrices,
+                                                time.perf_counter() - solve_start, world.infeasible)
+
+        output_dir = None
+        if figures is not None:
+            output_dir = get_next_example_dir(figures, len(location))
+            if not scenario["sparse"]:
+                plot_initial_network(location, os.path.join(output_dir, "initial_network.png"))
+                world.PlotTimeEffect(save_path=os.path.join(output_dir, "time_effect.png"))
+                world.PlotSafetyScale(save_path=os.path.join(output_dir, "safety_scale.png"))
+            if all(name in records for name in ("distance", "time", "safety", "custom")):
+                plot_collage(records, location, os.path.join(output_dir, "optimisation_collage.png"))
+
+    results = []
+    for name, record in records.items():
+        result = {"id": scenario["id"], "name": scenario["name"], "locations": scenario["locations"], "nodes": len(location),
+                  "seed": scenario["seed"], "congestion": scenario["congestion"], "sparse": scenario["sparse"],
+                  "duration": scenario["duration"], "objective": name, "weights": list(record.weights),
+                  "distance": record.distance, "time": record.time if np.isfinite(record.time) else None, "safety": record.safety,
+                  "solve_time": record.wall_time, "world_time": world_time, "output_dir": output_dir}
+        if routes:
+            result["route"] = [int(node) for node in record.route]
+        results.append(result)
+    return results
+
+def RunBatch(scenarios, out, max_workers=None, figures=None, routes=False):
+    """
+    Runs every scenario on one process pool and writes each result to out as a JSON line as soon as its scenario finishes
+    (so not in scenario order - use the id field). The workers are forked from this process, so OR Tools, NumPy and matplotlib
+    are imported once rather than once per scenario. A scenario that fails gets a single line with an error field instead.
+
+    Returns the number of scenarios that failed.
+
+    """
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(RunScenario, scenario, figures, routes): scenario for scenario in scenarios}
+        for future in as_completed(futures):
+            scenario = futures[future]
+            try:
+                results = future.result()
+            except Exception as e:
+                failed += 1
+                results = [{"id": scenario["id"], "name": scenario["name"], "error": f"{type(e).__name__}: {e}"}]
+            for result in results:
+                out.write(json.dumps(result) + "\n")
+            out.flush()
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs a file of TSP scenarios on a process pool, streaming results as JSON Lines")
+    parser.add_argument("scenarios", help="scenario file, JSON or JSON Lines (see LoadScenarios)")
+    parser.add_argument("--out", default="-", help="file for the JSON Lines results, - for stdout")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--figures", default=None, metavar="DIR",
+                        help="also save the four PNGs of every scenario into numbered folders under DIR")
+    parser.add_argument("--routes", action="store_true", help="include each tour in the results")
+    args = parser.parse_args()
+
+    scenarios = LoadScenarios(args.scenarios)
+    print(f"Running {len(scenarios)} scenarios", file=sys.stderr)
+
+    with (open(args.out, "w") if args.out != "-" else contextlib.nullcontext(sys.stdout)) as out:
+        failed = RunBatch(scenarios, out, args.workers, args.figures, args.routes)
+
+    print(f"{len(scenarios) - failed} scenarios done, {failed} failed", file=sys.stderr)
+    sys.exit(1 if failed else 0)
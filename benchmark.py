@@ -0,0 +1,342 @@
+import os
+import csv
+import json
+import time
+import platform
+import argparse
+import sys
+import subprocess
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from config import duration
+from data.providers import ProviderFromSource
+from models.cost_matrices import CostMatrices, INFEASIBLE
+from solver.tsp_solver import TSPSolver, GetRoute
+from solver.solve_pool import OBJECTIVES, BlendMatrices, RecordFromRoute, SolvePool
+from solver.trace import SolveTrace, SaveTraces, PlotConvergence
+from solver.pareto import ParetoSweep, FrontHypervolumes
+from solver.pareto_local_search import ParetoLocalSearch
+from solver.improve import ImproveTour
+from solver.robustness import ScoreRobustness
+from solver.vrp_solver import Fleet, SolveFleet
+from utils.spatial_index import ZoneHits
+from main import plot_initial_network, plot_collage
+
+SIZES = [50, 200, 1000, 5000]
+SOURCES = ["random", "clustered"]
+BUDGETS = [0.25, 0.5, 1, 2, 3]
+
+# Entry points and modules whose import time we track, and the heavy dependencies that only some of them should load
+IMPORTS = ["solve", "main", "batch", "service", "models.cost_matrices", "data.providers", "solver.tsp_solver", "utils.plotting"]
+HEAVY = ["matplotlib", "openai", "ortools"]
+
+COLUMNS = ["instance", "nodes", "source", "stage", "name", "budget", "seconds", "cost",
+           "distance", "time", "safety", "branches_per_sec", "accepted_neighbors_per_sec",
+           "quantize_time", "build_time", "search_time", "first_solution_time", "last_improvement",
+           "front_size", "hypervolume", "polish_time", "improvement_per_ms", "loaded", "cvar", "infeasible_rate", "dropped", "workers"]
+
+def Timed(function, *args, **kwargs):
+    """
+    Calls function and returns (its result, wall time in seconds).
+
+    """
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def ImportProbe(module):
+    """
+    Imports module in a fresh interpreter and returns (how long the import took, which of the HEAVY dependencies it pulled in).
+    Raises a RuntimeError with the interpreter's error if the import fails.
+
+    """
+    code = ("import sys, time, json; start = time.perf_counter(); import {module}; "
+            "print(json.dumps([time.perf_counter() - start, [name for name in {heavy} if name in sys.modules]]))")
+    result = subprocess.run([sys.executable, "-c", code.format(module=module, heavy=HEAVY)], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    lines = result.stdout.strip().splitlines()
+    if result.returncode != 0 or not lines:
+        error = result.stderr.strip().splitlines()
+        raise RuntimeError(f"import {module} failed (exit code {result.returncode}): {error[-1] if error else 'no output'}")
+    seconds, loaded = json.loads(lines[-1])
+    return seconds, loaded
+
+def ImportTimes(modules=IMPORTS, repeats=3):
+    """
+    How long each module takes to import in a fresh interpreter (the best of repeats, see ImportProbe), and which of the HEAVY
+    dependencies that pulled in, as result rows. A headless solve should never see matplotlib or openai.
+
+    """
+    rows = []
+    for module in modules:
+        seconds, loaded = min(ImportProbe(module) for _ in range(repeats))
+        rows.append({"instance": "imports", "stage": "import", "name": module, "seconds": seconds, "loaded": " ".join(loaded)})
+        print(f"  import {module}: {seconds:.3f}s{', loads ' + ', '.join(loaded) if loaded else ''}")
+    return rows
+
+def Solve(world, stacked, name, weights, budget, label=""):
+    """
+    One timed TSPSolver call on a weighted blend of the quantized matrices. Returns a result row (without the instance columns),
+    the SolveRecord and the SolveTrace.
+
+    """
+    stats = {}
+    trace = SolveTrace(label=label)
+    start = time.perf_counter()
+    manager, routing, solution = TSPSolver(BlendMatrices(stacked, weights), stats=stats, duration=budget, trace=trace)
+    seconds = time.perf_counter() - start
+    record = RecordFromRoute(name, weights, GetRoute(manager, routing, solution),
+                             [world.distance, world.time, world.safety], seconds, world.infeasible)
+
+    row = {"name": name, "budget": budget, "seconds": seconds, "cost": solution.ObjectiveValue(),
+           "distance": record.distance, "time": record.time, "safety": record.safety,
+           "branches_per_sec": stats["branches_per_sec"], "accepted_neighbors_per_sec": stats["accepted_neighbors_per_sec"],
+           "quantize_time": trace.quantize_time, "build_time": trace.build_time, "search_time": trace.search_time,
+           "first_solution_time": trace.first_solution_time, "last_improvement": trace.last_improvement}
+    return row, record, trace
+
+def BenchFronts(world, count):
+    """
+    Head to head of the two ways of building a Pareto front on the same world - a ParetoSweep of count OR Tools weighted sum
+    solves, then ParetoLocalSearch given the same wall time. Returns a row each (without the instance columns), with the
+    hypervolumes normalised together so they can be compared.
+
+    """
+    sweep = ParetoSweep(world, count)
+    search = ParetoLocalSearch(world, duration=sweep.wall_time, seed=0)
+    rows = []
+    for name, front, hypervolume in zip(["sweep", "pls"], [sweep, search], FrontHypervolumes(sweep, search)):
+        rows.append({"name": name, "budget": sweep.wall_time, "seconds": front.wall_time, "front_size": len(front.records),
+                     "hypervolume": hypervolume})
+    return rows
+
+def AllPairsThrough(world, zone):
+    """
+    The routes through a zone found the way RoutesThrough used to - every one of the n^2 / 2 routes tested against it - kept
+    here as the baseline for the update stage.
+
+    """
+    i, j = np.triu_indices(world.num, 1)
+    lat, lon = world.locations[:, 0], world.locations[:, 1]
+    route, _ = ZoneHits(lon[i], lat[i], lon[j], lat[j], np.atleast_2d(zone))
+    return i[route], j[route]
+
+def BenchUpdates(world, count):
+    """
+    Times finding the routes through each of the world's first count zones with RoutesThrough (what every zone update starts
+    with) against the all-pairs baseline, checking they agree. Returns a row each (without the instance columns), with the
+    total seconds over all the zones.
+
+    """
+    zones = world.scaler[:count]
+    found, box = Timed(lambda: [world.RoutesThrough(zone) for zone in zones])
+    expected, scan = Timed(lambda: [AllPairsThrough(world, zone) for zone in zones])
+    for (i, j), (a, b) in zip(found, expected):
+        assert np.array_equal(np.sort(i * world.num + j), np.sort(a * world.num + b)), "RoutesThrough disagrees with all pairs"
+    return [{"name": "routes through", "seconds": box}, {"name": "all pairs", "seconds": scan}]
+
+def BenchPool(world):
+    """
+    Times one SolvePool run of every objective in OBJECTIVES, as main.py solves them, on as many workers as SolvePool picks
+    for this machine. Compare seconds with the solve stage (the same solves one after another). Returns a row (without the
+    instance columns).
+
+    """
+    workers = min(len(OBJECTIVES), os.cpu_count() or 1)
+    records, seconds = Timed(SolvePool, world, OBJECTIVES)
+    return {"name": "all objectives", "budget": duration, "seconds": seconds, "workers": workers,
+            "distance": records["custom"].distance, "time": records["custom"].time, "safety": records["custom"].safety}
+
+def BenchFleet(world, vehicles):
+    """
+    One SolveFleet run like main.py's --vehicles - a stop per node shared out evenly, anything that does not fit dropped. Returns
+    a row (without the instance columns) with the plan's total costs and how many stops were dropped.
+
+    """
+    num = world.num
+    fleet = Fleet(vehicles=vehicles, demands=[0] + [1] * (num - 1), capacities=-(-(num - 1) // vehicles), drop_penalty=INFEASIBLE)
+    plan = SolveFleet(world, fleet, OBJECTIVES["custom"])
+    return {"name": f"{vehicles} vehicles", "budget": duration, "seconds": plan.wall_time, "distance": plan.distance,
+            "time": plan.time, "safety": plan.safety, "dropped": len(plan.dropped)}
+
+def BenchInstance(num, source, seed=0, budgets=BUDGETS, solve_max=1000, plot_max=5000, plot_dir=None, traces=None, fronts=0,
+                  scenarios=0, updates=0, vehicles=0, pool=False):
+    """
+    Runs every benchmark on one seeded instance and returns the result rows. The SolveTrace of every solve is added to the
+    traces list if one is given, and with a plot_dir the solves at the usual duration also get a convergence plot.
+
+    - build: CostMatrices construction, plus the int32 quantized copies the solver works on
+    - update: with updates set, finding the routes through that many zones, RoutesThrough against all pairs (see BenchUpdates)
+    - solve: one TSPSolver call per objective in OBJECTIVES, at the usual duration
+    - pool: with pool set, every objective at once on SolvePool's process pool, for the wall time of a main.py solve
+    - budget: the custom objective again at each time budget, for a tour cost vs time curve
+    - polish: each of those budget tours again after ImproveTour, so the cost includes the polishing time
+    - front: with fronts set, a ParetoSweep of that many weights against ParetoLocalSearch in the same time (see BenchFronts)
+    - robustness: with scenarios set, the four solve tours scored together against that many disruptions (see ScoreRobustness),
+      with cost the expected custom blend
+    - fleet: with vehicles set, a SolveFleet plan for that many vehicles (see BenchFleet), whatever the solve_max
+    - plot: each of the four output figures, then all four at once on a process pool like main.py does
+
+    Solving is skipped above solve_max nodes and plotting above plot_max, where they would take far too long to be useful.
+
+    """
+    instance = f"{source}-{num}-{seed}"
+    base = {"instance": instance, "nodes": num, "source": source}
+    rows = []
+
+    location = ProviderFromSource(source, num, seed=seed, cache=False).get()
+
+    world, seconds = Timed(CostMatrices, location, seed=seed)
+    rows.append({**base, "stage": "build", "name": "world", "seconds": seconds})
+    stacked, seconds = Timed(lambda: np.stack([world.Quantized(name) for name in ("distance", "time", "safety")]))
+    rows.append({**base, "stage": "build", "name": "quantize", "seconds": seconds})
+
+    if updates:
+        for row in BenchUpdates(world, updates):
+            rows.append({**base, "stage": "update", **row})
+            print(f"  {instance}: {row['name']} for {updates} zones {row['seconds']:.2f}s")
+
+    records = {}
+    solve_traces = []
+    if num <= solve_max:
+        for name, weights in OBJECTIVES.items():
+            row, records[name], trace = Solve(world, stacked, name, weights, duration, f"{instance} {name}")
+            rows.append({**base, "stage": "solve", **row})
+            solve_traces.append(trace)
+            print(f"  {instance}: {name} solve {row['seconds']:.2f}s, cost {row['cost']}, last improvement at {row['last_improvement'] or 0:.2f}s")
+
+        if pool:
+            row = BenchPool(world)
+            rows.append({**base, "stage": "pool", **row})
+            print(f"  {instance}: {len(OBJECTIVES)} objectives on {row['workers']} workers {row['seconds']:.2f}s")
+
+        blend = BlendMatrices(stacked, OBJECTIVES["custom"])
+        for budget in budgets:
+            row, record, trace = Solve(world, stacked, "custom", OBJECTIVES["custom"], budget, f"{instance} custom {budget}s")
+            rows.append({**base, "stage": "budget", **row})
+            if traces is not None:
+                traces.append(trace)
+            print(f"  {instance}: custom at {budget}s budget, cost {row['cost']}")
+
+            polished = ImproveTour(blend, record.route)
+            rows.append({**base, "stage": "polish", "name": "custom", "budget": budget, "seconds": row["seconds"] + polished.seconds,
+                         "cost": polished.after, "polish_time": polished.seconds, "improvement_per_ms": polished.improvement_per_ms})
+            print(f"  {instance}: polished in {polished.seconds:.3f}s, cost {polished.after} ({polished.improvement_per_ms:.0f} per ms)")
+
+        if traces is not None:
+            traces.extend(solve_traces)
+
+        if fronts:
+            for row in BenchFronts(world, fronts):
+                rows.append({**base, "stage": "front", **row})
+                print(f"  {instance}: {row['name']} front of {row['front_size']} tours in {row['seconds']:.2f}s, hypervolume {row['hypervolume']:.3f}")
+
+        if scenarios:
+            reports = ScoreRobustness(world, records, scenarios, weights=OBJECTIVES["custom"], seed=seed)
+            for name, report in reports.items():
+                rows.append({**base, "stage": "robustness", "name": name, "seconds": report.seconds, "cost": report.expected[3],
+                             "cvar": report.cvar[3], "infeasible_rate": report.infeasible_rate})
+            print(f"  {instance}: {len(reports)} tours scored against {scenarios} disruptions in {report.seconds:.2f}s")
+
+    if vehicles:
+        row = BenchFleet(world, vehicles)
+        rows.append({**base, "stage": "fleet", **row})
+        print(f"  {instance}: {row['name']} fleet plan {row['seconds']:.2f}s, {row['dropped']} stops dropped")
+
+    if num <= plot_max and plot_dir is not None:
+        folder = os.path.join(plot_dir, instance)
+        os.makedirs(folder, exist_ok=True)
+        plots = [("initial_network", lambda path, pool=None: plot_initial_network(location, path, pool=pool)),
+                 ("time_effect", lambda path, pool=None: world.PlotTimeEffect(save_path=path, pool=pool)),
+                 ("safety_scale", lambda path, pool=None: world.PlotSafetyScale(save_path=path, pool=pool))]
+        if records:
+            plots.append(("optimisation_collage", lambda path, pool=None: plot_collage(records, location, path, pool=pool)))
+            plots.append(("convergence", lambda path, pool=None: PlotConvergence(solve_traces, path, pool=pool)))
+
+        for name, plot in plots:
+            _, seconds = Timed(plot, os.path.join(folder, f"{name}.png"))
+            rows.append({**base, "stage": "plot", "name": name, "seconds": seconds})
+            print(f"  {instance}: {name} plot {seconds:.2f}s")
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=len(plots)) as pool:
+            futures = [plot(os.path.join(folder, f"{name}.png"), pool=pool) for name, plot in plots]
+            for future in futures:
+                future.result()
+        seconds = time.perf_counter() - start
+        rows.append({**base, "stage": "plot", "name": "all (parallel)", "seconds": seconds})
+        print(f"  {instance}: all plots in parallel {seconds:.2f}s")
+
+    return rows
+
+def Environment():
+    """
+    What the results were measured on, so runs from different commits or machines can be told apart.
+
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    import ortools
+    return {"commit": commit, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "numpy": np.__version__, "ortools": ortools.__version__, "machine": platform.machine(),
+            "cpus": os.cpu_count(), "duration": duration}
+
+def SaveResults(rows, traces, environment, out_dir):
+    """
+    Writes results.json (the environment and every row), results.csv (just the rows) and traces.json (every SolveTrace) into
+    out_dir.
+
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    SaveTraces(traces, os.path.join(out_dir, "traces.json"))
+    with open(os.path.join(out_dir, "results.json"), "w") as f:
+        json.dump({"environment": environment, "results": rows}, f, indent=2)
+
+    with open(os.path.join(out_dir, "results.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({column: row.get(column, "") for column in COLUMNS})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks world building, solving and plotting on seeded offline instances")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="instance sizes to run")
+    parser.add_argument("--sources", nargs="+", default=SOURCES, choices=SOURCES, help="uniform (random) and/or clustered locations")
+    parser.add_argument("--seed", type=int, default=0, help="seed for both the locations and the world")
+    parser.add_argument("--budgets", type=float, nargs="+", default=BUDGETS, help="solver time budgets for the cost vs time curve")
+    parser.add_argument("--solve-max", type=int, default=1000, help="largest instance to solve")
+    parser.add_argument("--plot-max", type=int, default=5000, help="largest instance to plot")
+    parser.add_argument("--fronts", type=int, default=0, metavar="COUNT",
+                        help="also compare a ParetoSweep of COUNT weights with ParetoLocalSearch in the same time")
+    parser.add_argument("--scenarios", type=int, default=0, metavar="COUNT",
+                        help="also score the solve tours against COUNT Monte Carlo disruptions (see solver.robustness)")
+    parser.add_argument("--updates", type=int, default=0, metavar="COUNT",
+                        help="also time finding the routes through COUNT zones, as every zone update does, against all pairs")
+    parser.add_argument("--pool", action="store_true",
+                        help="also time every objective at once on SolvePool's process pool, like a main.py run")
+    parser.add_argument("--vehicles", type=int, default=0, metavar="COUNT",
+                        help="also time a fleet plan for COUNT vehicles (see solver.vrp_solver.SolveFleet)")
+    parser.add_argument("--out", default=os.path.join("examples", "benchmarks"), help="folder for the results")
+    args = parser.parse_args()
+
+    environment = Environment()
+    out_dir = os.path.join(args.out, f"{environment['timestamp'].replace(':', '-')}-{environment['commit'] or 'nogit'}")
+    print(f"Saving benchmark results to: {out_dir}")
+
+    print("Import times")
+    rows = ImportTimes()
+    traces = []
+    for num in args.sizes:
+        for source in args.sources:
+            print(f"{source} instance with {num} nodes")
+            rows += BenchInstance(num, source, args.seed, args.budgets, args.solve_max, args.plot_max,
+                                  plot_dir=os.path.join(out_dir, "plots"), traces=traces, fronts=args.fronts,
+                                  scenarios=args.scenarios, updates=args.updates, vehicles=args.vehicles, pool=args.pool)
+
+    SaveResults(rows, traces, environment, out_dir)
+    print(f"{len(rows)} results saved to {out_dir}")
@@ -2,6 +2,10 @@
 sample = 50 #Number of nodes required. This is used within the LLM prompt. 
 avgspeed = 50 #kmph
 duration = 3 #seconds max
+quantize = 1000 #Integer solver cost units per km/hour/safety point (so time is worked to the nearest 3.6 seconds)
+
+latbounds = (24.5, 49.5) #Continental USA bounds, the same ones we give the LLM in the prompt below
+longbounds = (-124.8, -66.9)
 
 prompt = f"""<context> Goal: Return a 2-dimensional array as JSON of latitude/longitude pairs representing **{sample}** distinct places in the **continental USA** (lower 48 + DC; exclude Alaska, Hawaii, territories, and water-only points). Definitions: “Pair” = [latitude, longitude] where latitude is first and longitude is second. “Continental USA bounds (approx)”:
 Latitude: 24.5 to 49.5 (inclusive)
@@ -1,27 +1,83 @@
 import os
 import json
 import numpy as np
-from openai import OpenAI
-from config import prompt
+from config import prompt, sample, latbounds, longbounds
 
-def get_location_data():
-    api_key = os.getenv('OPENAI_API_KEY')
-    client = OpenAI(api_key=api_key)
+MODEL = "gpt-5-nano"
 
-    response = client.responses.create(
-        model="gpt-5-nano",
-        instructions=  """
+INSTRUCTIONS = """
                     You are a JSON data emitter. You must output only the requested data structure in a JSON format and nothing else—no explanations, no code fences, no comments, no metadata, no trailing text. If any instruction conflicts, the highest priority is: emit only the array. 
                     Follow the structure and constraints in <context>, <constraints>, and <output_format> exactly. Operate in “silent mode”: produce no reasoning or commentary. Validate internally before responding; if any constraint would be violated, regenerate silently until all constraints are satisfied.
-        """,
-        input=prompt
-    )
+        """
 
-    response = response.output_text
-    print(response)
+def ValidateLocations(data, count=None):
+    """
+    Checks a set of locations (the parsed JSON from the LLM, or anything else array-like) and returns it as an (n, 2) float array
+    of [lat, lon] pairs.
+
+    Raises a ValueError if it is the wrong shape, has anything that is not a finite number, falls outside the continental USA bounds
+    in config, has duplicates, or (when count is given) has the wrong number of pairs.
+
+    """
+    try:
+        location = np.array(data, dtype=float)
+    except (TypeError, ValueError):
+        raise ValueError("Locations must be a list of [lat, lon] number pairs")
+
+    if location.ndim != 2 or location.shape[1] != 2 or len(location) == 0:
+        raise ValueError(f"Locations must be a list of [lat, lon] pairs, got shape {location.shape}")
+    if not np.isfinite(location).all():
+        raise ValueError("Locations contain NaN or infinite values")
+    if count is not None and len(location) != count:
+        raise ValueError(f"Expected {count} locations, got {len(location)}")
+
+    outside = ((location[:,0] < latbounds[0]) | (location[:,0] > latbounds[1]) |
+               (location[:,1] < longbounds[0]) | (location[:,1] > longbounds[1]))
+    if outside.any():
+        raise ValueError(f"{outside.sum()} locations are outside the continental USA bounds, eg. {location[outside][0].tolist()}")
+    if len(np.unique(location, axis=0)) != len(location):
+        raise ValueError("Locations contain duplicate pairs")
+
+    return location
+
+def ParseLocations(text, count=None):
+    """
+    Parses and validates the raw text of an LLM response. Malformed JSON is raised as a ValueError like any other bad data.
+
+    """
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Response is not valid JSON: {e}")
+    return ValidateLocations(data, count)
+
+def get_location_data(client=None, retries=2):
+    """
+    Asks the LLM for config.sample locations, and checks what comes back with ValidateLocations. A bad response is asked for again
+    up to retries more times before we give up.
+
+    """
+    if client is None:
+        # Only imported here, so runs that never ask the LLM never pay for loading the openai client
+        from openai import OpenAI
+        api_key = os.getenv('OPENAI_API_KEY')
+        client = OpenAI(api_key=api_key)
+
+    for attempt in range(retries + 1):
+        response = client.responses.create(
+            model=MODEL,
+            instructions=INSTRUCTIONS,
+            input=prompt
+        )
+
+        try:
+            location = ParseLocations(response.output_text, sample)
+            break
+        except ValueError as e:
+            if attempt == retries:
+                raise
+            print(f"Bad location data ({e}), asking again.")
 
-    response = json.loads(response)
-    location = np.array(response)
     print(f"{len(location)} entries received.")
-    
+
     return location
@@ -0,0 +1,81 @@
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from config import sample
+from data.providers import RandomProvider
+
+class MockLocationServer:
+    """
+    A local stand in for the OpenAI Responses endpoint, for testing the location providers without a network or an API key.
+
+    Every POST to /v1/responses gets a response in the same shape as the real API, whose output_text is a JSON array of count
+    random (but valid) locations. The first bad_responses requests get malformed JSON instead, to exercise the retry logic,
+    and delay adds a pause to every request so that concurrent fetching actually shows up.
+
+    Use it as a context manager, and point a client at url.
+
+    """
+    def __init__(self, count=sample, bad_responses=0, delay=0, seed=0):
+        self.count = count
+        self.bad_responses = bad_responses
+        self.delay = delay
+        self.seed = seed
+        self.requests = 0
+        self.lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with server.lock:
+                    number = server.requests
+                    server.requests += 1
+
+                if server.delay:
+                    time.sleep(server.delay)
+
+                if number < server.bad_responses:
+                    text = "[[40.7, -74.0], [34.0"
+                else:
+                    text = json.dumps(RandomProvider(server.count, server.seed + number).get().tolist())
+
+                body = json.dumps({
+                    "id": f"resp_mock_{number}",
+                    "object": "response",
+                    "created_at": int(time.time()),
+                    "model": "mock",
+                    "status": "completed",
+                    "output": [{
+                        "id": f"msg_mock_{number}",
+                        "type": "message",
+                        "role": "assistant",
+                        "status": "completed",
+                        "content": [{"type": "output_text", "text": text, "annotations": []}],
+                    }],
+                    "parallel_tool_calls": False,
+                    "tool_choice": "auto",
+                    "tools": [],
+                }).encode()
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
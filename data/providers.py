@@ -0,0 +1,198 @@
+import os
+import json
+import asyncio
+import hashlib
+from abc import ABC, abstractmethod
+import numpy as np
+from config import prompt, sample, latbounds, longbounds
+from data.location_generator import MODEL, INSTRUCTIONS, ValidateLocations, ParseLocations, get_location_data
+
+CACHE_DIR = os.path.join("data", "location_cache")
+
+class LocationProvider(ABC):
+    """
+    Base class for anything that hands us a set of locations. get() returns an (n, 2) array of [lat, lon] pairs, and key()
+    returns a string that identifies that set, which is what the disk cache is keyed on.
+
+    """
+    @abstractmethod
+    def get(self):
+        pass
+
+    @abstractmethod
+    def key(self):
+        pass
+
+
+class OpenAIProvider(LocationProvider):
+    """
+    The original source of locations - one request to the LLM with the prompt from config.
+
+    Each set the LLM returns is different, so slot tells otherwise identical providers apart in the cache.
+
+    """
+    def __init__(self, client=None, slot=0):
+        self.client = client
+        self.slot = slot
+
+    def get(self):
+        return get_location_data(self.client)
+
+    def key(self):
+        return _hash("openai", MODEL, INSTRUCTIONS, prompt, self.slot)
+
+
+class RandomProvider(LocationProvider):
+    """
+    Deterministic offline locations for benchmarking at any N, without a network round trip.
+
+    Points are uniform inside the continental USA bounds, or with clusters set, gathered around that many random centres
+    (roughly like cities) with spread degrees of scatter.
+
+    """
+    def __init__(self, num=sample, seed=0, clusters=0, spread=1.5):
+        self.num = num
+        self.seed = seed
+        self.clusters = clusters
+        self.spread = spread
+
+    def get(self):
+        rng = np.random.RandomState(self.seed)
+        low = np.array([latbounds[0], longbounds[0]])
+        high = np.array([latbounds[1], longbounds[1]])
+
+        if self.clusters:
+            centres = rng.uniform(low, high, (self.clusters, 2))
+            points = centres[rng.randint(0, self.clusters, self.num)] + rng.normal(0, self.spread, (self.num, 2))
+            points = np.clip(points, low, high)
+        else:
+            points = rng.uniform(low, high, (self.num, 2))
+
+        # Clipping can in theory land two points on the same corner, so nudge any duplicates apart
+        points = np.round(points, 6)
+        while len(np.unique(points, axis=0)) != len(points):
+            _, first = np.unique(points, axis=0, return_index=True)
+            repeat = np.setdiff1d(np.arange(len(points)), first)
+            points[repeat] = np.round(rng.uniform(low, high, (len(repeat), 2)), 6)
+
+        return ValidateLocations(points, self.num)
+
+    def key(self):
+        return _hash("random", self.num, self.seed, self.clusters, self.spread)
+
+
+class FileProvider(LocationProvider):
+    """
+    Locations from a file - a CSV with a lat, lon pair per line (a header line is skipped), a .json array like the LLM returns,
+    or a Parquet file with lat and lon columns. Parquet needs pandas (and pyarrow), which are only imported when used.
+
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def get(self):
+        extension = os.path.splitext(self.path)[1].lower()
+
+        if extension == ".parquet":
+            import pandas as pd
+            frame = pd.read_parquet(self.path)
+            columns = {str(c).lower(): c for c in frame.columns}
+            lat, lon = columns.get("lat", columns.get("latitude")), columns.get("lon", columns.get("longitude"))
+            if lat is None or lon is None:
+                raise ValueError(f"{self.path} needs lat and lon (or latitude and longitude) columns, it has {list(frame.columns)}")
+            data = frame[[lat, lon]].to_numpy()
+        elif extension == ".json":
+            with open(self.path) as f:
+                data = json.load(f)
+        else:
+            with open(self.path) as f:
+                first = f.readline()
+            skip = 1 if any(c.isalpha() for c in first) else 0
+            data = np.loadtxt(self.path, delimiter=",", skiprows=skip, usecols=(0, 1), ndmin=2)
+
+        return ValidateLocations(data)
+
+    def key(self):
+        with open(self.path, "rb") as f:
+            return _hash("file", hashlib.sha256(f.read()).hexdigest())
+
+
+class CachedProvider(LocationProvider):
+    """
+    Wraps another provider and keeps every validated set it produces on disk, so asking again (eg. a rerun of main.py) never
+    needs the network.
+
+    """
+    def __init__(self, provider, cache_dir=CACHE_DIR):
+        self.provider = provider
+        self.cache_dir = cache_dir
+
+    def path(self):
+        return os.path.join(self.cache_dir, f"{self.provider.key()}.npy")
+
+    def get(self):
+        path = self.path()
+        if os.path.exists(path):
+            return ValidateLocations(np.load(path))
+
+        location = self.provider.get()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp.npy"
+        np.save(tmp, location)
+        os.replace(tmp, path)
+        return location
+
+    def key(self):
+        return self.provider.key()
+
+
+class AsyncOpenAIProvider:
+    """
+    Fetches several location sets from the LLM at the same time, rather than paying for one round trip after another.
+
+    base_url points the client somewhere other than OpenAI - in particular at data.mock_server for tests. Sets that fail
+    validation are requested again, up to retries times each.
+
+    """
+    def __init__(self, api_key=None, base_url=None, retries=2, count=sample):
+        self.api_key = api_key if api_key is not None else os.getenv('OPENAI_API_KEY')
+        self.base_url = base_url
+        self.retries = retries
+        self.count = count
+
+    async def _fetch(self, client):
+        for attempt in range(self.retries + 1):
+            response = await client.responses.create(model=MODEL, instructions=INSTRUCTIONS, input=prompt)
+            try:
+                return ParseLocations(response.output_text, self.count)
+            except ValueError:
+                if attempt == self.retries:
+                    raise
+
+    async def fetch_many(self, sets):
+        from openai import AsyncOpenAI
+
+        async with AsyncOpenAI(api_key=self.api_key, base_url=self.base_url) as client:
+            return await asyncio.gather(*(self._fetch(client) for _ in range(sets)))
+
+    def get_many(self, sets):
+        return asyncio.run(self.fetch_many(sets))
+
+
+def ProviderFromSource(source, num=sample, seed=0, cache=True):
+    """
+    Turns a command line style source into a provider - "openai", "random", "clustered", or a path to a CSV/JSON/Parquet file.
+    LLM sets are cached on disk unless cache is False, the other sources are cheap enough to rebuild.
+
+    """
+    if source == "openai":
+        provider = OpenAIProvider()
+        return CachedProvider(provider) if cache else provider
+    if source == "random":
+        return RandomProvider(num, seed)
+    if source == "clustered":
+        return RandomProvider(num, seed, clusters=max(2, int(np.sqrt(num) / 2)))
+    return FileProvider(source)
+
+def _hash(*parts):
+    return hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()[:24]
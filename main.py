@@ -1,19 +1,28 @@
 import numpy as np
-import matplotlib.pyplot as plt
 import os
 import glob
-from config import duration, avgspeed
-from data.location_generator import get_location_data
-from models.cost_matrices import CostMatrices
-from solver.tsp_solver import TSPSolver, print_solution
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from config import duration, avgspeed, sample
+from data.providers import ProviderFromSource
+from models.world_cache import CachedWorld
+from models.sparse_cost_matrices import SparseCostMatrices
+from solver.solve_pool import SolvePool, OBJECTIVES
+from solver.budget import Budget
+from solver.pareto import ParetoSweep
+from solver.sparse_solver import SparseSolveAll
+from solver.vrp_solver import Fleet, SolveFleet
+from solver.robustness import ScoreRobustness
+from models.cost_matrices import INFEASIBLE
+from utils.reporting import print_route
+from utils.plotting import MAX_EDGES, PlotEdges, Preload, Render, DrawNetwork, DrawCollage, DrawRoute, DrawFleet
 
 def get_next_example_dir(base_path, num_nodes):
     """
     Determines the next example directory name.
     Pattern: <num_nodes> - Example - <N>
     """
-    if not os.path.exists(base_path):
-        os.makedirs(base_path)
+    os.makedirs(base_path, exist_ok=True)
     
     pattern = os.path.join(base_path, f"{num_nodes} - Example - *")
     existing_dirs = glob.glob(pattern)
@@ -32,146 +41,223 @@ def get_next_example_dir(base_path, num_nodes):
             continue
             
     next_n = max_n + 1
-    new_dir_name = f"{num_nodes} - Example - {next_n}"
-    full_path = os.path.join(base_path, new_dir_name)
-    os.makedirs(full_path)
-    return full_path
+    while True:
+        new_dir_name = f"{num_nodes} - Example - {next_n}"
+        full_path = os.path.join(base_path, new_dir_name)
+        try:
+            os.makedirs(full_path)
+            return full_path
+        except FileExistsError:
+            # Another process (eg. a batch run worker) took this one first
+            next_n += 1
 
 def plot_route_on_ax(ax, route, locations, title, color_code='blue'):
     """
     Helper function to plot a route on a given matplotlib axis.
     """
-    x = locations[:,1]
-    y = locations[:,0]
-    
-    # Plot all nodes
-    ax.scatter(x, y, color="navy", zorder=10, s=20)
-    
-    # Plot the route
-    route_x = []
-    route_y = []
-    for node_idx in route:
-        route_x.append(locations[node_idx][1])
-        route_y.append(locations[node_idx][0])
-    
-    # Add lines connecting the route
-    ax.plot(route_x, route_y, color=color_code, alpha=0.7, linewidth=1.5, zorder=5)
-    
-    # Mark start/end
-    ax.scatter(route_x[0], route_y[0], color='green', s=50, label='Start', zorder=15)
-    ax.scatter(route_x[-1], route_y[-1], color='red', s=50, label='End', zorder=15)
-    
-    ax.set_title(title)
-    ax.set_xlabel("Longitude")
-    ax.set_ylabel("Latitude")
-    ax.grid(True)
+    DrawRoute(ax, route, locations, title, color_code)
+
+def plot_initial_network(locations, save_path, max_edges=MAX_EDGES, k=None, pool=None):
+    """
+    Plots our nodes and every possible route between them (or a sample of them past max_edges, see PlotEdges).
+    """
+    i, j = PlotEdges(locations, max_edges, k)
+    return Render(DrawNetwork, save_path, np.asarray(locations), i, j, pool=pool)
+
+def plot_collage(records, locations, save_path, pool=None):
+    """
+    Plots the distance, time, safety and custom routes (SolveRecords keyed by objective name) side by side in a 2 x 2 collage.
+    """
+    panels = [
+        ("distance", "Optimized for Distance", 'blue'),
+        ("time", "Optimized for Time", 'green'),
+        ("safety", "Optimized for Safety", 'orange'),
+        ("custom", "Optimized for Custom Weights", 'purple'),
+    ]
+
+    panels = [(records[name].route,
+               f"{title}\nDist: {records[name].distance:.1f}km, Time: {records[name].time:.1f}hr, Safe: {records[name].safety:.1f}",
+               colour) for name, title, colour in panels]
+    return Render(DrawCollage, save_path, np.asarray(locations), panels, pool=pool)
+
+def plot_fleet(plan, locations, save_path, pool=None):
+    """
+    Plots every vehicle's route of a FleetPlan on one figure.
+    """
+    title = f"Fleet of {len(plan.routes)} vehicles\nDist: {plan.distance:.1f}km, Time: {plan.time:.1f}hr, Safe: {plan.safety:.1f}"
+    return Render(DrawFleet, save_path, np.asarray(locations), plan.routes, title, pool=pool)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-objective TSP over distance, time and safety")
+    parser.add_argument("--pareto", type=int, default=0, metavar="COUNT",
+                        help="also sweep COUNT weight vectors and report the Pareto front of tours")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed the world so it can be rebuilt exactly, and cache it under examples/world_cache")
+    parser.add_argument("--locations", default="openai", metavar="SOURCE",
+                        help="where the locations come from: openai (cached on disk), random, clustered, or a CSV/JSON/Parquet file")
+    parser.add_argument("--nodes", type=int, default=sample,
+                        help="number of locations for the random and clustered sources")
+    parser.add_argument("--congestion", type=int, default=0, metavar="ZONES",
+                        help="add a dense urban congestion layer of this many small time zones")
+    parser.add_argument("--sparse", type=int, default=0, metavar="K",
+                        help="keep only each location's K nearest neighbour routes, for instances too big for n x n matrices")
+    parser.add_argument("--plot-edges", type=int, default=MAX_EDGES, metavar="COUNT",
+                        help="most routes drawn on a figure, past this a sample is drawn")
+    parser.add_argument("--plot-knn", type=int, default=0, metavar="K",
+                        help="past --plot-edges, draw the routes to each location's K nearest neighbours instead of a sample")
+    parser.add_argument("--per-node", type=float, default=None, metavar="SECONDS",
+                        help="scale each solve's time limit with the instance, SECONDS per node instead of a fixed duration")
+    parser.add_argument("--patience", type=float, default=None, metavar="SECONDS",
+                        help="stop a solve once it has gone SECONDS without a better tour")
+    parser.add_argument("--gap", type=float, default=None,
+                        help="stop a solve once it is within this fraction of a lower bound, eg. 0.02")
+    parser.add_argument("--deadline", type=float, default=None, metavar="SECONDS",
+                        help="share one time limit for all the solves between the objectives")
+    parser.add_argument("--polish", type=float, default=None, metavar="SECONDS",
+                        help="post-optimise each tour with Or-opt and 3-opt moves for up to SECONDS (see solver.improve)")
+    parser.add_argument("--vehicles", type=int, default=1,
+                        help="also plan the custom objective for a fleet of this many vehicles from node 0 (see solver.vrp_solver)")
+    parser.add_argument("--capacity", type=int, default=None, metavar="STOPS",
+                        help="most stops a fleet vehicle can make (default: the stops shared out evenly between the vehicles)")
+    parser.add_argument("--max-time", type=float, default=None, metavar="HOURS", help="longest a fleet vehicle's route may take")
+    parser.add_argument("--checkpoint", type=float, default=None, metavar="SECONDS",
+                        help="stream each solve's improving tours to the example folder and save the best every SECONDS")
+    parser.add_argument("--resume", default=None, metavar="FOLDER",
+                        help="carry on a killed run in its example folder, warm starting each solve from its last checkpoint")
+    parser.add_argument("--robustness", type=int, default=0, metavar="SCENARIOS",
+                        help="also score each tour against this many random disruptions of the world (see solver.robustness)")
+    args = parser.parse_args()
+    if args.sparse and args.pareto:
+        parser.error("--pareto needs the full matrices, so it cannot be combined with --sparse")
+    if args.sparse and args.vehicles > 1:
+        parser.error("--vehicles needs the full matrices, so it cannot be combined with --sparse")
+    if args.resume and args.seed is None:
+        parser.error("--resume needs the --seed the run was started with, so that the same world is built again")
+    if args.sparse and (args.checkpoint or args.resume):
+        parser.error("--checkpoint and --resume are not supported with --sparse")
+    if args.sparse and args.robustness:
+        parser.error("--robustness needs the full matrices, so it cannot be combined with --sparse")
+
     # Get locations
-    location = get_location_data()
+    location = ProviderFromSource(args.locations, args.nodes, seed=args.seed or 0).get()
     
     # Determine output directory
     num = len(location)
-    output_dir = get_next_example_dir("examples", num)
+    if args.resume:
+        output_dir = args.resume
+        if not os.path.isdir(output_dir):
+            parser.error(f"--resume folder {output_dir} does not exist")
+    else:
+        output_dir = get_next_example_dir("examples", num)
     print(f"Saving outputs to: {output_dir}")
 
-    # Initial Plotting
-    s = duration
-    sample = num
-
-    x = location[:,1]
-    y = location[:,0]
-
-    latmin, latmax, longmin, longmax = y.min(), y.max(), x.min(), x.max()
-    
-    plt.figure(figsize=(10, 8))
-    plt.scatter(x,y, color = "navy", zorder = 10)
-    plt.title("Plot of Nodes and All Possible Routes in our TSP")
-    plt.xlabel("Longitude")
-    plt.ylabel("Latitude")
-    plt.grid()
-    plt.xlim(longmin-5, longmax+5)
-    plt.ylim(latmin-5, latmax+5)
-    for i in range(num):
-        for j in range(i+1, num):
-            plt.plot([x[i], x[j]], [y[i], y[j]], 'gray', alpha=0.35, linewidth=0.5)
-            
-    # Save Initial Plot
-    plt.savefig(os.path.join(output_dir, "initial_network.png"), bbox_inches='tight')
-    plt.close()
-
-    # Create World
-    world = CostMatrices(location) #Define the class based on locations
+    if args.sparse:
+        # Sparse mode - n x n matrices are exactly what we cannot afford here
+        world = SparseCostMatrices(location, k=args.sparse, seed=args.seed, congestion_zones=args.congestion)
+        print(f"Kept {len(world.indices)} candidate routes ({world.nbytes / 1e6:.1f} MB of cost arrays; the solver's lookups and OR Tools' model come on top)")
+        records = SparseSolveAll(world, OBJECTIVES)
+    else:
+        s = duration
+        sample = num
 
-    print("AFFECT ON TIME COSTS DUE TO REAL WORLD ELEMENTS")
-    print(f"\nNOTE: In addition, some random effects on time/distance caused by accidents (eg. bridge collapse) are also occuring. If major accident, you will be notified.\n")
+        # Create World
+        world = CachedWorld(location, args.seed, congestion_zones=args.congestion) #Define the class based on locations, reusing it if we have built it with this seed before
 
-    # Save Time Effect Plot
-    world.PlotTimeEffect(save_path=os.path.join(output_dir, "time_effect.png"))
+        print("AFFECT ON TIME COSTS DUE TO REAL WORLD ELEMENTS")
+        print(f"\nNOTE: In addition, some random effects on time/distance caused by accidents (eg. bridge collapse) are also occuring. If major accident, you will be notified.\n")
+        for notification in world.notifications:
+            print(notification)
 
-    print(f"--------------------------------------------")
+        print(f"--------------------------------------------")
 
-    print("AFFECT ON SAEFTY")
-    # Save Safety Scale Plot
-    world.PlotSafetyScale(save_path=os.path.join(output_dir, "safety_scale.png"))
-    print(f"--------------------------------------------")
+        print("AFFECT ON SAEFTY")
+        print(f"--------------------------------------------")
 
-    # Solve
-    mandist, routdist, soldist = TSPSolver(world.distance)
-    mantime, routtime, soltime = TSPSolver(world.time)
-    mansafe, routsafe, solsafe = TSPSolver(world.safety)
+        # Solve - all four objectives go to a process pool with a worker per CPU (up to four), see benchmark.py --pool for timings
+        budget = None
+        if any(value is not None for value in (args.per_node, args.patience, args.gap, args.deadline)):
+            budget = Budget(per_node=args.per_node, patience=args.patience, gap=args.gap)
+        checkpoint = output_dir if args.checkpoint or args.resume else None
+        if checkpoint:
+            print(f"Streaming improving tours to {output_dir} (see <objective>_solutions.jsonl and <objective>_checkpoint.json)")
+        records = SolvePool(world, OBJECTIVES, budget=budget, deadline=args.deadline, polish=args.polish, checkpoint=checkpoint,
+                            interval=args.checkpoint or 30, resume=bool(args.resume))
 
-    print("Optimising for Distance (in km):")
-    route_d, dist_d, time_d, safety_d = print_solution(mandist, routdist, soldist, world)
-    print(f"--------------------------------------------\n\n")
+    headings = {
+        "distance": "Optimising for Distance (in km):",
+        "time": "Optimising for Time (in hours, assuming average speed of 50km/hr:",
+        "safety": "Optimising for Safety:",
+        "custom": "Optimised for Custom Weights:",
+    }
 
-    print("Optimising for Time (in hours, assuming average speed of 50km/hr:")
-    route_t, dist_t, time_t, safety_t = print_solution(mantime, routtime, soltime, world)
-    print(f"--------------------------------------------\n\n")
+    for name, record in records.items():
+        print(headings[name])
+        print_route(record.route, record.distance, record.time, record.safety)
+        print(f"--------------------------------------------\n\n")
 
-    print("Optimising for Safety:")
-    route_s, dist_s, time_s, safety_s = print_solution(mansafe, routsafe, solsafe, world)
-    print(f"--------------------------------------------\n\n")
+    # Robustness - how each tour holds up when more accidents happen, rather than in the world as it is
+    if args.robustness:
+        reports = ScoreRobustness(world, records, args.robustness, weights=OBJECTIVES["custom"], seed=args.seed)
+        print(f"Robustness over {args.robustness} random disruptions (mean / CVaR {reports['custom'].alpha:.0%} of the custom blend):")
+        for name, report in reports.items():
+            print(f"  {name}: {report.expected[3]:.1f} / {report.cvar[3]:.1f}, Dist: {report.expected[0]:.1f}km, "
+                  f"Time: {report.expected[1]:.1f}hr, Safe: {report.expected[2]:.1f}, "
+                  f"infeasible in {report.infeasible_rate:.1%} ({report.detours:.1f} routes blocked on average)")
+        print(f"--------------------------------------------\n\n")
 
-    #Creating a Route with custom weights
+    # Pareto Sweep
+    if args.pareto:
+        front = ParetoSweep(world, args.pareto)
+        print(f"Pareto front: {len(front.records)} tours from {front.solves} weight vectors "
+              f"({front.duplicates} duplicates) in {front.wall_time:.1f}s, hypervolume {front.hypervolume:.3f}")
+        for record in sorted(front.records, key=lambda r: r.distance):
+            weights = ", ".join(f"{w:.2f}" for w in record.weights)
+            print(f"  weights ({weights}) -> Dist: {record.distance:.1f}km, Time: {record.time:.1f}hr, Safe: {record.safety:.1f}")
+        print(f"--------------------------------------------\n\n")
 
-    distance_weight = 0.3
-    time_weight = 0.3
-    safety_weight = 0.4
+    # Fleet Plan
+    plan = None
+    if args.vehicles > 1:
+        # With no capacity the cheapest plan is one vehicle making every stop, so by default the stops are shared out evenly.
+        # Stops the fleet cannot fit in (capacity or max time) are dropped at a price above any feasible route, so the rest
+        # still get a plan
+        capacity = args.capacity if args.capacity is not None else -(-(num - 1) // args.vehicles)
+        fleet = Fleet(vehicles=args.vehicles, demands=[0] + [1] * (num - 1), capacities=capacity, max_time=args.max_time,
+                      drop_penalty=INFEASIBLE)
+        plan = SolveFleet(world, fleet, OBJECTIVES["custom"], polish=args.polish)
+        if len(plan.dropped) == num - 1:
+            print(f"No fleet plan found: {args.vehicles} vehicles could not make any of the stops within a capacity of {capacity} "
+                  f"stops and a max time of {args.max_time} hours in {duration} seconds of search")
+            plan = None
+        else:
+            print(f"Fleet plan: {args.vehicles} vehicles in {plan.clusters} clusters, {plan.wall_time:.1f}s")
+            for record, load in zip(plan.records, plan.loads):
+                print(f"{record.name.capitalize()}, {load:.0f} stops:")
+                print_route(record.route, record.distance, record.time, record.safety)
+            if plan.dropped:
+                print(f"Could not fit {len(plan.dropped)} stops into the fleet: {plan.dropped}")
+            print(f"Fleet total - Dist: {plan.distance:.1f}km, Time: {plan.time:.1f}hr, Safe: {plan.safety:.1f}")
+        print(f"--------------------------------------------\n\n")
 
-    newmatrix = np.add(np.multiply(distance_weight, world.distance), np.multiply(time_weight, world.time), np.multiply(safety_weight, world.safety))
+    # Figures - only rendered once every solve is done, so they never take CPU from a solve running on a wall clock budget. They
+    # are drawn side by side by workers forked with matplotlib already loaded.
+    Preload()
+    with ProcessPoolExecutor(max_workers=min(4, os.cpu_count() or 1)) as figures:
+        rendering = []
+        if not args.sparse:
+            # Sparse mode - the all-routes plots are exactly what we cannot afford there
+            rendering.append(plot_initial_network(location, os.path.join(output_dir, "initial_network.png"),
+                                                  args.plot_edges, args.plot_knn, pool=figures))
+            rendering.append(world.PlotTimeEffect(save_path=os.path.join(output_dir, "time_effect.png"),
+                                                  max_edges=args.plot_edges, k=args.plot_knn, pool=figures, notify=False))
+            rendering.append(world.PlotSafetyScale(save_path=os.path.join(output_dir, "safety_scale.png"),
+                                                   max_edges=args.plot_edges, k=args.plot_knn, pool=figures))
+        rendering.append(plot_collage(records, location, os.path.join(output_dir, "optimisation_collage.png"), pool=figures))
+        if plan is not None:
+            rendering.append(plot_fleet(plan, location, os.path.join(output_dir, "fleet_routes.png"), pool=figures))
 
-    manweight, routweight, solweight = TSPSolver(newmatrix)
+        # Wait for the figures, which also passes on any error from drawing them
+        for future in rendering:
+            future.result()
 
-    print("Optimised for Custom Weights:")
-    route_w, dist_w, time_w, safety_w = print_solution(manweight, routweight, solweight, world)
-    print(f"--------------------------------------------\n\n")
-    
-    # Create Collage
-    fig, axs = plt.subplots(2, 2, figsize=(20, 16))
-    
-    # Plot Distance Optimized
-    plot_route_on_ax(axs[0, 0], route_d, location, 
-                     f"Optimized for Distance\nDist: {dist_d:.1f}km, Time: {time_t:.1f}hr, Safe: {safety_d:.1f}", 
-                     color_code='blue')
-    
-    # Plot Time Optimized
-    plot_route_on_ax(axs[0, 1], route_t, location, 
-                     f"Optimized for Time\nDist: {dist_t:.1f}km, Time: {time_t:.1f}hr, Safe: {safety_t:.1f}", 
-                     color_code='green')
-    
-    # Plot Safety Optimized
-    plot_route_on_ax(axs[1, 0], route_s, location, 
-                     f"Optimized for Safety\nDist: {dist_s:.1f}km, Time: {time_s:.1f}hr, Safe: {safety_s:.1f}", 
-                     color_code='orange')
-    
-    # Plot Weighted Optimized
-    plot_route_on_ax(axs[1, 1], route_w, location, 
-                     f"Optimized for Custom Weights\nDist: {dist_w:.1f}km, Time: {time_w:.1f}hr, Safe: {safety_w:.1f}", 
-                     color_code='purple')
-    
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_dir, "optimisation_collage.png"), bbox_inches='tight')
-    plt.close()
-    
     print(f"All outputs have been saved to {output_dir}")
@@ -1,189 +1,495 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from utils.geometry import haversine_distance, RouteCircleIntersect
-from utils.world_elements import TimeWorldElements
-from config import avgspeed
+from utils.geometry import haversine_distance
+from utils.world_elements import TimeWorldElements, CongestionZones
+from utils.spatial_index import ZoneGrid, ZoneHits
+from utils.plotting import MAX_EDGES, PlotEdges, Render, DrawTimeEffect, DrawSafetyScale
+from config import avgspeed, quantize
+
+INFEASIBLE = np.iinfo(np.int32).max       #Quantized cost of a route that cannot be taken at all
+
+def PairBlocks(num, max_pairs=250000):
+    """
+    Generator which walks the upper triangle (i < j) of an num x num matrix in row order, yielding (i, j) index arrays
+    of at most roughly max_pairs routes at a time. The order is exactly the order of the old double loop, which matters since
+    the random safety draws are taken in this order.
+
+    """
+    start = 0
+    while start < num - 1:
+        stop = start + 1
+        count = num - 1 - start
+        while stop < num - 1 and count + (num - 1 - stop) <= max_pairs:
+            count += num - 1 - stop
+            stop += 1
+
+        rows = np.arange(start, stop)
+        per_row = num - 1 - rows
+        i = np.repeat(rows, per_row)
+        first = np.cumsum(per_row) - per_row
+        j = np.arange(len(i)) - np.repeat(first, per_row) + np.repeat(rows + 1, per_row)
+        yield i, j
+        start = stop
+
+
+def BoxPairs(x, y, box, max_pairs=250000):
+    """
+    Generator of the (i, j) routes, i < j, whose bounding box overlaps box = (xmin, xmax, ymin, ymax) - only those can pass
+    through anything inside it. Each node is classed as left of, inside or right of the box across, and below, inside or above
+    it up, and a route misses the box whenever both its ends are off the same side, so we only ever pair up classes that can
+    overlap. The work then grows with the routes near the box rather than with all n^2 of them.
+
+    Yields (i, j) index arrays of at most roughly max_pairs routes at a time.
+
+    """
+    xmin, xmax, ymin, ymax = box
+    across = (x >= xmin).astype(np.int64) + (x > xmax)
+    up = (y >= ymin).astype(np.int64) + (y > ymax)
+    classes = across * 3 + up
+    groups = [np.nonzero(classes == c)[0] for c in range(9)]
+
+    for a in range(9):
+        for b in range(a, 9):
+            ax, ay, bx, by = a // 3, a % 3, b // 3, b % 3
+            if (ax == bx and ax != 1) or (ay == by and ay != 1) or not len(groups[a]) or not len(groups[b]):
+                continue
+            first, second = groups[a], groups[b]
+            rows = max(1, max_pairs // len(second))
+            for start in range(0, len(first), rows):
+                i = np.repeat(first[start:start + rows], len(second))
+                j = np.tile(second, len(first[start:start + rows]))
+                if a == b:
+                    keep = i < j
+                    yield i[keep], j[keep]
+                else:
+                    yield np.minimum(i, j), np.maximum(i, j)
+
+def ZoneScaling(lat1, lon1, lat2, lon2, zones, grid=None):
+    """
+    Works out how much the time zones stretch each route, for routes given as 1D arrays of endpoints.
+
+    Returns (forward, backward) multipliers for going 1 -> 2 and 2 -> 1. Every zone a route passes through multiplies both by its
+    scale, except Hills, which are uphill one way (times scale) and downhill the other (divided by scale).
+
+    """
+    route, zone = ZoneHits(lon1, lat1, lon2, lat2, zones, grid)
+    scale = zones[zone, 4]
+    hill = zones[zone, 3] == 0
+
+    forward = np.ones(len(lat1))
+    backward = np.ones(len(lat1))
+    np.multiply.at(forward, route, scale)
+    np.multiply.at(backward, route, np.where(hill, 1 / scale, scale))
+    return forward, backward
+
+def ZoneIndex(zones, zone_index="auto"):
+    """
+    Builds a ZoneGrid for the zones if it is worth it - zone_index can be "grid", "brute" (every route against every zone),
+    or "auto", which uses the grid once there are more than a few dozen zones.
+
+    """
+    if zone_index == "grid" or (zone_index == "auto" and len(zones) > 48):
+        return ZoneGrid(zones)
+    return None
+
+
+def QuantizeCosts(values, infeasible=None, scale=quantize):
+    """
+    Integer version of some costs for the solver - values times scale, rounded to an int32. The routes in the infeasible mask
+    (if given) cost INFEASIBLE, and anything else is capped at a sixteenth of that, so that a tour is always better off taking
+    a few very difficult routes (eg. both routes to a node with a major issue) than a single impossible one.
+
+    """
+    quantized = np.rint(np.clip(np.asarray(values, dtype=np.float64) * scale, 0, INFEASIBLE // 16)).astype(np.int32)
+    if infeasible is not None:
+        quantized[infeasible] = INFEASIBLE
+    return quantized
+
 
 class CostMatrices:
-    def __init__(self, locations):
+    def __init__(self, locations, seed=None, block_size=250000, congestion_zones=0, zone_index="auto", dtype=np.float32):
+        """
+        Sets up the world for our locations - the time zones and accidents straight away, and the distance, time and safety
+        matrices lazily, each one only built the first time it is asked for (and then kept). So a run that only needs distances
+        never pays for zone scaling or the safety draws, and time brings in distance (which it is built from) but not safety.
+
+        Everything random is drawn from the global np.random unless a seed is given, in which case the same locations and seed
+        always give the same world, whichever matrices are built and in whatever order - the safety values come from their own
+        random stream, seeded when the world is set up.
+
+        congestion_zones adds that many small urban congestion zones on top of the usual ones (see CongestionZones). With lots of
+        zones, routes are only tested against the zones a spatial index says they come near (see ZoneIndex).
+
+        The matrices are stored as dtype (float32 unless asked otherwise), and routes made impossible by accidents are marked in the
+        boolean infeasible matrix rather than given a huge time - their time is still the time the route would take. The solver
+        works on int32 copies from Quantized, and Weighted gives blends of the three.
+
+        """
+        rng = np.random if seed is None else np.random.RandomState(seed)
         self.locations = locations
+        self.seed = seed
         self.num = len(locations)
-        self.distance = np.zeros((self.num, self.num))
-        self.time = np.zeros((self.num, self.num))
-        self.safety = np.zeros((self.num, self.num))
+        self.dtype = dtype
+        self.block_size = block_size
+        self.zone_index = zone_index
+        self._distance = None
+        self._time = None
+        self._safety = None
+        self.infeasible = np.zeros((self.num, self.num), dtype=bool)
+        self.quantized = {}                               #Shared int32 copies for the solver, built by Quantized
         self.offset = 0
-        self.scaler = TimeWorldElements(self.locations, self.num)
-        self.notifications = []
-
-        for i, loc in enumerate(self.locations):
-            for j in range(i+1, self.num):
-                
-                
-                # Setting up the Distance Values
-                latj, lonj = self.locations[j]
-                d = haversine_distance(loc[0], loc[1], latj, lonj)
-                self.distance[i][j] = d
-                self.distance[j][i] = d
-
-                self.time[i][j] = d / avgspeed
-                self.time[j][i] = d / avgspeed
-
-                # Setting up the Safety Values
-                scale = np.random.uniform(-1*self.num, self.num)
-                self.safety[i][j] += scale
-                self.safety[j][i] += scale
-                self.offset = self.safety.min()
-                if self.offset < 0:
-                    self.safety = np.add(self.safety, -1*self.offset)
-                    np.fill_diagonal(self.safety, 0)
-
-                #Scaling Time Values
-                for k in range(len(self.scaler)):
-                    x1 = self.locations[i][1]
-                    y1 = self.locations[i][0]
-
-                    x2 = self.locations[j][1]
-                    y2 = self.locations[j][0]
-
-                    a1 = self.scaler[k][2]
-                    b1 = self.scaler[k][1]
-                    r = self.scaler[k][0]
-                    type = self.scaler[k][3]
-                    scale = self.scaler[k][4]
-
-                    if (RouteCircleIntersect(x1, y1, x2, y2, a1, b1, r)):
-                        if type == 0:
-                            self.time[i][j] = self.time[i][j] * scale       #Uphill
-                            self.time[j][i] = self.time[j][i] / scale       #Downhill
-                        else:
-                            self.time[i][j] = self.time[i][j] * scale
-                            self.time[j][i] = self.time[j][i] * scale
-                
-    
-    
+        self.scaler = TimeWorldElements(self.locations, self.num, rng)
+        if congestion_zones:
+            self.scaler = np.vstack([self.scaler, CongestionZones(self.locations, congestion_zones, rng)])
+        self.blocked = np.empty((0, 2), dtype=int)       #Pairs of nodes whose routes are impossible
+        self.major = None                                 #Node hit by a major issue, if there is one
+        self.dirty = set()                                #Routes (i, j) changed by updates since the last TakeDirty
+
         # I also add some situations beyond these, for eg. a bridge breaking down, where it gets impossible to get to a certain node from some places
-        num_affected = np.random.uniform(0.05, 0.25)
+        num_affected = rng.uniform(0.05, 0.25)
         
-        nodes_affected = np.random.randint(0, self.num, int(np.round(num_affected * self.num)))
+        nodes_affected = rng.randint(0, self.num, int(np.round(num_affected * self.num)))
 
         
         
+        blocked = [self.blocked]
         for i in nodes_affected:
-            n = np.random.uniform(0.4, 0.8)
-            routes_with = np.random.randint(0, self.num, int(np.round(n*self.num)))
-            affect = [None] * len(routes_with)
-            for j in range(len(routes_with)):
-                if (i != routes_with[j]) & (routes_with[j] not in affect):
-                    self.time[i][routes_with[j]] = 1e15
-                    self.time[routes_with[j]][i] = 1e15
-                    #self.distance[i][routes_with[j]] *= 100
-                    #self.distance[routes_with[j]][i] *= 100
-                    s = f"Node {i} and Node {routes_with[j]} now impossible"
-                    self.notifications.append(s)
-                    affect.append(routes_with[j])
+            n = rng.uniform(0.4, 0.8)
+            routes_with = rng.randint(0, self.num, int(np.round(n*self.num)))
+
+            # Each route is only affected once, in the order it was first drawn
+            _, first = np.unique(routes_with, return_index=True)
+            affect = routes_with[np.sort(first)]
+            affect = affect[affect != i]
+
+            self.infeasible[i, affect] = True
+            self.infeasible[affect, i] = True
+            blocked.append(np.column_stack([np.full(len(affect), i), affect]))
                     
 
-        random_event = np.random.uniform(0,1)
+        self.blocked = np.concatenate(blocked)
+
+        random_event = rng.uniform(0,1)
         if (random_event > 0.90):
-            one = np.random.choice(nodes_affected)
+            one = rng.choice(nodes_affected)
+            self.major = int(one)
             print(f"Major Issue: All routes leading to/from Node {one} now impossible/very difficult ")
-            for i in range(self.num):
-                if i != one:
-                    self.time[i][one] = self.time[i][one] * 1e10
-                    self.time[one][i] = self.time[one][i] * 1e10
-                    #self.distance[i][one] = self.distance[i][one] * 1e8
-                    #self.distance[one][i] = self.distance[one][i] * 1e8
-
-    def PlotTimeEffect(self, save_path=None):
-        """ 
-        Simple function which plots our Time Affecting Zones over our scatterplot
-        
+
+        self.safety_seed = int(rng.randint(0, 2**31 - 1))
+
+    # The three objectives, each built on first use. Setting one (eg. when loading a cached world) skips building it.
+
+    @property
+    def distance(self):
+        if self._distance is None:
+            self._distance = self.BuildDistance()
+        return self._distance
+
+    @distance.setter
+    def distance(self, value):
+        self._distance = value
+
+    @property
+    def time(self):
+        if self._time is None:
+            self._time = self.BuildTime()
+        return self._time
+
+    @time.setter
+    def time(self, value):
+        self._time = value
+
+    @property
+    def safety(self):
+        if self._safety is None:
+            self._safety = self.BuildSafety()
+        return self._safety
+
+    @safety.setter
+    def safety(self, value):
+        self._safety = value
+
+    def BuildDistance(self):
         """
-        
-        # We need to access global x, y or regenerate them. 
-        # In the original code x and y were globals.
-        # To modularize properly without changing method signature, I should redefine them here or use self.locations
-        x = self.locations[:,1]
-        y = self.locations[:,0]
-        num = self.num
-        latmin, latmax, longmin, longmax = y.min(), y.max(), x.min(), x.max()
+        Great circle distance of every route, in km.
 
+        """
+        lat = self.locations[:,0]
+        lon = self.locations[:,1]
+        distance = np.zeros((self.num, self.num), dtype=self.dtype)
 
-        for i in range(len(self.notifications)):
-            print(self.notifications[i])
-        
-        plt.figure(figsize=(12, 8))
+        # We work through the routes in blocks so that the per route arrays stay a sensible size for 10k+ nodes
+        for i, j in PairBlocks(self.num, self.block_size):
+            d = haversine_distance(lat[i], lon[i], lat[j], lon[j])
+            distance[i, j] = d
+            distance[j, i] = d
+        return distance
+
+    def BuildTime(self):
+        """
+        Time of every route in hours - its distance at the average speed, scaled by each zone it passes through (uphill and
+        downhill differ, so this one is asymmetric), and with any major issue on top.
 
-        choice = ["Hill", "Bad Terrain", "Good Terrain", "Bottleneck"]
-        plt.scatter(x,y,color = "navy", zorder = 10)
-        plt.title("Plot of Locations and Real World Time Distortions in our TSP")
-        plt.xlabel("Longitude")
-        plt.ylabel("Latitude")
+        """
+        lat = self.locations[:,0]
+        lon = self.locations[:,1]
+        distance = self.distance
+        time = np.zeros((self.num, self.num), dtype=self.dtype)
+        grid = ZoneIndex(self.scaler, self.zone_index)
 
-        colour = ["yellow", "orange", "green", "red"]
+        # In blocks, so that the (routes x zones) arrays stay a sensible size for 10k+ nodes
+        for i, j in PairBlocks(self.num, self.block_size):
+            forward, backward = ZoneScaling(lat[i], lon[i], lat[j], lon[j], self.scaler, grid)
+            time[i, j] = distance[i, j] / avgspeed * forward
+            time[j, i] = distance[i, j] / avgspeed * backward
 
-        added_labels = set()
+        if self.major is not None:
+            others = np.arange(self.num) != self.major
+            time[others, self.major] = time[others, self.major] * 1e10
+            time[self.major, others] = time[self.major, others] * 1e10
+        return time
 
-        scale = self.scaler[:,4]
+    def BuildSafety(self):
+        """
+        Safety cost of every route - a random draw per route (the same both ways), shifted so that they are all non-negative.
 
-        for item in self.scaler:
-            label = choice[int(item[3])] if choice[int(item[3])] not in added_labels else ""
-            if label: added_labels.add(label)
-            zone = plt.Circle((item[2],item[1]), item[0], color = colour[int(item[3])], alpha = 0.25 + 0.25*((item[4] - scale.min())/(scale.max() - scale.min())), label=label, zorder = 5)
-            plt.gca().add_patch(zone)
-        plt.grid()
-        
-        for i in range(num):
-            for j in range(i+1, num):
-                plt.plot([x[i], x[j]], [y[i], y[j]], 'gray', alpha=0.15, linewidth=0.5, zorder = 1)
+        """
+        rng = np.random.RandomState(self.safety_seed)
+        safety = np.zeros((self.num, self.num), dtype=self.dtype)
+        offset = 0
+        for i, j in PairBlocks(self.num, self.block_size):
+            scale = rng.uniform(-1*self.num, self.num, len(i))
+            safety[i, j] = scale
+            safety[j, i] = scale
+            offset = min(offset, scale.min())
+
+        # One offset pass at the end, so that the safety costs are all non-negative
+        self.offset = offset
+        if offset < 0:
+            safety += -1*offset
+            np.fill_diagonal(safety, 0)
+        return safety
+
+    def Weighted(self, weights, out=None):
+        """
+        The blend weights[0] * distance + weights[1] * time + weights[2] * safety, as one dtype matrix (into out if given).
+
+        It is built a block of rows at a time, so apart from the result there is never more than a block's worth of extra memory,
+        and matrices with a zero weight are left out entirely (so never built, if they had not been yet). Infeasible routes keep
+        whatever blend they get - see the infeasible mask, or BlendMatrices for the solver's integer version.
+
+        """
+        parts = [(getattr(self, name), float(w)) for name, w in zip(("distance", "time", "safety"), weights) if w != 0]
+        if out is None:
+            out = np.zeros((self.num, self.num), dtype=np.result_type(*[matrix for matrix, _ in parts]) if parts else np.float32)
+
+        rows = max(1, 1000000 // max(self.num, 1))
+        for start in range(0, self.num, rows):
+            part = slice(start, start + rows)
+            block = out[part]
+            block[...] = 0
+            for matrix, w in parts:
+                block += w * matrix[part]
+        return out
+
+    @property
+    def notifications(self):
+        """
+        Messages for each route made impossible by an accident. These are only built when asked for, as big worlds have millions.
+
+        """
+        return [f"Node {i} and Node {j} now impossible" for i, j in self.blocked]
 
-        plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+    # Incremental updates - each of these only recomputes the routes the change can affect, and records them in self.dirty
 
-        plt.xlim(longmin-5, longmax+5)
-        plt.ylim(latmin-5, latmax+5)
-        plt.axis('equal')
+    def BlockEdge(self, i, j):
+        """
+        Makes the route between nodes i and j impossible (in both directions), eg. a bridge collapse.
+
+        """
+        if self.infeasible[i, j]:
+            return
+        self.blocked = np.vstack([self.blocked, [[i, j]]])
+        self.infeasible[i, j] = True
+        self.infeasible[j, i] = True
+        self.Changed(np.array([i]), np.array([j]))
+
+    def UnblockEdge(self, i, j):
+        """
+        Reopens a blocked route between nodes i and j. Its time was kept all along, so nothing has to be worked out again.
+
+        """
+        keep = ~(((self.blocked[:,0] == i) & (self.blocked[:,1] == j)) | ((self.blocked[:,0] == j) & (self.blocked[:,1] == i)))
+        self.blocked = self.blocked[keep]
+        self.infeasible[i, j] = False
+        self.infeasible[j, i] = False
+        self.Changed(np.array([i]), np.array([j]))
+
+    def AddZone(self, radius, lat, lon, type, scale):
+        """
+        Adds a time zone, in the same terms as TimeWorldElements (type 0 Hill, 1 Bad Terrain, 2 Good Terrain, 3 Bottleneck).
+        Returns its index, for MoveZone and RemoveZone.
+
+        """
+        self.scaler = np.vstack([self.scaler, [[radius, lat, lon, type, scale]]])
+        self.RefreshTime(*self.RoutesThrough(self.scaler[-1]))
+        return len(self.scaler) - 1
+
+    def MoveZone(self, k, lat, lon, radius=None):
+        """
+        Moves zone k (and optionally resizes it). Routes through either the old or the new circle are recomputed.
+
+        """
+        old = self.scaler[k].copy()
+        self.scaler = np.array(self.scaler)
+        self.scaler[k, 1], self.scaler[k, 2] = lat, lon
+        if radius is not None:
+            self.scaler[k, 0] = radius
+        self.RefreshTime(*self.RoutesThrough(old, self.scaler[k]))
+
+    def RemoveZone(self, k):
+        """
+        Removes zone k. Later zones move down one index.
+
+        """
+        old = self.scaler[k].copy()
+        self.scaler = np.delete(self.scaler, k, axis=0)
+        self.RefreshTime(*self.RoutesThrough(old))
+
+    def SetSafetyRegion(self, lat, lon, radius, factor):
+        """
+        Multiplies the safety cost of every route passing through a circular region by factor - above 1 for a region that has
+        become more dangerous, below 1 for one that has become safer.
+
+        """
+        i, j = self.RoutesThrough([radius, lat, lon, 0, 1])
+        self.safety[i, j] *= factor
+        self.safety[j, i] *= factor
+        self.Changed(i, j)
+
+    def TakeDirty(self):
+        """
+        Returns the routes changed since the last call, and starts a fresh set.
+
+        """
+        dirty, self.dirty = self.dirty, set()
+        return dirty
+
+    def Changed(self, i, j):
+        """
+        Records that the routes i -> j and j -> i have changed - they go in self.dirty, and any int32 copies Quantized has kept
+        are brought up to date for just those routes.
+
+        """
+        self.dirty.update(zip(i.tolist(), j.tolist()))
+        self.dirty.update(zip(j.tolist(), i.tolist()))
+        for name, quantized in self.quantized.items():
+            matrix = getattr(self, name)
+            quantized[i, j] = QuantizeCosts(matrix[i, j], self.Blocked(name, i, j))
+            quantized[j, i] = QuantizeCosts(matrix[j, i], self.Blocked(name, j, i))
+
+    def Blocked(self, name, i, j=slice(None)):
+        """
+        The infeasible mask for the routes i -> j (any index NumPy takes) as far as the named matrix is concerned. Only time
+        is affected - a blocked route used to be one with a huge time, and its distance and safety never changed - so this is
+        None for distance and safety.
+
+        """
+        return self.infeasible[i, j] if name == "time" else None
+
+    def Quantized(self, name, scale=None, out=None):
+        """
+        int32 copy of the "distance", "time" or "safety" matrix for the solver (see QuantizeCosts), with infeasible routes at
+        INFEASIBLE in the time matrix (distance and safety keep their real values, see Blocked). The copy at the config.quantize
+        scale is built once and shared by every solve (the incremental updates keep it up to date), a copy at any other scale is
+        built fresh each time.
+
+        With out (an int32 n x n array, eg. a shared memory block) the copy is written there instead and not kept, so there is
+        no second int32 copy alive next to it - unless one had already been kept, which is then just copied over.
+
+        """
+        if scale is None and name in self.quantized:
+            if out is None:
+                return self.quantized[name]
+            out[...] = self.quantized[name]
+            return out
+
+        matrix = getattr(self, name)
+        quantized = np.empty((self.num, self.num), dtype=np.int32) if out is None else out
+        # A block of rows at a time, so there is never a full float64 copy of the matrix
+        rows = max(1, 1000000 // max(self.num, 1))
+        for start in range(0, self.num, rows):
+            part = slice(start, start + rows)
+            quantized[part] = QuantizeCosts(matrix[part], self.Blocked(name, part), quantize if scale is None else scale)
+
+        if scale is None and out is None:
+            self.quantized[name] = quantized
+        return quantized
+
+    def RoutesThrough(self, *zones):
+        """
+        (i, j) arrays, with i < j, of every route passing through any of the given zones (rows like self.scaler has).
+
+        Only the routes whose bounding box overlaps a zone's are tested (see BoxPairs), so an update only costs in proportion
+        to the routes near the zone, not a pass over every route in the world.
+
+        """
+        zones = np.atleast_2d(np.array(zones, dtype=float))
+        lat = self.locations[:,0]
+        lon = self.locations[:,1]
+        found = [np.empty(0, dtype=np.int64)]
+        for zone in zones:
+            radius, zlat, zlon = zone[0], zone[1], zone[2]
+            for i, j in BoxPairs(lon, lat, (zlon - radius, zlon + radius, zlat - radius, zlat + radius), self.block_size):
+                route, _ = ZoneHits(lon[i], lat[i], lon[j], lat[j], zone[None, :])
+                found.append(i[route] * self.num + j[route])
+        found = np.unique(np.concatenate(found))
+        return found // self.num, found % self.num
+
+    def RefreshTime(self, i, j):
+        """
+        Recomputes the time of the routes i -> j and j -> i (for i < j) from scratch - distance at average speed, every zone,
+        then any major issue on top.
+
+        """
+        if len(i) == 0:
+            return
+        lat = self.locations[:,0]
+        lon = self.locations[:,1]
+        forward, backward = ZoneScaling(lat[i], lon[i], lat[j], lon[j], self.scaler, ZoneIndex(self.scaler))
+        forward = self.distance[i, j] / avgspeed * forward
+        backward = self.distance[i, j] / avgspeed * backward
+
+        if self.major is not None:
+            major = (i == self.major) | (j == self.major)
+            forward[major] *= 1e10
+            backward[major] *= 1e10
+
+        self.time[i, j] = forward
+        self.time[j, i] = backward
+        self.Changed(i, j)
+
+    def PlotTimeEffect(self, save_path=None, max_edges=MAX_EDGES, k=None, pool=None, notify=True):
+        """ 
+        Simple function which plots our Time Affecting Zones over our scatterplot
+
+        All the routes go into one LineCollection. Past max_edges routes only a sample of them is drawn (or the routes to each
+        node's k nearest neighbours, with k set). With a process pool, the figure is rendered there and the Future returned.
+        The routes made impossible by accidents are printed first, unless notify is False.
         
-        if save_path:
-            plt.savefig(save_path, bbox_inches='tight')
-            plt.close()
-        else:
-            plt.show()    
+        """
+        if notify:
+            for notification in self.notifications:
+                print(notification)
 
+        i, j = PlotEdges(self.locations, max_edges, k)
+        return Render(DrawTimeEffect, save_path, np.asarray(self.locations), np.asarray(self.scaler), i, j, pool=pool)
 
-            
-    def PlotSafetyScale(self, save_path=None):
+    def PlotSafetyScale(self, save_path=None, max_edges=MAX_EDGES, k=None, pool=None):
         """ 
         Simple function which plots our Safety metrics over our scatterplot. Darker colours imply less safe (and so costlier) routes.
+
+        Takes the same max_edges, k and pool as PlotTimeEffect.
         
         """
-        x = self.locations[:,1]
-        y = self.locations[:,0]
-        num = self.num
-        latmin, latmax, longmin, longmax = y.min(), y.max(), x.min(), x.max()
-
-        plt.figure(figsize=(10, 8))
-        plt.scatter(x,y,color = "navy", zorder = 10)
-        plt.title("Plot of Locations and Routes, shaded by safety level (darker is worse)")
-        plt.xlabel("Longitude")
-        plt.ylabel("Latitude")
-
-        plt.grid()
-    
-        for i in range(num):
-            for j in range(i+1, num):
-                plt.plot([x[i], x[j]], [y[i], y[j]],
-                        color=plt.cm.YlOrRd(
-                            (self.safety[i, j] - self.safety.min()) /
-                            (self.safety.max() - self.safety.min())
-                        ),
-                        alpha=0.6, linewidth=1)
-
-        plt.xlim(longmin-5, longmax+5)
-        plt.ylim(latmin-5, latmax+5)
-        plt.axis('equal')
-        
-        if save_path:
-            plt.savefig(save_path, bbox_inches='tight')
-            plt.close()
-        else:
-            plt.show()
+        i, j = PlotEdges(self.locations, max_edges, k)
+        return Render(DrawSafetyScale, save_path, np.asarray(self.locations), i, j, np.asarray(self.safety[i, j]), pool=pool)
@@ -0,0 +1,185 @@
+import numpy as np
+from config import avgspeed
+from utils.geometry import haversine_distance
+from utils.world_elements import TimeWorldElements, CongestionZones
+from models.cost_matrices import ZoneScaling, ZoneIndex
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+def UnitVectors(locations):
+    """
+    Projects [lat, lon] pairs onto the unit sphere. Straight line distance between these points only grows with the Haversine
+    distance, so the k nearest neighbours in 3D are exactly the k nearest by great circle distance.
+
+    """
+    lat = np.radians(locations[:,0])
+    lon = np.radians(locations[:,1])
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+def NearestNeighbours(locations, k, block=1024):
+    """
+    Returns an (n, k) array of the k nearest other locations to each location.
+
+    Uses a scipy KD-tree when scipy is installed. Otherwise it falls back to NumPy, comparing a block of rows against every point
+    at a time, which is O(n^2) work but never holds more than block x n distances.
+
+    """
+    points = UnitVectors(locations)
+    k = min(k, len(points) - 1)
+
+    if cKDTree is not None:
+        _, nearest = cKDTree(points).query(points, k + 1)
+        return nearest[:, 1:]
+
+    nearest = np.empty((len(points), k), dtype=np.int64)
+    for start in range(0, len(points), block):
+        rows = points[start:start + block]
+        # For unit vectors, |a - b|^2 = 2 - 2 a.b, so the largest dot products are the nearest points
+        closeness = rows @ points.T
+        closeness[np.arange(len(rows)), np.arange(start, start + len(rows))] = -np.inf
+        part = np.argpartition(-closeness, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(closeness, part, axis=1), axis=1)
+        nearest[start:start + block] = np.take_along_axis(part, order, axis=1)
+    return nearest
+
+def PairUniform(i, j, seed):
+    """
+    A repeatable uniform draw in [0, 1) for each (unordered) pair of nodes, from a splitmix64 hash of the pair and the seed.
+    This is what lets a far route's safety be worked out on demand and always come out the same.
+
+    """
+    a = np.minimum(i, j).astype(np.uint64)
+    b = np.maximum(i, j).astype(np.uint64)
+    z = (a << np.uint64(32)) ^ b ^ np.uint64((seed or 0) * 0x9E3779B97F4A7C15 % 2**64)
+    z = (z + np.uint64(0x9E3779B97F4A7C15))
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    z = z ^ (z >> np.uint64(31))
+    return (z >> np.uint64(11)).astype(np.float64) / 2.0**53
+
+
+class SparseCostMatrices:
+    """
+    A k nearest neighbour version of CostMatrices for instances too big for dense n x n matrices.
+
+    Only the routes between each node and its k nearest neighbours (in either direction) are stored, in CSR arrays - the routes
+    leaving node i are indices[indptr[i]:indptr[i+1]], with their costs at the same positions of distance, time and safety.
+    Anything else is worked out when asked for by Costs, in exactly the same way, so it does not matter whether a route was stored.
+
+    The world is built like the dense one - the same time zones and optional congestion layer, Hills uphill one way and downhill
+    the other, blocked routes and the chance of a major issue - except that safety comes from a per pair hash (see PairUniform)
+    rather than a stream of draws, and accidents only block stored routes (marked in the infeasible mask, at the same positions).
+    So it is the same kind of world, but not the same numbers as CostMatrices for a given seed. Stored costs are float32.
+
+    """
+    def __init__(self, locations, k=16, seed=None, congestion_zones=0, zone_index="auto"):
+        rng = np.random if seed is None else np.random.RandomState(seed)
+        self.locations = locations
+        self.num = len(locations)
+        self.k = k
+        self.seed = seed if seed is not None else int(rng.randint(0, 2**31))
+        self.scaler = TimeWorldElements(self.locations, self.num, rng)
+        if congestion_zones:
+            self.scaler = np.vstack([self.scaler, CongestionZones(self.locations, congestion_zones, rng)])
+        self.grid = ZoneIndex(self.scaler, zone_index)
+        self.major = None
+
+        # Candidate routes - each node's k nearest, plus every node that has it among its k nearest
+        nearest = NearestNeighbours(self.locations, k)
+        rows = np.repeat(np.arange(self.num), nearest.shape[1])
+        cols = nearest.ravel()
+        keys = np.unique(np.concatenate([rows * self.num + cols, cols * self.num + rows]))
+        rows, cols = np.divmod(keys, self.num)
+
+        self.indptr = np.zeros(self.num + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=self.num), out=self.indptr[1:])
+        self.indices = cols
+        self.keys = keys
+
+        # Accidents - each affected node loses some of its stored routes, in both directions
+        blocked = np.zeros(len(keys), dtype=bool)
+        affected = rng.randint(0, self.num, int(np.round(rng.uniform(0.05, 0.25) * self.num)))
+        for i in affected:
+            row = np.arange(self.indptr[i], self.indptr[i+1])
+            lost = row[rng.uniform(0, 1, len(row)) < rng.uniform(0.4, 0.8)]
+            blocked[lost] = True
+            blocked[np.searchsorted(keys, self.indices[lost] * self.num + i)] = True
+        self.blocked = np.column_stack([rows[blocked], cols[blocked]])
+        self.infeasible = blocked
+
+        if rng.uniform(0, 1) > 0.90 and len(affected):
+            self.major = int(rng.choice(affected))
+            print(f"Major Issue: All routes leading to/from Node {self.major} now impossible/very difficult ")
+
+        self.distance, self.time, self.safety = (costs.astype(np.float32) for costs in self.Costs(rows, cols, stored=False))
+        if self.major is not None:
+            self.time[(rows == self.major) | (cols == self.major)] *= 1e10
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.indptr, self.indices, self.keys, self.distance, self.time, self.safety, self.infeasible))
+
+    def Weighted(self, weights):
+        """
+        The blend weights[0] * distance + weights[1] * time + weights[2] * safety of every stored route, in the CSR order, like
+        CostMatrices.Weighted. Zero weights are left out.
+
+        """
+        out = np.zeros(len(self.keys), dtype=np.float32)
+        for costs, w in zip((self.distance, self.time, self.safety), weights):
+            if w != 0:
+                out += float(w) * costs
+        return out
+
+    def Neighbours(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i+1]]
+
+    def Lookup(self, i, j):
+        """
+        Positions of the routes i -> j in the CSR arrays, and a mask of which ones are actually stored.
+
+        """
+        keys = np.asarray(i, dtype=np.int64) * self.num + np.asarray(j, dtype=np.int64)
+        position = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return position, self.keys[position] == keys
+
+    def Costs(self, i, j, stored=True):
+        """
+        (distance, time, safety) arrays for the routes i -> j, given as node arrays. Stored routes are read from the CSR arrays
+        and the rest are worked out on demand.
+
+        """
+        i = np.atleast_1d(np.asarray(i, dtype=np.int64))
+        j = np.atleast_1d(np.asarray(j, dtype=np.int64))
+        distance = np.empty(len(i))
+        time = np.empty(len(i))
+        safety = np.empty(len(i))
+
+        far = np.ones(len(i), dtype=bool)
+        if stored:
+            position, found = self.Lookup(i, j)
+            distance[found] = self.distance[position[found]]
+            time[found] = self.time[position[found]]
+            safety[found] = self.safety[position[found]]
+            far = ~found
+
+        fi, fj = i[far], j[far]
+        lat, lon = self.locations[:,0], self.locations[:,1]
+        d = haversine_distance(lat[fi], lon[fi], lat[fj], lon[fj])
+
+        # Zone scaling is worked out with the lower numbered node first, so i -> j and j -> i agree with each other
+        low, high = np.minimum(fi, fj), np.maximum(fi, fj)
+        forward, backward = ZoneScaling(lat[low], lon[low], lat[high], lon[high], self.scaler, self.grid)
+        t = d / avgspeed * np.where(fi == low, forward, backward)
+        if stored and self.major is not None:
+            t[(fi == self.major) | (fj == self.major)] *= 1e10
+
+        s = 2 * self.num * PairUniform(fi, fj, self.seed)
+        same = fi == fj
+        d[same], t[same], s[same] = 0, 0, 0
+
+        distance[far], time[far], safety[far] = d, t, s
+        return distance, time, safety
@@ -0,0 +1,110 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import config
+from models.cost_matrices import CostMatrices
+from utils.world_elements import ZoneCount
+
+CACHE_DIR = os.path.join("examples", "world_cache")
+CACHE_VERSION = 4       #Bump whenever CostMatrices would build a different world from the same inputs
+
+ARRAYS = ["locations", "distance", "time", "safety", "infeasible", "scaler", "blocked"]
+
+def WorldKey(locations, seed, congestion_zones=0):
+    """
+    Content address of a world - a hash of the location array, the seed, the congestion layer size, and the config parameters
+    that feed into CostMatrices.
+
+    """
+    locations = np.ascontiguousarray(locations, dtype=np.float64)
+    digest = hashlib.sha256()
+    digest.update(str(locations.shape).encode())
+    digest.update(locations.tobytes())
+    params = {"seed": seed, "congestion_zones": congestion_zones, "avgspeed": config.avgspeed, "version": CACHE_VERSION}
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()[:24]
+
+def WorldIdentity(world):
+    """
+    The WorldKey of a dense world that has already been built (its congestion layer is whatever scaler holds past the regional
+    zones), or None if it was not seeded, as then it can never be built the same way again.
+
+    """
+    if world.seed is None:
+        return None
+    return WorldKey(world.locations, world.seed, len(world.scaler) - ZoneCount(world.num))
+
+def SaveWorld(world, path):
+    """
+    Writes a world out as one .npy file per array plus a small meta.json, which also holds the settings the incremental updates
+    need (block_size, dtype, zone_index and the safety seed). It is written to a temporary folder first and then renamed into
+    place, so a half written world is never picked up by LoadWorld.
+
+    """
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent)
+
+    for name in ARRAYS:
+        np.save(os.path.join(tmp, f"{name}.npy"), np.asarray(getattr(world, name)))
+
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({"seed": world.seed, "offset": float(world.offset), "major": world.major, "block_size": int(world.block_size),
+                   "dtype": np.dtype(world.dtype).name, "zone_index": world.zone_index, "safety_seed": int(world.safety_seed),
+                   "version": CACHE_VERSION}, f)
+
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        # Someone else saved the same world first, which is fine as it is identical
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def LoadWorld(path):
+    """
+    Loads a world saved by SaveWorld. The big matrices are memory mapped copy-on-write, so loading is close to instant and
+    changing them in memory never touches the files on disk. Everything CostMatrices sets up is restored, so the loaded world
+    takes incremental updates (BlockEdge, AddZone, SetSafetyRegion and so on) just like a freshly built one.
+
+    """
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+
+    world = CostMatrices.__new__(CostMatrices)
+    for name in ARRAYS:
+        setattr(world, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="c"))
+
+    world.num = len(world.locations)
+    world.seed = meta["seed"]
+    world.offset = meta["offset"]
+    world.major = meta["major"]
+    world.block_size = meta["block_size"]
+    world.dtype = np.dtype(meta["dtype"]).type
+    world.zone_index = meta["zone_index"]
+    world.safety_seed = meta["safety_seed"]
+    world.dirty = set()
+    world.quantized = {}
+
+    if world.major is not None:
+        print(f"Major Issue: All routes leading to/from Node {world.major} now impossible/very difficult ")
+
+    return world
+
+def CachedWorld(locations, seed, cache_dir=CACHE_DIR, congestion_zones=0):
+    """
+    Returns the CostMatrices for these locations and seed, from the cache if we have built it before, otherwise building and
+    saving it. Without a seed the world can never be rebuilt the same way, so it is just built and not cached.
+
+    """
+    if seed is None:
+        return CostMatrices(locations, congestion_zones=congestion_zones)
+
+    path = os.path.join(cache_dir, WorldKey(locations, seed, congestion_zones))
+    if os.path.exists(os.path.join(path, "meta.json")):
+        return LoadWorld(path)
+
+    world = CostMatrices(locations, seed=seed, congestion_zones=congestion_zones)
+    SaveWorld(world, path)
+    return world
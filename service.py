@@ -0,0 +1,368 @@
+import json
+import time
+import asyncio
+import argparse
+import threading
+import http.client
+import numpy as np
+from collections import OrderedDict
+from urllib.parse import urlparse
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, resource_tracker
+from data.providers import ProviderFromSource
+from data.location_generator import ValidateLocations
+from models.cost_matrices import CostMatrices
+from models.world_cache import WorldKey, CachedWorld
+from solver.tsp_solver import TSPSolver, GetRoute
+from solver.solve_pool import SharedWorld, BlendMatrices, RecordFromRoute
+
+STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+# Shared memory blocks each worker has attached to so far, by name
+_attached = {}
+
+def _warm():
+    return True
+
+def _solve_shared(name, shape, weights, duration):
+    if name not in _attached:
+        shm = shared_memory.SharedMemory(name=name)
+        _attached[name] = (shm, np.ndarray(shape, dtype=np.int32, buffer=shm.buf))
+    start = time.perf_counter()
+    manager, routing, solution = TSPSolver(BlendMatrices(_attached[name][1], weights), duration=duration)
+    return GetRoute(manager, routing, solution), time.perf_counter() - start
+
+def QuantizeWeights(weights, step=0.01):
+    """
+    The cache key form of a (distance, time, safety) weight vector - scaled to sum to 1 and rounded to a multiple of step, so
+    blends that only differ by noise share one solve. The solve itself uses these rounded weights too, so a cached tour is
+    exactly the tour for its key.
+
+    """
+    weights = np.asarray(weights, dtype=float)
+    if weights.shape != (3,) or not np.all(np.isfinite(weights)) or np.any(weights < 0) or weights.sum() <= 0:
+        raise ValueError("weights must be 3 finite, non-negative numbers, not all 0")
+    weights = np.round(weights / weights.sum() / step) * step
+    return tuple(round(float(w), 6) for w in weights)
+
+def CheckDuration(duration):
+    """
+    A solve time budget from a request - None (the service default) or a finite number of seconds, at least 0.
+
+    """
+    if duration is None:
+        return None
+    if isinstance(duration, bool) or not isinstance(duration, (int, float)) or not np.isfinite(duration) or duration < 0:
+        raise ValueError(f"duration must be a finite number of seconds, at least 0, not {duration!r}")
+    return float(duration)
+
+def CheckWhole(value, name, minimum=0):
+    """
+    A whole number from a request, at least minimum. Bools and floats are turned away rather than rounded.
+
+    """
+    if isinstance(value, bool) or not isinstance(value, int) or value < minimum:
+        raise ValueError(f"{name} must be a whole number, at least {minimum}, not {value!r}")
+    return value
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class RoutingService:
+    """
+    A long lived local HTTP/JSON routing service. Worlds stay in memory (their int32 quantized matrices in shared memory, see
+    SharedWorld), solves go to a bounded pool of worker processes that keep OR Tools imported, and solved tours are kept in
+    an LRU cache of cache_size entries keyed by world hash (see WorldKey) and rounded weights (see QuantizeWeights). Identical
+    requests that arrive while the first is still solving all wait on that one solve rather than starting their own.
+
+    Endpoints, all JSON:
+
+    - POST /worlds {"locations": "random", "nodes": 50, "seed": 0, "congestion": 0} builds (or loads from the world cache) a
+      world and returns {"world": key, "nodes": n}. locations is a source like main.py --locations, or a list of [lat, lon]
+    - POST /solve {"world": key, "weights": [d, t, s], "duration": seconds} returns the tour and its costs on all three
+      objectives, with cached and coalesced saying whether it came from the cache or from someone else's solve
+    - GET /worlds, GET /stats
+
+    Use it as a context manager to run it on a background thread (eg. with ServiceClient against url), or call Serve to run
+    it in the foreground. Only ever bind it to a local address, there is no authentication.
+
+    """
+    def __init__(self, host="127.0.0.1", port=0, max_workers=2, cache_size=1024, weight_step=0.01, duration=None):
+        self.host = host
+        self.port = port
+        self.max_workers = max_workers
+        self.cache_size = cache_size
+        self.weight_step = weight_step
+        self.duration = duration
+        self.worlds = {}                                  #key -> (world, SharedWorld)
+        self.cache = OrderedDict()                        #(key, weights, duration) -> response, least recently used first
+        self.pending = {}                                 #Same keys -> Future of the solve in flight
+        self.stats = {"requests": 0, "hits": 0, "misses": 0, "coalesced": 0, "solves": 0}
+
+        # Fork the workers now, before any event loop or threads exist, sharing our resource tracker so that a worker exiting
+        # never cleans up a world's shared memory behind our back
+        resource_tracker.ensure_running()
+        self.pool = ProcessPoolExecutor(max_workers=max_workers)
+        self.pool.submit(_warm).result()
+        self.loop = None
+        self.server = None
+        self.connections = {}                             #Handler task -> its writer, for every open connection
+        self.thread = None
+        self.url = None
+
+    # Request handling
+
+    async def BuildWorld(self, body):
+        source = body.get("locations", "random")
+        seed = body.get("seed", 0)
+        try:
+            nodes = CheckWhole(body.get("nodes", 50), "nodes", 2)
+            congestion = CheckWhole(body.get("congestion", 0), "congestion")
+            if seed is not None:
+                seed = CheckWhole(seed, "seed")
+            if not isinstance(source, (list, str)):
+                raise ValueError(f"locations must be a source name, a file or a list of [lat, lon], not {source!r}")
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+
+        def build():
+            if isinstance(source, list):
+                locations = ValidateLocations(source)
+                if len(locations) < 2:
+                    raise ValueError("locations needs at least 2 points")
+            else:
+                locations = ProviderFromSource(source, nodes, seed=seed or 0).get()
+            key = WorldKey(locations, seed, congestion)
+            if key in self.worlds:
+                return key, None
+            if seed is None:
+                world = CostMatrices(locations, congestion_zones=congestion)
+            else:
+                world = CachedWorld(locations, seed, congestion_zones=congestion)
+            # Quantizing into shared memory is the slow part of a new world, so it happens here off the event loop too
+            return key, (world, SharedWorld(world))
+
+        try:
+            key, built = await self.loop.run_in_executor(None, build)
+        except (ValueError, TypeError, FileNotFoundError) as e:
+            # Bad locations - ragged or out of range lists, unknown sources, files that are not there
+            raise HTTPError(400, str(e))
+        if built is not None:
+            if key in self.worlds:
+                # Someone else built the same world while we were
+                built[1].__exit__(None, None, None)
+            else:
+                self.worlds[key] = built
+        return {"world": key, "nodes": self.worlds[key][0].num}
+
+    async def Solve(self, body):
+        key = body.get("world")
+        if not isinstance(key, str):
+            raise HTTPError(400, f"world must be the key /worlds gave back, not {key!r}")
+        if key not in self.worlds:
+            raise HTTPError(404, f"Unknown world {key}, POST it to /worlds first")
+        try:
+            weights = QuantizeWeights(body.get("weights", (0.3, 0.3, 0.4)), self.weight_step)
+            duration = body.get("duration")
+            duration = CheckDuration(self.duration if duration is None else duration)
+        except (TypeError, ValueError) as e:
+            raise HTTPError(400, str(e))
+        cache_key = (key, weights, duration)
+
+        self.stats["requests"] += 1
+        if cache_key in self.cache:
+            self.cache.move_to_end(cache_key)
+            self.stats["hits"] += 1
+            return {**self.cache[cache_key], "cached": True, "coalesced": False}
+
+        if cache_key in self.pending:
+            self.stats["coalesced"] += 1
+            return {**await asyncio.shield(self.pending[cache_key]), "cached": False, "coalesced": True}
+
+        self.stats["misses"] += 1
+        future = self.loop.create_future()
+        self.pending[cache_key] = future
+        try:
+            world, shared = self.worlds[key]
+            route, solve_time = await self.loop.run_in_executor(self.pool, _solve_shared, *shared.spec, weights, duration)
+            self.stats["solves"] += 1
+            record = RecordFromRoute("service", weights, route, [world.distance, world.time, world.safety], solve_time,
+                                     world.infeasible)
+            result = {"world": key, "weights": list(weights), "duration": duration, "route": [int(node) for node in route],
+                      "distance": record.distance, "time": record.time if np.isfinite(record.time) else None,
+                      "safety": record.safety, "solve_time": solve_time}
+            future.set_result(result)
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()                            #Retrieved, in case nobody else was waiting on it
+            raise
+        finally:
+            del self.pending[cache_key]
+
+        self.cache[cache_key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return {**result, "cached": False, "coalesced": False}
+
+    async def Route(self, method, path, body):
+        if path == "/worlds" and method == "POST":
+            return await self.BuildWorld(body)
+        if path == "/worlds" and method == "GET":
+            return {"worlds": [{"world": key, "nodes": world.num} for key, (world, _) in self.worlds.items()]}
+        if path == "/solve" and method == "POST":
+            return await self.Solve(body)
+        if path == "/stats" and method == "GET":
+            return {**self.stats, "cache_size": len(self.cache), "worlds": len(self.worlds), "workers": self.max_workers}
+        if path in ("/worlds", "/solve", "/stats"):
+            raise HTTPError(405, f"{method} not allowed on {path}")
+        raise HTTPError(404, f"No endpoint {path}")
+
+    async def Handle(self, reader, writer):
+        """
+        One client connection - HTTP/1.1 requests one after another (keep-alive) until the client closes it.
+
+        """
+        self.connections[asyncio.current_task()] = writer
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, path, _ = line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                data = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                try:
+                    body = json.loads(data) if data else {}
+                    if not isinstance(body, dict):
+                        raise HTTPError(400, "Request body must be a JSON object")
+                    status, response = 200, await self.Route(method, path.split("?")[0], body)
+                except json.JSONDecodeError as e:
+                    status, response = 400, {"error": f"Bad JSON: {e}"}
+                except HTTPError as e:
+                    status, response = e.status, {"error": str(e)}
+                except Exception as e:
+                    status, response = 500, {"error": f"{type(e).__name__}: {e}"}
+
+                payload = json.dumps(response).encode()
+                writer.write(f"HTTP/1.1 {status} {STATUS[status]}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self.connections.pop(asyncio.current_task(), None)
+            writer.close()
+
+    # Running it
+
+    async def Start(self):
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self.Handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.url = f"http://{self.host}:{self.port}"
+
+    def Serve(self):
+        """
+        Runs the service in the foreground until interrupted.
+
+        """
+        async def run():
+            await self.Start()
+            print(f"Routing service on {self.url}")
+            async with self.server:
+                await self.server.serve_forever()
+        try:
+            asyncio.run(run())
+        except KeyboardInterrupt:
+            print("Routing service stopped")
+        finally:
+            self.Close()
+
+    def Close(self):
+        self.pool.shutdown()
+        for _, shared in self.worlds.values():
+            shared.__exit__(None, None, None)
+        self.worlds = {}
+
+    def __enter__(self):
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            self.loop.run_until_complete(self.Start())
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self
+
+    def __exit__(self, *exc):
+        async def stop():
+            self.server.close()
+            # Closing a keep-alive connection ends its handler at the next read
+            for writer in list(self.connections.values()):
+                writer.close()
+            await asyncio.gather(*self.connections, return_exceptions=True)
+            await self.server.wait_closed()
+        asyncio.run_coroutine_threadsafe(stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.Close()
+
+
+class ServiceClient:
+    """
+    A small blocking client for a RoutingService, keeping one connection open between calls. Errors from the service are
+    raised as HTTPError.
+
+    """
+    def __init__(self, url):
+        parsed = urlparse(url)
+        self.connection = http.client.HTTPConnection(parsed.hostname, parsed.port)
+
+    def Request(self, method, path, body=None):
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.connection.request(method, path, body=payload, headers={"Content-Type": "application/json"})
+        response = self.connection.getresponse()
+        result = json.loads(response.read())
+        if response.status != 200:
+            raise HTTPError(response.status, result.get("error", ""))
+        return result
+
+    def LoadWorld(self, locations="random", nodes=50, seed=0, congestion=0):
+        return self.Request("POST", "/worlds", {"locations": locations, "nodes": nodes, "seed": seed, "congestion": congestion})["world"]
+
+    def Solve(self, world, weights=(0.3, 0.3, 0.4), duration=None):
+        return self.Request("POST", "/solve", {"world": world, "weights": list(weights), "duration": duration})
+
+    def Stats(self):
+        return self.Request("GET", "/stats")
+
+    def Close(self):
+        self.connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs a local HTTP/JSON routing service that keeps worlds and solved tours in memory")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (keep it local, there is no authentication)")
+    parser.add_argument("--port", type=int, default=8765, help="port to listen on")
+    parser.add_argument("--workers", type=int, default=2, help="solver worker processes")
+    parser.add_argument("--cache-size", type=int, default=1024, help="most solved tours kept in the LRU cache")
+    parser.add_argument("--weight-step", type=float, default=0.01, help="weights are rounded to multiples of this for the cache")
+    parser.add_argument("--duration", type=float, default=None, help="default solver time budget in seconds")
+    args = parser.parse_args()
+
+    RoutingService(args.host, args.port, args.workers, args.cache_size, args.weight_step, args.duration).Serve()
@@ -0,0 +1,77 @@
+import sys
+import json
+import argparse
+import contextlib
+import numpy as np
+from config import sample
+from data.providers import ProviderFromSource
+from models.world_cache import CachedWorld
+from models.sparse_cost_matrices import SparseCostMatrices
+from solver.solve_pool import SolvePool, OBJECTIVES
+from solver.budget import Budget
+from solver.sparse_solver import SparseSolveAll
+
+def SolveRoutes(locations="random", nodes=sample, seed=None, congestion=0, sparse=0, objectives=None, duration=None, polish=None,
+                checkpoint=None, resume=False):
+    """
+    The headless solve-only path - locations, world and a tour per objective, with no figures. Nothing here imports matplotlib,
+    and the openai client is only loaded if the locations actually come from the LLM.
+
+    locations is a source like main.py --locations, or an (n, 2) array of [lat, lon]. The rest are the main.py options of the
+    same names, with duration a time budget in seconds per objective (config.duration if not given).
+    checkpoint, a directory, streams the improving tours there and resume warm starts from them (see SolvePool).
+
+    Returns a dict of objective name -> SolveRecord.
+
+    """
+    if objectives is None:
+        objectives = OBJECTIVES
+
+    if isinstance(locations, str):
+        locations = ProviderFromSource(locations, nodes, seed=seed or 0).get()
+    locations = np.asarray(locations, dtype=float)
+
+    if sparse:
+        world = SparseCostMatrices(locations, k=sparse, seed=seed, congestion_zones=congestion)
+        return SparseSolveAll(world, objectives) if duration is None else SparseSolveAll(world, objectives, duration)
+
+    world = CachedWorld(locations, seed, congestion_zones=congestion)
+    budget = None if duration is None else Budget(seconds=duration)
+    return SolvePool(world, objectives, budget=budget, polish=polish, checkpoint=checkpoint, resume=resume)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solves the TSP for each objective and prints the results as JSON, without any plotting")
+    parser.add_argument("--locations", default="random", metavar="SOURCE",
+                        help="where the locations come from: random, clustered, openai (cached on disk), or a CSV/JSON/Parquet file")
+    parser.add_argument("--nodes", type=int, default=sample, help="number of locations for the random and clustered sources")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the locations and the world (cached under examples/world_cache)")
+    parser.add_argument("--congestion", type=int, default=0, metavar="ZONES", help="add a dense urban congestion layer")
+    parser.add_argument("--sparse", type=int, default=0, metavar="K", help="keep only each location's K nearest neighbour routes")
+    parser.add_argument("--duration", type=float, default=None, metavar="SECONDS", help="time budget per objective")
+    parser.add_argument("--polish", type=float, default=None, metavar="SECONDS", help="post-optimise each tour (see solver.improve)")
+    parser.add_argument("--checkpoint", default=None, metavar="FOLDER",
+                        help="stream improving tours to FOLDER and checkpoint the best, for long solves (not with --sparse)")
+    parser.add_argument("--resume", action="store_true", help="warm start each objective from its checkpoint in --checkpoint")
+    parser.add_argument("--routes", action="store_true", help="include each tour in the results")
+    args = parser.parse_args()
+    if args.sparse and args.checkpoint:
+        parser.error("--checkpoint needs the full matrices, so it cannot be combined with --sparse")
+    if args.resume and not args.checkpoint:
+        parser.error("--resume needs the --checkpoint folder to resume from")
+    if args.resume and args.seed is None:
+        parser.error("--resume needs the --seed the run was started with, so that the same world is built again")
+
+    # Anything the world prints (accidents, major issues) goes to stderr, so stdout is only the JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        records = SolveRoutes(args.locations, args.nodes, args.seed, args.congestion, args.sparse, duration=args.duration,
+                              polish=args.polish, checkpoint=args.checkpoint, resume=args.resume)
+
+    results = {}
+    for name, record in records.items():
+        results[name] = {"weights": list(record.weights), "distance": record.distance,
+                         "time": record.time if np.isfinite(record.time) else None, "safety": record.safety,
+                         "solve_time": record.wall_time}
+        if args.routes:
+            results[name]["route"] = [int(node) for node in record.route]
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,115 @@
+import time
+import numpy as np
+from dataclasses import dataclass, replace
+from config import duration
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+def LowerBound(quantized):
+    """
+    A lower bound on the cost of any tour of a quantized (integer) cost matrix.
+
+    Every tour is an assignment of each node to a different next node, so the cheapest assignment is a bound. With scipy we
+    solve that assignment problem exactly, otherwise we use the classic reduction bound - take each row's cheapest arc off the
+    row, then each column's cheapest off what is left - done rows first and columns first, keeping the better of the two.
+
+    """
+    costs = np.array(quantized, dtype=np.float64)
+    if costs.ndim != 2 or len(costs) < 2:
+        return 0
+    np.fill_diagonal(costs, np.inf)
+
+    if linear_sum_assignment is not None:
+        np.fill_diagonal(costs, costs[np.isfinite(costs)].max() * len(costs))
+        rows, cols = linear_sum_assignment(costs)
+        return int(costs[rows, cols].sum())
+
+    bounds = []
+    for axis in (1, 0):
+        first = costs.min(axis=axis)
+        second = (costs - (first[:, None] if axis == 1 else first[None, :])).min(axis=1 - axis)
+        bounds.append(first.sum() + second.sum())
+    return int(max(bounds))
+
+@dataclass
+class Budget:
+    """
+    How long a TSPSolver call may search for, and when it can stop early. Pass one in as budget= and it takes the place of
+    duration. Every part is optional and they all combine:
+
+    - seconds, a fixed time limit (config.duration if no other limit is set)
+    - per_node, a time limit that scales with the instance instead - per_node seconds for every node, kept between minimum and
+      maximum seconds, so a 10 node instance gets a blink and a 2000 node one gets the time it needs
+    - patience, stop once the search has gone this many seconds without finding a better tour
+    - gap, stop once the best tour is within this fraction (eg. 0.02 for 2%) of a lower bound (see LowerBound). The bound is
+      worked out before the search starts, and the time it takes comes out of the time limit
+    - deadline, an absolute time.time() the whole run has to finish by, shared out between the share solves still to run one
+      after another (this one included), so every objective gets a fair part of whatever time is left (never less than minimum,
+      so there is always time for a first solution)
+
+    """
+    seconds: float = None
+    per_node: float = None
+    minimum: float = 0.05
+    maximum: float = None
+    patience: float = None
+    gap: float = None
+    deadline: float = None
+    share: int = 1
+
+    def Seconds(self, nodes, spent=0):
+        """
+        The time limit for a solve of this many nodes, less any seconds already spent on it (eg. working out the gap bound). A
+        deadline share is worked out from the time now, so it has already had them taken off.
+
+        """
+        limit = None
+        if self.per_node is not None:
+            limit = max(self.minimum, self.per_node * nodes)
+            if self.maximum is not None:
+                limit = min(limit, self.maximum)
+        elif self.seconds is not None:
+            limit = self.seconds
+        elif self.deadline is None:
+            limit = duration
+        if limit is not None:
+            limit = max(self.minimum, limit - spent)
+
+        if self.deadline is not None:
+            part = max(self.minimum, (self.deadline - time.time()) / max(self.share, 1))
+            limit = part if limit is None else min(limit, part)
+        return limit
+
+    def StopRule(self, quantized):
+        """
+        Returns a function of (elapsed, best objective, elapsed at the last improvement) that says whether the search can stop
+        now, or None if this budget never stops early.
+
+        """
+        if self.patience is None and self.gap is None:
+            return None
+
+        bound = LowerBound(quantized) if self.gap is not None else None
+
+        def stop(elapsed, best, improved):
+            if self.patience is not None and elapsed - improved > self.patience:
+                return True
+            return bound is not None and best <= bound * (1 + self.gap)
+
+        return stop
+
+def RunDeadline(seconds, objectives, workers=1, budget=None):
+    """
+    Shares a global run deadline of seconds from now between a number of objectives solved on workers at once, returning one
+    Budget per objective. budget sets any other parts they should have (patience, gap, per_node and so on).
+
+    The objectives run in rounds of workers, so the k-th objective shares what is left with the rounds still to come.
+
+    """
+    budget = Budget() if budget is None else budget
+    deadline = time.time() + seconds
+    rounds = -(-objectives // max(workers, 1))
+    return [replace(budget, deadline=deadline, share=rounds - k // max(workers, 1)) for k in range(objectives)]
@@ -0,0 +1,146 @@
+import os
+import json
+import time
+
+class SolveCheckpoint:
+    """
+    Streams one TSPSolver call's progress to disk - pass one in as checkpoint= - so that a long solve can be killed at any point
+    and picked up again later without losing what it had found.
+
+    Every improving tour the search finds is appended to <name>_solutions.jsonl in directory as one JSON line of its elapsed
+    search time and objective, and the tour itself (as a list of nodes like GetRoute's) at most every `every` seconds, since
+    walking the tour out of OR Tools is the one part of this that costs search time on big instances. Lines are flushed as they
+    are written. The best tour so far is also saved to <name>_checkpoint.json every interval seconds (written to a temporary file
+    and renamed, so there is always a whole checkpoint on disk) and once more when the solve finishes.
+
+    meta, eg. the world, weights and number of nodes, is saved with the checkpoint and at the start of each run in the log. Resume
+    only trusts tours saved with the same meta, so that a checkpoint is never used as a warm start for a different problem.
+
+    Use it as a context manager, the checkpoint is saved and the log closed on exit.
+
+    """
+    def __init__(self, directory, name="tour", interval=30, every=1.0, meta=None):
+        self.directory = directory
+        self.name = name
+        self.interval = interval
+        self.every = every
+        self.meta = dict(meta or {})
+        self.path = os.path.join(directory, f"{name}_checkpoint.json")
+        self.log_path = os.path.join(directory, f"{name}_solutions.jsonl")
+        self.log = None
+        self.offset = 0                 #Search time of earlier runs, so elapsed carries on across resumes
+        self.best = None                #Best (objective, elapsed, route) with a route
+        self.dirty = False              #Whether best has changed since the last Save
+        self.last_route = None          #When we last walked out a route
+        self.last_save = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.Close()
+
+    def Resume(self):
+        """
+        The best tour of any earlier run with the same meta, from its checkpoint or its log (whichever is better - a run killed
+        between checkpoints has logged tours the checkpoint never saw), or None if nothing was saved. A line cut off by the kill
+        is skipped. Later elapsed times carry on from where the earlier runs got to.
+
+        Raises a ValueError if tours were saved here, but none of them for this meta (eg. another world), rather than starting
+        over as if there were nothing to resume.
+
+        """
+        found = []
+        other = None
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                saved = json.load(f)
+            if saved.get("meta") == self.meta:
+                found.append((saved["objective"], saved["elapsed"], saved["route"]))
+                self.offset = max(self.offset, saved["elapsed"])
+            else:
+                other = saved.get("meta")
+
+        if os.path.exists(self.log_path):
+            matches = False
+            with open(self.log_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if "meta" in entry:
+                        matches = entry["meta"] == self.meta
+                        if not matches:
+                            other = entry["meta"]
+                    elif matches:
+                        self.offset = max(self.offset, entry["elapsed"])
+                        if "route" in entry:
+                            found.append((entry["objective"], entry["elapsed"], entry["route"]))
+
+        if not found and other is not None:
+            raise ValueError(f"The checkpoint in {self.directory} is for {other}, not {self.meta}, so {self.name} cannot resume "
+                             f"from it")
+        if not found:
+            return None
+        self.best = min(found, key=lambda entry: entry[0])
+        return list(self.best[2])
+
+    def Improved(self, elapsed, objective, route):
+        """
+        Logs an improving tour, elapsed seconds into this run's search. route is a function returning the tour, only called if it
+        is time to log one again.
+
+        """
+        now = time.perf_counter()
+        entry = {"elapsed": round(self.offset + elapsed, 3), "objective": int(objective)}
+        if self.last_route is None or now - self.last_route >= self.every:
+            entry["route"] = [int(node) for node in route()]
+            self.last_route = time.perf_counter()
+            if self.best is None or entry["objective"] <= self.best[0]:
+                self.best = (entry["objective"], entry["elapsed"], entry["route"])
+                self.dirty = True
+        self.Write(entry)
+
+        if now - self.last_save >= self.interval:
+            self.Save()
+
+    def Finish(self, elapsed, objective, route):
+        """
+        Logs the tour a solve finished with (always with its route) and saves it as the checkpoint if it is the best yet.
+
+        """
+        self.last_route = None
+        self.Improved(elapsed, objective, lambda: route)
+        self.Save()
+
+    def Write(self, entry):
+        if self.log is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self.log = open(self.log_path, "a")
+            self.log.write(json.dumps({"meta": self.meta, "started": time.time(), "offset": self.offset}) + "\n")
+        self.log.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self.log.flush()
+
+    def Save(self):
+        """
+        Writes the best tour so far to the checkpoint file, if it has changed since the last time.
+
+        """
+        self.last_save = time.perf_counter()
+        if not self.dirty:
+            return
+        objective, elapsed, route = self.best
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump({"name": self.name, "meta": self.meta, "objective": objective, "elapsed": elapsed, "saved": time.time(),
+                       "route": route}, f)
+        os.replace(temporary, self.path)
+        self.dirty = False
+
+    def Close(self):
+        self.Save()
+        if self.log is not None:
+            self.log.close()
+            self.log = None
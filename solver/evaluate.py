@@ -0,0 +1,69 @@
+import numpy as np
+
+# Most arcs gathered from a matrix at once, past this the tours are evaluated in batches
+MAX_GATHER = 1 << 20
+
+def RouteArray(routes):
+    """
+    Turns one route or many into an (m, length) int array of nodes, plus an (m, length - 1) mask of which arcs are real.
+
+    routes can be a single route, a list of routes or an (m, length) array already. Routes of different lengths are padded by
+    repeating their last node, and the padding arcs are masked out.
+
+    """
+    if isinstance(routes, np.ndarray) and routes.ndim == 2:
+        array = routes.astype(np.int64, copy=False)
+        return array, np.ones((len(array), max(array.shape[1] - 1, 0)), dtype=bool)
+
+    if len(routes) and np.ndim(routes[0]) == 0:
+        routes = [routes]
+    lengths = np.array([len(route) for route in routes])
+    length = lengths.max() if len(lengths) else 0
+
+    array = np.empty((len(routes), length), dtype=np.int64)
+    for k, route in enumerate(routes):
+        array[k, :len(route)] = route
+        array[k, len(route):] = route[-1] if len(route) else 0
+    return array, np.arange(max(length - 1, 0)) < (lengths - 1)[:, None]
+
+def EvaluateRoutes(routes, matrices, infeasible=None, batch_size=None, columns=1):
+    """
+    Costs many routes on many matrices at once - each route's total on each matrix, as an (m, len(matrices)) float64 array.
+
+    routes is anything RouteArray takes, and matrices a list (or stacked array) of (n, n) cost matrices, eg. [world.distance,
+    world.time, world.safety]. Every route's arcs are picked out of each matrix with a single fancy index rather than a walk
+    node by node, in batches of routes so that no more than MAX_GATHER arcs are gathered at once (or batch_size routes).
+
+    If the infeasible mask is given, a route using any infeasible route gets an infinite cost on the matrices picked out by
+    columns - an index or list of indices into matrices, or slice(None) for all of them. The default of 1 is the time matrix of
+    [world.distance, world.time, world.safety], since blocked routes only count against time, like RecordFromRoute.
+
+    """
+    array, mask = RouteArray(routes)
+    costs = np.zeros((len(array), len(matrices)))
+    if array.shape[1] < 2:
+        return costs
+
+    if batch_size is None:
+        batch_size = max(1, MAX_GATHER // (array.shape[1] - 1))
+
+    if infeasible is not None:
+        columns = np.atleast_1d(np.arange(len(matrices))[columns])
+
+    for start in range(0, len(array), batch_size):
+        frm = array[start:start + batch_size, :-1]
+        to = array[start:start + batch_size, 1:]
+        real = mask[start:start + batch_size]
+        for k, matrix in enumerate(matrices):
+            costs[start:start + batch_size, k] = np.where(real, matrix[frm, to], 0).sum(axis=1, dtype=np.float64)
+        if infeasible is not None:
+            blocked = (infeasible[frm, to] & real).any(axis=1)
+            costs[start:start + batch_size][np.ix_(blocked, columns)] = np.inf
+    return costs
+
+def RouteCosts(route, matrices, infeasible=None, columns=1):
+    """
+    The costs of a single route on each matrix, as a tuple of floats (see EvaluateRoutes for infeasible and columns).
+
+    """
+    return tuple(float(cost) for cost in EvaluateRoutes([route], matrices, infeasible, columns=columns)[0])
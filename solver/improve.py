@@ -0,0 +1,148 @@
+import time
+import numpy as np
+from dataclasses import dataclass, field
+from solver.tsp_solver import QuantizeMatrix
+
+@dataclass
+class ImproveResult:
+    """
+    Output of ImproveTour. The route starts and ends at the depot, before and after are its cost on the quantized matrix, and
+    improvement_per_ms is how much cost each millisecond of the pass took off - compare it with what the same time would have
+    bought as more OR Tools budget (see benchmark.py).
+
+    """
+    route: list = field(repr=False)
+    before: int
+    after: int
+    moves: int
+    passes: int
+    seconds: float
+
+    @property
+    def improvement_per_ms(self):
+        return (self.before - self.after) / max(1000 * self.seconds, 1e-9)
+
+
+def NeighbourLists(matrix, k=10):
+    """
+    The k cheapest arcs out of and into every node of a cost matrix, as (n, k) arrays of nodes - out[i] are the best nodes to
+    go to from i, and into[j] the best nodes to come to j from. The matrix is asymmetric, so the two differ.
+
+    """
+    n = len(matrix)
+    k = min(k, n - 1)
+    costs = np.array(matrix, dtype=np.int64)
+    np.fill_diagonal(costs, np.iinfo(np.int64).max)
+    out = np.argpartition(costs, k - 1, axis=1)[:, :k]
+    into = np.argpartition(costs, k - 1, axis=0)[:k, :].T
+    return out, into
+
+def ExchangeDeltas(matrix, tour, a, b, c):
+    """
+    Change in tour cost of exchanging the segments tour[a+1..b] and tour[b+1..c] (positions a < b < c), for arrays of (a, b, c).
+
+    This is the reversal-free 3-opt move - the three arcs leaving positions a, b and c are replaced, and both segments keep
+    their direction, so it is exact on asymmetric matrices and only needs six lookups. Or-opt is the special case where one of
+    the segments is 1 to 3 nodes long.
+
+    """
+    n = len(tour)
+    ta, ta1, tb, tb1, tc, tc1 = tour[a], tour[(a + 1) % n], tour[b], tour[(b + 1) % n], tour[c], tour[(c + 1) % n]
+    return (matrix[ta, tb1] + matrix[tc, ta1] + matrix[tb, tc1]
+            - matrix[ta, ta1] - matrix[tb, tb1] - matrix[tc, tc1])
+
+def CandidateMoves(tour, position, out, into, max_segment=3):
+    """
+    The (a, b, c) segment exchanges worth evaluating, picked with the neighbour lists so there are O(n k^2) of them rather than
+    O(n^3):
+
+    - Or-opt: every segment of 1 to max_segment nodes, moved to just after a node with a cheap arc into its first node, or just
+      before a node with a cheap arc out of its last node
+    - 3-opt: for every position a, b is set by a cheap new arc tour[a] -> tour[b+1] and c by a cheap new arc
+      tour[c] -> tour[a+1]
+
+    Only valid moves (a < b < c, never moving the depot) are returned.
+
+    """
+    n = len(tour)
+    moves = []
+
+    for length in range(1, max_segment + 1):
+        s = np.arange(1, n - length + 1)
+        e = s + length - 1
+        # Insert after p, with p a node with a cheap arc into the segment or p + 1 a node with a cheap arc out of it
+        p = np.concatenate([position[into[tour[s]]], position[out[tour[e]]] - 1], axis=1)
+        s, e = np.repeat(s, p.shape[1]), np.repeat(e, p.shape[1])
+        p = p.ravel()
+        before = p < s - 1
+        after = p > e
+        moves.append(np.stack([p[before], s[before] - 1, e[before]]))
+        moves.append(np.stack([s[after] - 1, e[after], p[after]]))
+
+    a = np.arange(n)
+    b = position[out[tour[a]]] - 1
+    c = position[into[tour[(a + 1) % n]]]
+    k = b.shape[1]
+    a = np.repeat(a, k * k)
+    b = np.repeat(b, k, axis=1).ravel()
+    c = np.tile(c, (1, k)).ravel()
+    moves.append(np.stack([a, b, c]))
+
+    a, b, c = np.concatenate(moves, axis=1)
+    valid = (a >= 0) & (a < b) & (b < c) & (c <= n - 1)
+    return a[valid], b[valid], c[valid]
+
+def ImproveTour(matrix, route, duration=0.5, k=10, max_segment=3, max_passes=None):
+    """
+    Post-optimises a tour (eg. from TSPSolver) with Or-opt and reversal-free 3-opt moves, neither of which ever reverses part
+    of the tour, so they stay exact on the asymmetric time matrix (hill zones make uphill and downhill differ).
+
+    matrix is a quantized (integer) cost matrix like the one the tour was solved on - a float one is quantized with
+    QuantizeMatrix. Infeasible arcs there have a huge cost, so moves that get rid of them are always taken first. Each pass
+    evaluates every candidate from the neighbour lists (see CandidateMoves) in O(1) each, then applies as many of the most
+    improving ones as touch separate parts of the tour. It stops once a pass finds nothing better, after max_passes, or after
+    duration seconds.
+
+    Returns an ImproveResult.
+
+    """
+    start = time.perf_counter()
+    matrix = np.asarray(matrix)
+    if not np.issubdtype(matrix.dtype, np.integer):
+        matrix = QuantizeMatrix(matrix)
+    matrix = matrix.astype(np.int64, copy=False)
+
+    tour = np.array(route[:-1] if len(route) > 1 and route[-1] == route[0] else route, dtype=np.int64)
+    n = len(tour)
+    before = int(matrix[tour, np.roll(tour, -1)].sum())
+
+    moves = 0
+    passes = 0
+    if n >= 4:
+        out, into = NeighbourLists(matrix, k)
+        position = np.empty(n, dtype=np.int64)
+
+        while time.perf_counter() - start < duration and (max_passes is None or passes < max_passes):
+            passes += 1
+            position[tour] = np.arange(n)
+            a, b, c = CandidateMoves(tour, position, out, into, max_segment)
+            delta = ExchangeDeltas(matrix, tour, a, b, c)
+            improving = np.flatnonzero(delta < 0)
+            if not len(improving):
+                break
+
+            # Most improving first, skipping any move that overlaps the span of one already taken
+            taken = np.zeros(n, dtype=bool)
+            new_tour = tour.copy()
+            for move in improving[np.argsort(delta[improving], kind="stable")]:
+                lo, mid, hi = a[move], b[move], c[move]
+                if taken[lo:hi + 1].any():
+                    continue
+                taken[lo:hi + 1] = True
+                new_tour[lo + 1:hi + 1] = np.concatenate([tour[mid + 1:hi + 1], tour[lo + 1:mid + 1]])
+                moves += 1
+            tour = new_tour
+
+    route = [int(node) for node in tour] + [int(tour[0])]
+    return ImproveResult(route=route, before=before, after=int(matrix[tour, np.roll(tour, -1)].sum()), moves=moves,
+                         passes=passes, seconds=time.perf_counter() - start)
@@ -0,0 +1,171 @@
+import time
+import numpy as np
+from dataclasses import dataclass
+from config import duration
+from solver.tsp_solver import TSPSolver, GetRoute
+from solver.solve_pool import BlendMatrices, RecordFromRoute
+
+@dataclass
+class ParetoFront:
+    """
+    Output of a ParetoSweep. records are the non-dominated tours (one SolveRecord each, no duplicates), solves is how many
+    TSPSolver calls it took, and hypervolume is measured on the normalised objectives (see Hypervolume).
+
+    """
+    records: list
+    solves: int
+    duplicates: int
+    hypervolume: float
+    wall_time: float
+
+
+def SampleWeights(count, seed=None):
+    """
+    Returns count (distance, time, safety) weight vectors on the simplex. The three pure objectives come first, as they anchor
+    the ends of the front, and the rest are drawn uniformly from the simplex.
+
+    """
+    rng = np.random.RandomState(seed)
+    extra = rng.dirichlet(np.ones(3), max(count - 3, 0))
+    return np.vstack([np.eye(3), extra])[:count]
+
+def NormalisedMatrices(world, target=1000):
+    """
+    Stacks int32 quantized copies of the distance, time and safety matrices (see CostMatrices.Quantized), each scaled so that
+    its median route costs target.
+
+    Without this the weights would mean very different things per objective (thousands of km vs a few hours), and target keeps
+    the blend well clear of integer rounding. The median leaves out the infeasible routes.
+
+    """
+    upper = np.triu_indices(world.num, k=1)
+    feasible = ~world.infeasible[upper]
+    matrices = []
+    for name in ("distance", "time", "safety"):
+        median = np.median(getattr(world, name)[upper][feasible])
+        matrices.append(world.Quantized(name, target / median if median > 0 else 1))
+    return np.stack(matrices)
+
+def NonDominated(points):
+    """
+    Boolean mask of the rows of points (all objectives minimised) that no other row dominates.
+
+    """
+    points = np.asarray(points, dtype=float)
+    keep = np.ones(len(points), dtype=bool)
+    for i in range(len(points)):
+        dominated = np.all(points <= points[i], axis=1) & np.any(points < points[i], axis=1)
+        keep[i] = not dominated.any()
+    return keep
+
+def _hypervolume2d(points, reference):
+    area = 0
+    best = reference[1]
+    for x, y in points[np.argsort(points[:,0])]:
+        if y < best:
+            area += (reference[0] - x) * (best - y)
+            best = y
+    return area
+
+def Hypervolume(points, reference=None):
+    """
+    Exact hypervolume of a set of 3 objective points (minimised), found by slicing along the first objective and adding up 2D areas.
+
+    If no reference point is given, the points are normalised so that the best value of each objective is 0 and the worst is 1,
+    and the reference is 1.1 in every objective. That keeps the number comparable between fronts of the same world. Points with an
+    infinite cost (tours that had to use an infeasible route) are left out, and with none left the hypervolume is 0.
+
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    points = points[np.all(np.isfinite(points), axis=1)]
+    if not len(points):
+        return 0.0
+    if reference is None:
+        low, high = points.min(axis=0), points.max(axis=0)
+        span = np.where(high > low, high - low, 1)
+        points = (points - low) / span
+        reference = np.full(3, 1.1)
+
+    points = points[np.all(points < reference, axis=1)]
+    points = points[np.argsort(points[:,0])]
+
+    volume = 0
+    for k in range(len(points)):
+        x_next = points[k+1, 0] if k + 1 < len(points) else reference[0]
+        if x_next > points[k, 0]:
+            volume += (x_next - points[k, 0]) * _hypervolume2d(points[:k+1, 1:], reference[1:])
+    return float(volume)
+
+def FrontHypervolumes(*fronts):
+    """
+    Hypervolumes of several ParetoFronts of the same world, all normalised together (best value of each objective over every
+    front is 0, worst is 1, reference 1.1), so unlike ParetoFront.hypervolume they can be compared with each other.
+
+    """
+    costs = [np.array([[r.distance, r.time, r.safety] for r in front.records], dtype=float).reshape(-1, 3) for front in fronts]
+    every = np.vstack(costs)
+    every = every[np.all(np.isfinite(every), axis=1)]
+    if not len(every):
+        return [0.0 for _ in fronts]
+    low, high = every.min(axis=0), every.max(axis=0)
+    span = np.where(high > low, high - low, 1)
+    return [Hypervolume((points - low) / span, reference=np.full(3, 1.1)) for points in costs]
+
+def ParetoSweep(world, count=50, full_duration=None, min_duration=0.1, seed=None):
+    """
+    Builds an approximate Pareto front of tours over distance, time and safety by solving count weighted blends.
+
+    The three pure objectives are solved cold with the full budget. Every later weight vector is warm started from the tour of the
+    nearest weight vector solved so far, so it only has to repair a good tour rather than build one. The budget for these warm solves
+    adapts as we go - it starts at a tenth of the full budget, halves whenever a solve gives back a tour we already had, and grows
+    again (up to a quarter of the full budget) when it finds something new.
+
+    Tours are costed on the real (not normalised) matrices, identical tours are only kept once, and the front is whatever is left
+    after removing dominated tours.
+
+    """
+    start = time.perf_counter()
+    full = duration if full_duration is None else full_duration
+
+    raw = [world.distance, world.time, world.safety]
+    normalised = NormalisedMatrices(world)
+    weights = SampleWeights(count, seed)
+
+    solved_weights = []
+    solved_routes = []
+    unique = {}
+    duplicates = 0
+    budget = max(min_duration, full / 10)
+
+    for k, w in enumerate(weights):
+        solve_start = time.perf_counter()
+        blend = BlendMatrices(normalised, w)
+
+        if k < 3:
+            manager, routing, solution = TSPSolver(blend, duration=full)
+        else:
+            nearest = np.argmin(np.linalg.norm(np.array(solved_weights) - w, axis=1))
+            manager, routing, solution = TSPSolver(blend, duration=budget, initial_route=solved_routes[nearest])
+
+        route = GetRoute(manager, routing, solution)
+        solved_weights.append(w)
+        solved_routes.append(route)
+
+        key = tuple(route)
+        if key in unique:
+            duplicates += 1
+            if k >= 3:
+                budget = max(min_duration, budget / 2)
+            continue
+
+        if k >= 3:
+            budget = min(full / 4, budget * 1.25)
+        unique[key] = RecordFromRoute(f"sweep {k}", w, route, raw, time.perf_counter() - solve_start, world.infeasible)
+
+    records = list(unique.values())
+    costs = np.array([[r.distance, r.time, r.safety] for r in records])
+    keep = NonDominated(costs)
+    front = [r for r, kept in zip(records, keep) if kept]
+
+    return ParetoFront(records=front, solves=len(weights), duplicates=duplicates,
+                       hypervolume=Hypervolume(costs[keep]), wall_time=time.perf_counter() - start)
@@ -0,0 +1,262 @@
+import time
+import numpy as np
+from config import duration
+from models.cost_matrices import INFEASIBLE
+from solver.solve_pool import RecordFromRoute
+from solver.pareto import ParetoFront, NonDominated, Hypervolume
+
+def TourCosts(matrices, tour):
+    """
+    (3,) int64 costs of a tour (a node array starting at the depot, without the return) on the stacked quantized matrices.
+
+    """
+    return matrices[:, tour, np.roll(tour, -1)].sum(axis=1, dtype=np.int64)
+
+def MovePairs(first, last, min_gap, max_moves, rng):
+    """
+    Position pairs (a, b) with first <= a and a + min_gap <= b <= last, all of them if there are at most max_moves, otherwise
+    a random sample of about max_moves.
+
+    """
+    span = last - first + 1
+    if span * span // 2 <= max_moves:
+        a, b = np.triu_indices(span, k=min_gap)
+        return a + first, b + first
+    a = rng.randint(first, last + 1, max_moves)
+    b = rng.randint(first, last + 1, max_moves)
+    a, b = np.minimum(a, b), np.maximum(a, b)
+    keep = b - a >= min_gap
+    return a[keep], b[keep]
+
+def TwoOptMoves(matrices, tour, forward, max_moves, rng):
+    """
+    Every 2-opt move (a, b) - take out the arcs leaving positions a and b and reverse the path between them - with its change
+    in all three objectives at once, as ((m,) a, (m,) b, (3, m) delta).
+
+    The matrices are asymmetric, so reversing a path changes its cost. Prefix sums of the tour's arcs both ways round give the
+    cost of any path forwards and backwards in O(1), so each move is still evaluated in constant time.
+
+    """
+    n = len(tour)
+    after = np.roll(tour, -1)
+    backward = matrices[:, after, tour].astype(np.int64)
+    prefix_forward = np.concatenate([np.zeros((3, 1), dtype=np.int64), np.cumsum(forward, axis=1)], axis=1)
+    prefix_backward = np.concatenate([np.zeros((3, 1), dtype=np.int64), np.cumsum(backward, axis=1)], axis=1)
+
+    a, b = MovePairs(0, n - 1, 2, max_moves, rng)
+    path_forward = prefix_forward[:, b] - prefix_forward[:, a + 1]
+    path_backward = prefix_backward[:, b] - prefix_backward[:, a + 1]
+    delta = (matrices[:, tour[a], tour[b]] + matrices[:, after[a], after[b]].astype(np.int64)
+             + path_backward - path_forward - forward[:, a] - forward[:, b])
+    return a, b, delta
+
+def OrOptMoves(matrices, tour, forward, length, max_moves, rng):
+    """
+    Every Or-opt move (a, b) for segments of this length - the segment starting at position a is moved, in the same direction,
+    to just after position b - with its change in all three objectives, as ((m,) a, (m,) b, (3, m) delta). Nothing is ever
+    reversed, so this is safe on asymmetric matrices.
+
+    """
+    n = len(tour)
+    if n < length + 3:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int), np.empty((3, 0), dtype=np.int64)
+
+    a, b = MovePairs(1, n - 1, 0, max_moves, rng)
+    # Pairs come with a <= b, so use both orders to get every (segment, insertion point)
+    a, b = np.concatenate([a, b]), np.concatenate([b, a])
+    end = a + length - 1
+    keep = (end <= n - 1) & ((b < a - 1) | (b > end))
+    a, b, end = a[keep], b[keep], end[keep]
+
+    before = tour[a - 1]
+    start_node = tour[a]
+    end_node = tour[end]
+    following = tour[(end + 1) % n]
+    at = tour[b]
+    at_next = tour[(b + 1) % n]
+
+    delta = (matrices[:, before, following].astype(np.int64) + matrices[:, at, start_node] + matrices[:, end_node, at_next]
+             - forward[:, a - 1] - forward[:, end] - forward[:, b])
+    return a, b, delta
+
+def ApplyMove(tour, kind, a, b):
+    """
+    Returns a new tour with one move applied - kind is "2opt", or the segment length for an Or-opt move.
+
+    """
+    if kind == "2opt":
+        tour = tour.copy()
+        tour[a+1:b+1] = tour[a+1:b+1][::-1]
+        return tour
+
+    segment = tour[a:a + kind]
+    rest = np.concatenate([tour[:a], tour[a + kind:]])
+    insert = b + 1 if b < a else b + 1 - kind
+    return np.concatenate([rest[:insert], segment, rest[insert:]])
+
+def Moves(matrices, tour, max_moves, rng):
+    """
+    Every 2-opt and Or-opt move of a tour together, as (kinds, (m,) a, (m,) b, (3, m) delta), where kinds[k] is the kind of move
+    k to pass to ApplyMove.
+
+    """
+    forward = matrices[:, tour, np.roll(tour, -1)].astype(np.int64)
+    moves = [("2opt", *TwoOptMoves(matrices, tour, forward, max_moves, rng))]
+    moves += [(length, *OrOptMoves(matrices, tour, forward, length, max_moves, rng)) for length in (1, 2, 3)]
+
+    kinds = [kind for kind, a, _, _ in moves for _ in range(len(a))]
+    a = np.concatenate([m[1] for m in moves])
+    b = np.concatenate([m[2] for m in moves])
+    delta = np.concatenate([m[3] for m in moves], axis=1)
+    return kinds, a, b, delta
+
+def Descend(matrices, tour, cost, weights, max_moves, rng, deadline):
+    """
+    Plain best improvement local search on one weighting of the objectives, until no move improves it (or the deadline).
+    Returns the (tour, cost) it ends on.
+
+    """
+    while time.perf_counter() < deadline:
+        kinds, a, b, delta = Moves(matrices, tour, max_moves, rng)
+        if not len(a):
+            break
+        score = weights @ delta
+        move = np.argmin(score)
+        if score[move] >= 0:
+            break
+        tour = ApplyMove(tour, kinds[move], a[move], b[move])
+        cost = cost + delta[:, move]
+    return tour, cost
+
+def GreedyTour(matrix):
+    """
+    Nearest neighbour tour from the depot on one (n, n) cost matrix.
+
+    """
+    n = len(matrix)
+    visited = np.zeros(n, dtype=bool)
+    tour = np.empty(n, dtype=np.int64)
+    tour[0] = 0
+    visited[0] = True
+    for k in range(1, n):
+        row = np.where(visited, np.inf, matrix[tour[k-1]])
+        tour[k] = np.argmin(row)
+        visited[tour[k]] = True
+    return tour
+
+
+class Archive:
+    """
+    The set of mutually non-dominated tours found so far, with their (3,) costs, and whether each has been explored yet.
+
+    Past max_size tours, the most crowded one (in costs normalised to the archive's range) is dropped, so the front stays
+    spread out.
+
+    """
+    def __init__(self, max_size=100):
+        self.max_size = max_size
+        self.tours = []
+        self.costs = np.empty((0, 3), dtype=np.int64)
+        self.explored = []
+        self.rejected = 0
+
+    def Add(self, tour, cost):
+        if len(self.costs) and np.any(np.all(self.costs <= cost, axis=1)):
+            self.rejected += 1
+            return False
+
+        keep = ~np.all(cost <= self.costs, axis=1)
+        self.tours = [t for t, kept in zip(self.tours, keep) if kept] + [tour]
+        self.explored = [e for e, kept in zip(self.explored, keep) if kept] + [False]
+        self.costs = np.vstack([self.costs[keep], cost])
+
+        if len(self.tours) > self.max_size:
+            drop = np.argmin(self.Crowding())
+            del self.tours[drop]
+            del self.explored[drop]
+            self.costs = np.delete(self.costs, drop, axis=0)
+        return True
+
+    def Crowding(self):
+        """
+        NSGA-II style crowding distance of each tour, with the best tour of each objective never the most crowded.
+
+        """
+        costs = self.costs.astype(float)
+        span = np.maximum(costs.max(axis=0) - costs.min(axis=0), 1)
+        distance = np.zeros(len(costs))
+        for k in range(3):
+            order = np.argsort(costs[:, k])
+            gaps = np.diff(costs[order, k]) / span[k]
+            distance[order[1:-1]] += gaps[:-1] + gaps[1:]
+            distance[order[[0, -1]]] = np.inf
+        return distance
+
+
+def ParetoLocalSearch(world, duration=duration, directions=8, max_moves=300000, max_archive=100, seed=None, initial_routes=None):
+    """
+    Builds a whole Pareto front of tours in one run, without OR Tools - a NumPy Pareto local search on the int32 quantized
+    distance, time and safety matrices (see CostMatrices.Quantized), evaluating every 2-opt and Or-opt (segments of 1 to 3)
+    move on all three objectives at once.
+
+    The archive starts from greedy tours for each objective and a few blends (plus any initial_routes, eg. OR Tools tours), each
+    first taken down to a local optimum of its own weighting with up to half the time. Then each unexplored tour in turn is
+    expanded - for each of the three objectives and directions random weightings of them,
+    its best improving move is applied, and the new tour goes into the archive if nothing there dominates it. This goes on until
+    every tour has been explored or duration seconds are up.
+
+    Past max_moves, a random sample of the moves of each kind is evaluated per expansion, so big instances stay responsive.
+
+    Returns a ParetoFront like ParetoSweep, with solves counting expansions and duplicates counting rejected tours, so the
+    two can be compared head to head (see FrontHypervolumes).
+
+    """
+    start = time.perf_counter()
+    rng = np.random.RandomState(seed)
+    matrices = np.stack([world.Quantized(name) for name in ("distance", "time", "safety")])
+    n = world.num
+
+    # Per objective scale for weighing the objectives against each other, ignoring the infeasible routes
+    upper = np.triu_indices(n, k=1)
+    scale = np.array([max(np.median(m[upper][m[upper] < INFEASIBLE]), 1) for m in matrices], dtype=float)
+
+    archive = Archive(max_archive)
+    weights = np.vstack([np.eye(3), rng.dirichlet(np.ones(3), directions)])
+    starts = [GreedyTour(np.tensordot(w / scale, matrices, axes=1)) for w in weights[:3 + min(directions, 3)]]
+    starts += [np.array(route[:-1] if route[-1] == route[0] else route, dtype=np.int64) for route in initial_routes or []]
+
+    # First each start tour is taken down to a local optimum of its own weighting, which pins down the ends of the front
+    deadline = start + duration / 2
+    for k, tour in enumerate(starts):
+        w = weights[k] if k < len(weights) else np.ones(3)
+        archive.Add(*Descend(matrices, tour, TourCosts(matrices, tour), w / scale, max_moves, rng, deadline))
+
+    expansions = 0
+    while time.perf_counter() - start < duration and not all(archive.explored):
+        k = archive.explored.index(False)
+        archive.explored[k] = True
+        tour = archive.tours[k]
+        cost = archive.costs[k]
+        expansions += 1
+
+        if n < 4:
+            continue
+
+        # The best move in each direction, for a fresh set of random directions every expansion
+        kinds, a, b, delta = Moves(matrices, tour, max_moves, rng)
+        w = np.vstack([np.eye(3), rng.dirichlet(np.ones(3), directions)]) / scale
+        score = w @ delta
+        best = np.unique(np.argmin(score, axis=1)[score.min(axis=1) < 0])
+
+        for move in best:
+            archive.Add(ApplyMove(tour, kinds[move], a[move], b[move]), cost + delta[:, move])
+
+    raw = [world.distance, world.time, world.safety]
+    wall_time = time.perf_counter() - start
+    records = [RecordFromRoute(f"pls {k}", (), list(tour) + [0], raw, wall_time, world.infeasible)
+               for k, tour in enumerate(archive.tours)]
+    costs = np.array([[r.distance, r.time, r.safety] for r in records])
+    keep = NonDominated(costs)
+
+    return ParetoFront(records=[r for r, kept in zip(records, keep) if kept], solves=expansions, duplicates=archive.rejected,
+                       hypervolume=Hypervolume(costs[keep]), wall_time=wall_time)
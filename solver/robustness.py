@@ -0,0 +1,231 @@
+import time
+import numpy as np
+from dataclasses import dataclass
+from models.cost_matrices import ZoneScaling, ZoneIndex
+from utils.world_elements import TimeWorldElements, ZoneCount
+from solver.evaluate import MAX_GATHER
+
+# The world's own major issue multiplies times by this, which is a "never if at all possible" for the solver rather than a cost
+# we want to average - scenarios use major_factor instead (see ScoreTours)
+WORLD_MAJOR = 1e10
+
+@dataclass
+class RobustnessReport:
+    """
+    How one tour holds up across the disruption scenarios of ScoreTours. expected and cvar are (distance, time, safety, weighted)
+    - the mean cost over every scenario, and the mean over the worst 1 - alpha of them. infeasible_rate is the share of scenarios
+    in which the tour hits a blocked route, and detours the mean number of its routes blocked.
+    seconds is how long scoring every tour together took.
+
+    """
+    name: str
+    expected: tuple
+    cvar: tuple
+    infeasible_rate: float
+    detours: float
+    scenarios: int
+    alpha: float
+    seconds: float
+
+
+def TourArcs(routes):
+    """
+    The distinct arcs (u, v) used by a set of routes, plus an (arcs, routes) count of how often each route uses each arc, so that
+    per-arc costs of any number of scenarios become per-route totals with one matrix product.
+
+    """
+    frm = np.concatenate([np.asarray(route[:-1], dtype=np.int64) for route in routes])
+    to = np.concatenate([np.asarray(route[1:], dtype=np.int64) for route in routes])
+    which = np.repeat(np.arange(len(routes)), [max(len(route) - 1, 0) for route in routes])
+
+    num = int(max(frm.max(), to.max())) + 1 if len(frm) else 1
+    arcs, index = np.unique(frm * num + to, return_inverse=True)
+    uses = np.zeros((len(arcs), len(routes)), dtype=np.float32)
+    np.add.at(uses, (index, which), 1)
+    return arcs // num, arcs % num, uses
+
+def BaseTime(world, u, v, times):
+    """
+    Takes the world's own major issue back out of times gathered for the arcs u -> v, since scenarios draw their own.
+
+    """
+    if world.major is None:
+        return times
+    return np.where((u == world.major) | (v == world.major), times / WORLD_MAJOR, times)
+
+def DetourCosts(world, u, v, weights, major_factor=10.0):
+    """
+    What each arc u -> v costs if it is blocked - the cheapest way round through one other node w, picked on the weights blend of
+    the three objectives (world.Weighted, so the world's own major issue keeps the solver's price for going through it), and
+    returned as an (arcs, 3) array of its distance, time and safety. The blend's rows out of u and columns into v are gathered a
+    chunk of arcs at a time, and the three objectives only at the w picked.
+
+    Legs the world has made impossible (u -> w or w -> v in world.infeasible) are never used, and if that leaves no way round at
+    all the arc keeps its own costs (a tour on it counts as infeasible anyway). A detour that still has to go through the major
+    issue takes major_factor times as long, like the arcs of ScoreTours.
+
+    """
+    n = world.num
+    blend = world.Weighted(weights)
+    detours = np.zeros((len(u), 3))
+    chunk = max(1, MAX_GATHER // max(n, 1))
+    for start in range(0, len(u), chunk):
+        i = u[start:start + chunk]
+        j = v[start:start + chunk]
+        rows = np.arange(len(i))
+        through = blend[i].astype(np.float64) + blend[:, j].T
+        through[world.infeasible[i] | world.infeasible[:, j].T] = np.inf
+        through[rows, i] = np.inf
+        through[rows, j] = np.inf
+        via = through.argmin(axis=1)
+
+        # With no way round, via is v itself and the second leg is the zero diagonal
+        stuck = ~np.isfinite(through[rows, via])
+        via = np.where(stuck, j, via)
+        for k, matrix in enumerate((world.distance, world.time, world.safety)):
+            first = matrix[i, via].astype(np.float64)
+            second = matrix[via, j].astype(np.float64)
+            if k == 1:
+                first, second = BaseTime(world, i, via, first), BaseTime(world, via, j, second)
+                if world.major is not None:
+                    through_major = (via == world.major) & ~stuck
+                    first = np.where(through_major, first * major_factor, first)
+                    second = np.where(through_major, second * major_factor, second)
+            detours[start:start + chunk, k] = first + second
+    return detours
+
+def ZonePool(world, u, v, samples, rng):
+    """
+    samples fresh draws of the world's regional time zones (any congestion layer is kept as it is), as a (samples, arcs) array of
+    how much each draw stretches the time of each arc u -> v compared with the world's own zones. Zones are only tested against
+    the arcs of the tours, so this stays cheap however big the world is.
+
+    """
+    lat = world.locations[:, 0]
+    lon = world.locations[:, 1]
+    regional = ZoneCount(world.num)
+    base, _ = ZoneScaling(lat[u], lon[u], lat[v], lon[v], world.scaler, ZoneIndex(world.scaler))
+
+    pool = np.ones((samples, len(u)), dtype=np.float32)
+    for k in range(samples):
+        draw = np.random.RandomState(rng.integers(2**31 - 1))
+        zones = np.vstack([TimeWorldElements(world.locations, world.num, draw), world.scaler[regional:]])
+        forward, _ = ZoneScaling(lat[u], lon[u], lat[v], lon[v], zones, ZoneIndex(zones))
+        pool[k] = forward / base
+    return pool
+
+def Disruptions(num, count, a, b, incidents, rng, batch_size):
+    """
+    Generator of batches of disruption scenarios, each a handful of fresh accidents drawn the way CostMatrices draws its own -
+    every node is hit with probability incidents / num (so about incidents accidents per scenario), each hit node blocks its
+    routes to 40 - 80% draws of the others, and one scenario in ten has a major issue at one of them. Only the node pairs
+    {a, b} we are asked about are ever drawn, and a blocked pair is blocked both ways, like BlockEdge.
+
+    Yields (blocked, major) - a (batch, pairs) mask of the pairs each scenario blocks, and the node each scenario's major issue
+    hits (-1 for none).
+
+    """
+    miss = 1 - 1 / num
+    for start in range(0, count, batch_size):
+        size = min(batch_size, count - start)
+        hit = rng.random((size, num), dtype=np.float32) < incidents / num
+
+        reach = 1 - miss ** np.rint(rng.uniform(0.4, 0.8, (size, num)) * num)
+        reach = np.where(hit, reach, 0).astype(np.float32)
+        blocked = rng.random((size, len(a)), dtype=np.float32) < reach[:, a]
+        blocked |= rng.random((size, len(a)), dtype=np.float32) < reach[:, b]
+
+        pick = np.where(hit, rng.random((size, num), dtype=np.float32), -1).argmax(axis=1)
+        event = (rng.random(size) > 0.90) & hit.any(axis=1)
+        yield blocked, np.where(event, pick, -1)
+
+def ScoreTours(world, routes, scenarios=10000, weights=(0.3, 0.3, 0.4), incidents=1.0, zone_samples=0, major_factor=10.0,
+               seed=None, batch_size=None):
+    """
+    Monte Carlo costs of some routes under scenarios random disruptions of a dense world - each one the world as it is plus
+    about incidents fresh accidents (see Disruptions), and optionally redrawn time zones.
+
+    Nothing n x n is built per scenario. A tour only uses n arcs, so we only ever work on the distinct arcs of the routes - each
+    batch of scenarios is a (batch, arcs) array per objective, turned into every route's totals with one product against
+    TourArcs' counts. A blocked arc (by the world or the scenario) costs its DetourCosts, chosen on weights. Arcs to or from a
+    major issue (the world's or the scenario's) take major_factor times as long - the world's own 1e10 is there to keep the
+    solver away, and would swamp any average. With zone_samples, each scenario's times are stretched by one of that many redrawn
+    sets of regional zones (see ZonePool).
+
+    Returns (costs, infeasible, detours) - a (routes, scenarios, 4) array of each route's distance, time, safety and weighted
+    cost in every scenario, a (routes, scenarios) mask of the scenarios a route cannot be driven as planned in (it uses a blocked
+    arc - a major issue is very difficult rather than impossible, and every tour meets it anyway), and the mean number of each
+    route's arcs blocked per scenario.
+
+    """
+    rng = np.random.default_rng(seed)
+    u, v, uses = TourArcs(routes)
+    weights = np.asarray(weights, dtype=np.float64)
+    pairs, pair = np.unique(np.minimum(u, v) * world.num + np.maximum(u, v), return_inverse=True)
+
+    distance = world.distance[u, v].astype(np.float32)
+    base_time = BaseTime(world, u, v, world.time[u, v].astype(np.float64)).astype(np.float32)
+    safety = world.safety[u, v].astype(np.float32)
+    detour = DetourCosts(world, u, v, weights, major_factor).astype(np.float32)
+    zones = ZonePool(world, u, v, zone_samples, rng) if zone_samples else np.ones((1, len(u)), dtype=np.float32)
+    closed = world.infeasible[u, v]
+    major = (u == world.major) | (v == world.major) if world.major is not None else np.zeros(len(u), dtype=bool)
+
+    if batch_size is None:
+        batch_size = max(1, 4 * MAX_GATHER // max(len(u), world.num))
+
+    costs = np.zeros((len(routes), scenarios, 4))
+    infeasible = np.zeros((len(routes), scenarios), dtype=bool)
+    detours = np.zeros(len(routes))
+    start = 0
+    for blocked, issue in Disruptions(world.num, scenarios, pairs // world.num, pairs % world.num, incidents, rng, batch_size):
+        batch = slice(start, start + len(issue))
+        blocked = blocked[:, pair] | closed
+        hit = (u == issue[:, None]) | (v == issue[:, None]) | major
+        arc_time = base_time * zones[rng.integers(len(zones), size=len(issue))]
+
+        for k, arc_cost in enumerate((distance, arc_time, safety)):
+            arc_cost = np.where(blocked, detour[:, k], arc_cost)
+            if k == 1:
+                arc_cost = np.where(hit, arc_cost * major_factor, arc_cost)
+            costs[:, batch, k] = (arc_cost @ uses).T
+
+        counts = blocked.astype(np.float32) @ uses
+        detours += counts.sum(axis=0)
+        infeasible[:, batch] = (counts > 0).T
+        start += len(issue)
+
+    costs[:, :, 3] = costs[:, :, :3] @ weights
+    return costs, infeasible, detours / max(scenarios, 1)
+
+def CVaR(costs, alpha=0.95):
+    """
+    Conditional value at risk of some scenario costs along the last axis - the mean of the worst (highest) 1 - alpha of them.
+
+    """
+    count = costs.shape[-1]
+    tail = max(1, int(np.ceil((1 - alpha) * count)))
+    return np.partition(costs, count - tail, axis=-1)[..., count - tail:].mean(axis=-1)
+
+def ScoreRobustness(world, records, scenarios=10000, alpha=0.95, weights=(0.3, 0.3, 0.4), incidents=1.0, zone_samples=0,
+                    major_factor=10.0, seed=None):
+    """
+    Scores the tours of some SolveRecords (a dict of name -> SolveRecord, as from SolvePool) against the same scenarios random
+    disruptions of a dense world, so the tours can be compared on how they hold up as well as on their costs in the world as
+    it is. The rest are as for ScoreTours, with alpha the CVaR level.
+
+    Returns a dict of name -> RobustnessReport, in the same order as records.
+
+    """
+    start = time.perf_counter()
+    names = list(records)
+    costs, infeasible, detours = ScoreTours(world, [records[name].route for name in names], scenarios, weights, incidents,
+                                            zone_samples, major_factor, seed)
+    seconds = time.perf_counter() - start
+
+    expected = costs.mean(axis=1)
+    cvar = CVaR(np.moveaxis(costs, 1, 2), alpha)
+    return {name: RobustnessReport(name=name, expected=tuple(float(c) for c in expected[k]), cvar=tuple(float(c) for c in cvar[k]),
+                                   infeasible_rate=float(infeasible[k].mean()), detours=float(detours[k]), scenarios=scenarios,
+                                   alpha=alpha, seconds=seconds)
+            for k, name in enumerate(names)}
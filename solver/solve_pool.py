@@ -0,0 +1,172 @@
+import os
+import time
+import numpy as np
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from solver.tsp_solver import TSPSolver, GetRoute
+from solver.budget import RunDeadline
+from solver.evaluate import RouteCosts
+from solver.improve import ImproveTour
+from solver.checkpoint import SolveCheckpoint
+from models.cost_matrices import INFEASIBLE
+from models.world_cache import WorldIdentity
+
+# The three objectives on their own, plus the custom blend we have always shown
+OBJECTIVES = {
+    "distance": (1.0, 0.0, 0.0),
+    "time": (0.0, 1.0, 0.0),
+    "safety": (0.0, 0.0, 1.0),
+    "custom": (0.3, 0.3, 0.4),
+}
+
+@dataclass
+class SolveRecord:
+    """
+    Result of one solve, in a form that can be sent back from a worker process (the OR Tools objects cannot).
+
+    The route starts and ends at the depot, and distance/time/safety are its costs on each of the three matrices, whatever it was optimised for.
+    A route that has to use an infeasible route (only when there is no other way round) has an infinite time.
+
+    """
+    name: str
+    weights: tuple
+    route: list = field(repr=False)
+    distance: float
+    time: float
+    safety: float
+    wall_time: float
+
+
+class SharedWorld:
+    """
+    Quantizes the distance, time and safety matrices of a CostMatrices (see CostMatrices.Quantized) straight into one shared
+    memory block, shaped (3, n, n), so worker processes can read them without each getting its own pickled copy, and the world
+    does not keep int32 copies of its own alongside.
+
+    Use it as a context manager, the block is released on exit.
+
+    """
+    def __init__(self, world):
+        shape = (3, world.num, world.num)
+        self.shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 4)
+        self.spec = (self.shm.name, shape)
+        stacked = np.ndarray(shape, dtype=np.int32, buffer=self.shm.buf)
+        for k, name in enumerate(("distance", "time", "safety")):
+            world.Quantized(name, out=stacked[k])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shm.close()
+        self.shm.unlink()
+
+
+# Set in each worker by _attach
+_shm = None
+_matrices = None
+
+def _attach(name, shape):
+    global _shm, _matrices
+    _shm = shared_memory.SharedMemory(name=name)
+    _matrices = np.ndarray(shape, dtype=np.int32, buffer=_shm.buf)
+
+def BlendMatrices(matrices, weights):
+    """
+    Weighted sum of the (3, n, n) stacked int32 quantized objective matrices, rounded back to integers. Zero weights are skipped,
+    so a pure objective is returned exactly. Infeasible routes are only marked in the time matrix, so they stay at INFEASIBLE
+    whenever time has a weight, and pure distance or safety blends ignore them, just as they did the old huge times.
+
+    It is worked out a block of rows at a time, so apart from the int64 result there is only a block's worth of float64 around.
+
+    """
+    n = matrices.shape[1]
+    blend = np.empty(matrices.shape[1:], dtype=np.int64)
+    rows = max(1, 1000000 // max(n, 1))
+    for start in range(0, n, rows):
+        part = slice(start, start + rows)
+        block = np.zeros((len(blend[part]), n))
+        for w, matrix in zip(weights, matrices):
+            if w != 0:
+                block += w * matrix[part]
+        np.rint(block, out=block)
+        if weights[1] != 0:
+            block[matrices[1][part] == INFEASIBLE] = INFEASIBLE
+        blend[part] = block
+    return blend
+
+def RecordFromRoute(name, weights, route, matrices, wall_time, infeasible=None):
+    """
+    Costs a route on each of the distance, time and safety matrices (a list, or stacked (3, n, n)) and wraps it up as a
+    SolveRecord. If the infeasible mask is given, a route using any infeasible route gets an infinite time.
+
+    """
+    route_distance, route_time, route_safety = RouteCosts(route, matrices, infeasible)
+    return SolveRecord(name=name, weights=tuple(float(w) for w in weights), route=list(route),
+                       distance=route_distance, time=route_time, safety=route_safety, wall_time=wall_time)
+
+def _solve(name, weights, budget=None, polish=None, checkpoint=None):
+    start = time.perf_counter()
+    blend = BlendMatrices(_matrices, weights)
+    if checkpoint is None:
+        manager, routing, solution = TSPSolver(blend, budget=budget)
+    else:
+        directory, interval, resume, identity = checkpoint
+        meta = {"world": identity, "weights": [float(w) for w in weights], "nodes": len(blend)}
+        with SolveCheckpoint(directory, name, interval, meta=meta) as saver:
+            initial = saver.Resume() if resume else None
+            if initial is not None:
+                print(f"Resuming {name} from its checkpoint, cost {saver.best[0]} after {saver.offset:.1f}s")
+            manager, routing, solution = TSPSolver(blend, budget=budget, initial_route=initial, checkpoint=saver)
+    route = GetRoute(manager, routing, solution)
+    if polish:
+        route = ImproveTour(blend, route, duration=polish).route
+    return route, time.perf_counter() - start
+
+def SolvePool(world, objectives=None, max_workers=None, budget=None, deadline=None, polish=None, checkpoint=None, interval=30,
+              resume=False):
+    """
+    Solves every objective at once on a process pool, instead of one TSPSolver call after another.
+
+    objectives maps a name to a (distance, time, safety) weight vector, and defaults to OBJECTIVES. Any number of extra
+    weight vectors can be added, they just queue up once all the workers are busy.
+
+    budget is a Budget for every solve (see TSPSolver). deadline, in seconds, is a limit on the whole run instead, shared out
+    between the objectives by RunDeadline (with any other parts of budget kept). polish, in seconds, runs ImproveTour on each
+    tour afterwards, which often beats spending the same time in OR Tools.
+
+    checkpoint, a directory, streams each objective's improving tours there as they are found and saves its best tour every
+    interval seconds (see SolveCheckpoint, the files are named after the objective). With resume, each objective warm starts
+    from the best tour an earlier, killed run saved there. The checkpoints are tagged with the world they were solved on (see
+    WorldIdentity), so only a seeded world can be resumed, and a checkpoint from any other world is refused.
+
+    Returns a dict of name -> SolveRecord, in the same order as objectives. The routes are costed back here on the world's own
+    matrices, so the workers only ever see the quantized ones.
+
+    """
+    if objectives is None:
+        objectives = OBJECTIVES
+
+    if max_workers is None:
+        max_workers = min(len(objectives), os.cpu_count() or 1)
+
+    identity = WorldIdentity(world) if checkpoint is not None else None
+    if resume and identity is None:
+        raise ValueError("Only a seeded world can be resumed, an unseeded one can never be built the same way again")
+
+    if deadline is not None:
+        budgets = RunDeadline(deadline, len(objectives), max_workers, budget)
+    else:
+        budgets = [budget] * len(objectives)
+
+    with SharedWorld(world) as shared:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_attach, initargs=shared.spec) as pool:
+            saving = None if checkpoint is None else (checkpoint, interval, resume, identity)
+            futures = {name: pool.submit(_solve, name, weights, budget, polish, saving)
+                       for (name, weights), budget in zip(objectives.items(), budgets)}
+            routes = {name: future.result() for name, future in futures.items()}
+
+    matrices = [world.distance, world.time, world.safety]
+    return {name: RecordFromRoute(name, objectives[name], route, matrices, wall_time, world.infeasible)
+            for name, (route, wall_time) in routes.items()}
@@ -0,0 +1,131 @@
+from ortools.constraint_solver import routing_enums_pb2
+from ortools.constraint_solver import pywrapcp
+import time
+import numpy as np
+from config import duration
+from solver.tsp_solver import GetRoute
+from models.cost_matrices import QuantizeCosts, INFEASIBLE
+from models.sparse_cost_matrices import UnitVectors
+from solver.solve_pool import SolveRecord
+
+def CandidateTour(world, costs):
+    """
+    Greedy nearest neighbour tour from node 0 that sticks to the candidate routes wherever it can - from each node it takes the
+    cheapest unvisited candidate, and only when all of those are used up (or infeasible) does it jump to the closest unvisited
+    node anywhere.
+
+    costs are the quantized per stored route costs (in the CSR order of world). Returns the tour as a list starting and ending at 0.
+
+    """
+    points = UnitVectors(world.locations)
+    visited = np.zeros(world.num, dtype=bool)
+    remaining = np.arange(world.num)
+    tour = [0]
+    visited[0] = True
+
+    for _ in range(world.num - 1):
+        i = tour[-1]
+        row = slice(world.indptr[i], world.indptr[i+1])
+        open_ = ~visited[world.indices[row]] & (costs[row] < INFEASIBLE)
+        options = world.indices[row][open_]
+        if len(options):
+            j = options[np.argmin(costs[row][open_])]
+        else:
+            remaining = remaining[~visited[remaining]]
+            closeness = points[remaining] @ points[i]
+            # The closest nodes are often blocked candidates, which are no better than the far routes
+            blocked = world.indices[row][costs[row] == INFEASIBLE]
+            closeness[np.isin(remaining, blocked)] = -np.inf
+            j = remaining[np.argmax(closeness)]
+        tour.append(int(j))
+        visited[j] = True
+
+    return tour + [0]
+
+def SparseTSPSolver(world, weights=(1.0, 0.0, 0.0), duration=duration, restrict=True):
+    """
+    Solves the TSP on a SparseCostMatrices, for a (distance, time, safety) weighted blend.
+
+    With restrict set, each node's next stop is limited to its candidate list, which keeps both the first solution and the local
+    search within the k nearest neighbour graph, and means far routes never have to be worked out. Arcs are looked up through a
+    Python callback - the stored candidate routes from a per node dict, anything else worked out on demand by the world. A
+    registered transit matrix would keep the lookups in C++, but OR Tools stores it dense, which is the n x n cost this mode is
+    here to avoid. If no tour can be found within the candidate lists (the graph does not have to have one) we fall back to an
+    unrestricted search.
+
+    The search starts from CandidateTour, and the few far routes that tour needed are added to the allowed next stops, so there
+    is always at least one tour to start from.
+
+    Returns (manager, routing, solution) like TSPSolver.
+
+    """
+    n = world.num
+    blend = world.Weighted(weights)
+    # Like the dense world, blocked routes only count against the time objective
+    quantized = QuantizeCosts(blend, world.infeasible if weights[1] != 0 else None)
+    rows = [dict(zip(world.Neighbours(i).tolist(), quantized[world.indptr[i]:world.indptr[i+1]].tolist())) for i in range(n)]
+    limit = INFEASIBLE
+
+    manager = pywrapcp.RoutingIndexManager(n, 1, 0)
+    routing = pywrapcp.RoutingModel(manager)
+
+    def cost_callback(from_index, to_index):
+        i = manager.IndexToNode(from_index)
+        j = manager.IndexToNode(to_index)
+        cost = rows[i].get(j)
+        if cost is None and restrict:
+            # Outside the candidate lists, so never part of a tour - no point working it out
+            return limit
+        if cost is None:
+            d, t, s = world.Costs([i], [j])
+            cost = int(QuantizeCosts(weights[0] * d[0] + weights[1] * t[0] + weights[2] * s[0]))
+            rows[i][j] = cost
+        return cost
+
+    tour = CandidateTour(world, quantized)
+
+    if restrict:
+        for i, j in zip(tour[:-1], tour[1:]):
+            if j not in rows[i]:
+                d, t, s = world.Costs([i], [j])
+                rows[i][j] = int(QuantizeCosts(weights[0] * d[0] + weights[1] * t[0] + weights[2] * s[0]))
+
+    transit_callback_index = routing.RegisterTransitCallback(cost_callback)
+    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+
+    if restrict:
+        for i in range(n):
+            allowed = [routing.End(0) if j == 0 else manager.NodeToIndex(j) for j in rows[i]]
+            routing.NextVar(manager.NodeToIndex(i)).SetValues(allowed)
+
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+    search_parameters.local_search_metaheuristic = routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+    search_parameters.time_limit.FromMilliseconds(int(1000 * duration))
+    search_parameters.log_search = False
+
+    routing.CloseModelWithParameters(search_parameters)
+    initial = routing.ReadAssignmentFromRoutes([tour[1:-1]], True)
+    solution = routing.SolveFromAssignmentWithParameters(initial, search_parameters)
+    if solution is None and restrict:
+        return SparseTSPSolver(world, weights, duration, restrict=False)
+    return manager, routing, solution
+
+def SparseSolveAll(world, objectives, duration=duration):
+    """
+    The sparse counterpart of SolvePool - solves each named (distance, time, safety) weight vector in turn and returns a dict of
+    name -> SolveRecord, with each route costed on all three objectives.
+
+    """
+    records = {}
+    for name, weights in objectives.items():
+        start = time.perf_counter()
+        manager, routing, solution = SparseTSPSolver(world, weights, duration)
+        route = GetRoute(manager, routing, solution)
+        distance, time_cost, safety = world.Costs(route[:-1], route[1:])
+        position, found = world.Lookup(route[:-1], route[1:])
+        if world.infeasible[position[found]].any():
+            time_cost = np.inf
+        records[name] = SolveRecord(name=name, weights=tuple(float(w) for w in weights), route=route,
+                                    distance=float(distance.sum()), time=float(np.sum(time_cost)), safety=float(safety.sum()),
+                                    wall_time=time.perf_counter() - start)
+    return records
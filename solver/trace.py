@@ -0,0 +1,84 @@
+import json
+import numpy as np
+from dataclasses import dataclass, field, asdict
+from utils.plotting import Render, DrawConvergence
+
+@dataclass
+class SolveTrace:
+    """
+    What happened inside one TSPSolver call - pass one in as trace= and it is filled in when the solve returns.
+
+    quantize_time, build_time and search_time split the wall time into turning the matrix into integers, setting up the OR Tools
+    model (including reading in a warm start), and the search itself. improvements are the (elapsed, objective) points where the
+    search found a better tour than any before it, elapsed in seconds from the start of the search, so the first one is the
+    first solution and the rest are guided local search. solutions counts every tour the search accepted, better or not.
+
+    arc_evaluations is only known with callback="python" - the native matrix callbacks never come back into Python to be counted -
+    so it is None otherwise. branches and accepted_neighbors are the OR Tools search counters, which are always there.
+
+    """
+    label: str = ""
+    nodes: int = 0
+    callback: str = ""
+    duration: float = 0
+    warm_start: bool = False
+    quantize_time: float = 0
+    build_time: float = 0
+    search_time: float = 0
+    first_solution_time: float = None
+    first_solution_objective: int = None
+    improvements: list = field(default_factory=list)
+    solutions: int = 0
+    arc_evaluations: int = None
+    branches: int = 0
+    accepted_neighbors: int = 0
+    objective: int = None
+    status: int = None
+
+    def Record(self, solutions, **values):
+        """
+        Fills the trace in from a finished solve. solutions is every (elapsed, objective) the solution callback saw.
+
+        """
+        for name, value in values.items():
+            setattr(self, name, value)
+
+        self.solutions = len(solutions)
+        self.improvements = []
+        for elapsed, objective in solutions:
+            if not self.improvements or objective < self.improvements[-1][1]:
+                self.improvements.append((elapsed, objective))
+        if self.improvements:
+            self.first_solution_time, self.first_solution_objective = self.improvements[0]
+
+    @property
+    def last_improvement(self):
+        """
+        When the search last found a better tour - past this the rest of the budget bought nothing.
+
+        """
+        return self.improvements[-1][0] if self.improvements else None
+
+    def ToDict(self):
+        return {**asdict(self), "improvements": [list(point) for point in self.improvements], "last_improvement": self.last_improvement}
+
+
+def SaveTraces(traces, path):
+    """
+    Writes a list of SolveTraces out as a JSON list.
+
+    """
+    with open(path, "w") as f:
+        json.dump([trace.ToDict() for trace in traces], f, indent=2)
+
+def PlotConvergence(traces, save_path=None, pool=None):
+    """
+    Plots the improvement curve of each trace, as the objective relative to where that solve ended up, against time.
+
+    """
+    curves = []
+    for trace in traces:
+        if trace.improvements:
+            elapsed, objective = np.array(trace.improvements, dtype=float).T
+            curves.append((trace.label or f"{trace.nodes} nodes", elapsed, objective / max(objective[-1], 1), trace.search_time))
+    return Render(DrawConvergence, save_path, curves, pool=pool)
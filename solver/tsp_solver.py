@@ -1,11 +1,33 @@
 from ortools.constraint_solver import routing_enums_pb2 
 from ortools.constraint_solver import pywrapcp
 import numpy as np
+import time
 from config import duration
+from solver.budget import Budget
+from solver.evaluate import RouteCosts
+from utils.reporting import print_route
 
 s = duration
 
-def TSPSolver(matrix):
+def QuantizeMatrix(matrix):
+    """
+    Converts a cost matrix into the int64 array OR Tools works with, truncating like int() did in the old per arc callback. Integer
+    matrices (like the int32 ones from CostMatrices.Quantized) come through unchanged.
+
+    Huge entries (eg. times 1e10 after a major issue) are capped so that the cost of a whole tour still fits in an int64. An
+    integer matrix that is already within the cap is used as it is, without a float copy.
+
+    """
+    matrix = np.asarray(matrix)
+    limit = np.iinfo(np.int64).max // (2 * max(len(matrix), 1))
+    if np.issubdtype(matrix.dtype, np.integer):
+        if matrix.size == 0 or (matrix.min() >= 0 and matrix.max() <= limit):
+            return matrix.astype(np.int64, copy=False)
+        return np.clip(matrix, 0, limit).astype(np.int64, copy=False)
+    matrix = np.asarray(matrix, dtype=float)
+    return np.trunc(np.clip(matrix, 0, limit)).astype(np.int64)
+
+def TSPSolver(matrix, callback="matrix", stats=None, duration=None, initial_route=None, trace=None, budget=None, checkpoint=None):
     """
     This function is adapted from Google OR Tools. 
 
@@ -16,17 +38,51 @@ def TSPSolver(matrix):
     Improvement - Guided Local Search. 
 
     NOTE  - We only run the improvement for S seconds, as seen in the first code block
+
+    The matrix is quantized once up front and handed to OR Tools as an array (RegisterTransitMatrix, or RegisterUnaryTransitVector
+    if we get a 1D per node cost), so arc lookups stay in C++. callback="python" keeps the old per arc Python callback, which is
+    mostly useful to compare against.
+
+    If a dict is passed as stats, it gets filled with timings and search throughput, including evals/sec for the Python callback.
+
+    duration overrides the S second budget (fractions of a second are fine). initial_route, a route like the ones GetRoute returns,
+    warm starts the search from that tour instead of building a first solution from scratch.
+
+    budget, a Budget, replaces duration with a time limit that can scale with the instance or follow a run deadline, and can stop
+    the search early (no improvement for a while, or close enough to a lower bound). The early stop is a search limit, so OR Tools
+    checks it all through the search, not just when a solution comes in. With neither duration nor budget given the search gets
+    the usual S seconds.
+
+    If a SolveTrace is passed as trace, it gets filled with per phase timings (quantize, build, search), every improving solution
+    the search finds as (elapsed, objective), and arc evaluation counts (only with the Python callback, see SolveTrace).
+
+    If a SolveCheckpoint is passed as checkpoint, every improving tour is streamed to its log as it is found, and the best one is
+    saved every so often, so a long solve can be killed and resumed (see SolveCheckpoint.Resume, and pass its tour back in as
+    initial_route).
     
     """
-    manager = pywrapcp.RoutingIndexManager(len(matrix), 1, 0)
+    quantize_start = time.perf_counter()
+    quantized = QuantizeMatrix(matrix)
+    quantize_time = time.perf_counter() - quantize_start
+    build_start = time.perf_counter()
+
+    manager = pywrapcp.RoutingIndexManager(len(quantized), 1, 0)
     routing = pywrapcp.RoutingModel(manager)
 
-    def distance_callback(from_index, to_index):
-        i = manager.IndexToNode(from_index)
-        j = manager.IndexToNode(to_index)
-        return int(matrix[i][j])
+    evaluations = [0]
+
+    if callback == "python":
+        def distance_callback(from_index, to_index):
+            evaluations[0] += 1
+            i = manager.IndexToNode(from_index)
+            j = manager.IndexToNode(to_index)
+            return int(quantized[i][j])
 
-    transit_callback_index = routing.RegisterTransitCallback(distance_callback)
+        transit_callback_index = routing.RegisterTransitCallback(distance_callback)
+    elif quantized.ndim == 1:
+        transit_callback_index = routing.RegisterUnaryTransitVector(quantized.tolist())
+    else:
+        transit_callback_index = routing.RegisterTransitMatrix(quantized.tolist())
 
     # Define cost of each arc.
     routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
@@ -44,50 +100,148 @@ def TSPSolver(matrix):
     # search_parameters.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION
 
     search_parameters.local_search_metaheuristic = routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
-    search_parameters.time_limit.FromSeconds(s)
+    if budget is None:
+        budget = Budget(seconds=s if duration is None else duration)
+    # The stop rule may need a lower bound (O(n^3) with scipy), which comes out of the time limit rather than on top of it
+    bound_start = time.perf_counter()
+    stop = budget.StopRule(quantized)
+    limit = budget.Seconds(len(quantized), spent=time.perf_counter() - bound_start)
+    search_parameters.time_limit.FromMilliseconds(max(1, int(1000 * limit)))
     search_parameters.log_search = False
 
+    solutions = []
+    best = [None, 0]
+
+    def at_solution():
+        # Called by OR Tools on every solution the search accepts, including ones worse than the best so far
+        elapsed = time.perf_counter() - start
+        objective = routing.CostVar().Value()
+        solutions.append((elapsed, objective))
+        if best[0] is None or objective < best[0]:
+            best[0], best[1] = objective, elapsed
+            if checkpoint is not None:
+                checkpoint.Improved(elapsed, objective, lambda: CurrentRoute(manager, routing))
+
+    def stop_limit():
+        # Checked by OR Tools over and over while it searches, even when no solution is being accepted - never before the first
+        # solution, so there is always a tour to return
+        return best[0] is not None and stop(time.perf_counter() - start, best[0], best[1])
+
+    if trace is not None or stop is not None or checkpoint is not None:
+        routing.AddAtSolutionCallback(at_solution)
+    if stop is not None:
+        routing.AddSearchMonitor(routing.solver().CustomLimit(stop_limit))
+
+    if initial_route is not None:
+        routing.CloseModelWithParameters(search_parameters)
+        # OR Tools wants the route without the depot at either end
+        initial = routing.ReadAssignmentFromRoutes([[int(node) for node in initial_route if node != 0]], True)
+    build_time = time.perf_counter() - build_start
+
     # Solve the problem.
-    solution = routing.SolveWithParameters(search_parameters)
+    start = time.perf_counter()
+    if initial_route is None:
+        solution = routing.SolveWithParameters(search_parameters)
+    else:
+        solution = routing.SolveFromAssignmentWithParameters(initial, search_parameters)
+    elapsed = time.perf_counter() - start
+
+    if checkpoint is not None and solution is not None:
+        checkpoint.Finish(elapsed, solution.ObjectiveValue(), GetRoute(manager, routing, solution))
+
+    if stats is not None:
+        solver = routing.solver()
+        stats["callback"] = callback
+        stats["nodes"] = len(quantized)
+        stats["solve_time"] = elapsed
+        stats["branches_per_sec"] = solver.Branches() / elapsed
+        stats["accepted_neighbors_per_sec"] = solver.AcceptedNeighbors() / elapsed
+        # Arc evaluations are only visible to us through the Python callback, the native paths never come back into Python
+        stats["evaluations"] = evaluations[0] if callback == "python" else None
+        stats["evals_per_sec"] = evaluations[0] / elapsed if callback == "python" else None
+
+    if trace is not None:
+        trace.Record(nodes=len(quantized), callback=callback, duration=limit,
+                     warm_start=initial_route is not None, quantize_time=quantize_time, build_time=build_time,
+                     search_time=elapsed, solutions=solutions, arc_evaluations=evaluations[0] if callback == "python" else None,
+                     branches=routing.solver().Branches(), accepted_neighbors=routing.solver().AcceptedNeighbors(),
+                     objective=solution.ObjectiveValue() if solution is not None else None, status=routing.status())
+
     return manager, routing, solution
 
-def print_solution(manager, routing, solution, world):
+def Reoptimise(matrix, route, dirty, duration=None, stats=None):
     """
-    This function is adapted from Google OR Tools. 
+    Re-solves after an incremental world update (see CostMatrices.TakeDirty), warm starting from the current route. matrix is
+    what to solve on, eg. world.Quantized("time"), which the updates keep current.
+
+    The search budget is a fraction of the full S seconds, depending on how much of the route the update touched - a tenth when
+    none of its arcs changed (other arcs may now be worth using), growing with the share of changed arcs up to the full budget.
+
+    Returns (manager, routing, solution) like TSPSolver.
+
+    """
+    arcs = list(zip(route[:-1], route[1:]))
+    changed = sum((int(i), int(j)) in dirty for i, j in arcs)
+    share = np.clip(0.1 + 2 * changed / max(len(arcs), 1), 0.1, 1)
+    full = s if duration is None else duration
+
+    return TSPSolver(matrix, stats=stats, duration=full * share, initial_route=route)
+
+def GetRoute(manager, routing, solution):
+    """
+    Walks the OR Tools solution and returns the route as a list of nodes, starting and ending at the depot.
 
-    It takes in outputs from the TSPSolver and prints out the route, and its "cost" across the three domains of Distance, Time and Safety.
-    
     """
     index = routing.Start(0)
-    plan_output = "Route:\n"
-    route_distance = 0
-    route_time = 0
-    route_safety = 0
     route = []
-    
+
     while not routing.IsEnd(index):
-        node_index = manager.IndexToNode(index)
-        route.append(node_index)
-        plan_output += f" {node_index} ->"
-        previous_index = index
+        route.append(manager.IndexToNode(index))
         index = solution.Value(routing.NextVar(index))
-        
-        # Get the actual node indices for matrix lookup
-        from_node = manager.IndexToNode(previous_index)
-        to_node = manager.IndexToNode(index)
-        
-        # Calculate costs on all three matrices
-        route_distance += world.distance[from_node][to_node]
-        route_time += world.time[from_node][to_node]
-        route_safety += world.safety[from_node][to_node]
-    
-    # Add the final node
-    final_node = manager.IndexToNode(index)
-    route.append(final_node)
-    plan_output += f" {final_node}\n"
-    plan_output += f"Distance: {np.round(route_distance, 2)} km\n"
-    plan_output += f"Time: {np.round(route_time,2)} hr\n" 
-    plan_output += f"Safety: {np.round(route_safety,2)}\n"
+
+    route.append(manager.IndexToNode(index))
+    return route
+
+def CurrentRoute(manager, routing):
+    """
+    Like GetRoute, but for the tour the search is on right now - only meaningful inside a solution callback.
+
+    """
+    index = routing.Start(0)
+    route = []
+
+    while not routing.IsEnd(index):
+        route.append(manager.IndexToNode(index))
+        index = routing.NextVar(index).Value()
+
+    route.append(manager.IndexToNode(index))
+    return route
+
+def print_solution(manager, routing, solution, world):
+    """
+    This function is adapted from Google OR Tools. 
+
+    It takes in outputs from the TSPSolver and prints out the route, and its "cost" across the three domains of Distance, Time and Safety.
+    The costs come from EvaluateRoutes, and the printing from utils.reporting.
     
-    print(plan_output)
+    """
+    route = GetRoute(manager, routing, solution)
+    route_distance, route_time, route_safety = RouteCosts(route, [world.distance, world.time, world.safety])
+
+    print_route(route, route_distance, route_time, route_safety)
     return route, route_distance, route_time, route_safety
+
+if __name__ == "__main__":
+    # Quick comparison of the native and Python arc callbacks on random worlds
+    from models.cost_matrices import CostMatrices
+
+    for n in (50, 200, 1000):
+        locations = np.column_stack([np.random.uniform(24.5, 49.5, n), np.random.uniform(-124.8, -66.9, n)])
+        world = CostMatrices(locations)
+
+        for callback in ("python", "matrix"):
+            stats = {}
+            manager, routing, solution = TSPSolver(world.Quantized("distance"), callback=callback, stats=stats)
+            evals = f"{stats['evals_per_sec']:.0f} evals/sec, " if stats["evals_per_sec"] is not None else ""
+            print(f"{n} nodes, {callback} callback: {evals}{stats['branches_per_sec']:.0f} branches/sec, "
+                  f"{stats['accepted_neighbors_per_sec']:.0f} accepted neighbours/sec, cost {solution.ObjectiveValue()}")
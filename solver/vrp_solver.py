@@ -0,0 +1,286 @@
+from ortools.constraint_solver import routing_enums_pb2
+from ortools.constraint_solver import pywrapcp
+import os
+import time
+import numpy as np
+from dataclasses import dataclass, field, replace
+from concurrent.futures import ProcessPoolExecutor
+from config import duration, quantize
+from models.cost_matrices import QuantizeCosts
+from solver.tsp_solver import QuantizeMatrix
+from solver.solve_pool import OBJECTIVES, BlendMatrices, SolveRecord
+from solver.evaluate import EvaluateRoutes
+from solver.improve import ImproveTour
+
+@dataclass
+class Fleet:
+    """
+    The vehicles for a VRPSolver / SolveFleet run.
+
+    - vehicles, how many there are
+    - depots, where each vehicle starts and ends - one node shared by all of them, or one per vehicle
+    - demands, what each node needs (a list of n, the depots need 0), and capacities, what each vehicle can carry (one number for
+      all of them, or one per vehicle). Without both there is no capacity limit
+    - max_time, the longest a single vehicle's route may take in hours, on CostMatrices.time
+    - drop_penalty, if set, nodes may be left out of the plan at this cost each (in blended cost units, see BlendMatrices) rather
+      than the whole plan failing when the fleet cannot reach everything
+
+    """
+    vehicles: int = 1
+    depots: tuple = (0,)
+    demands: list = None
+    capacities: object = None
+    max_time: float = None
+    drop_penalty: int = None
+
+    def Depots(self):
+        depots = list(self.depots)
+        return depots * self.vehicles if len(depots) == 1 else depots
+
+    def Capacities(self):
+        if np.ndim(self.capacities) == 0:
+            return [int(self.capacities)] * self.vehicles
+        return [int(c) for c in self.capacities]
+
+
+@dataclass
+class FleetPlan:
+    """
+    Output of SolveFleet. routes has one route per vehicle (from its depot and back, just [depot, depot] if it is not used),
+    records a SolveRecord for each costed on all three objectives, loads the demand each carries, and dropped any nodes left
+    out. distance, time and safety are the totals over the fleet, and time is infinite if any route uses an infeasible route.
+
+    """
+    routes: list = field(repr=False)
+    records: list = field(repr=False)
+    loads: list
+    dropped: list
+    distance: float
+    time: float
+    safety: float
+    clusters: int
+    wall_time: float
+
+
+def VRPSolver(matrix, fleet, time_matrix=None, duration=duration):
+    """
+    This function is adapted from Google OR Tools, like TSPSolver, but for a fleet of vehicles rather than one (see Fleet).
+
+    matrix is the cost to optimise (eg. a blend from BlendMatrices) and time_matrix the quantized times (see
+    CostMatrices.Quantized) that a max_time is checked against. Demands go in as a capacity dimension and times as a time
+    dimension, and with a drop_penalty every non-depot node becomes optional at that price.
+
+    Returns (manager, routing, solution), where solution is None if no plan was found within duration seconds.
+
+    """
+    quantized = QuantizeMatrix(matrix)
+    n = len(quantized)
+    depots = fleet.Depots()
+
+    manager = pywrapcp.RoutingIndexManager(n, fleet.vehicles, depots, depots)
+    routing = pywrapcp.RoutingModel(manager)
+
+    transit_callback_index = routing.RegisterTransitMatrix(quantized.tolist())
+    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+
+    if fleet.demands is not None and fleet.capacities is not None:
+        demand_callback_index = routing.RegisterUnaryTransitVector([int(d) for d in fleet.demands])
+        routing.AddDimensionWithVehicleCapacity(demand_callback_index, 0, fleet.Capacities(), True, "Capacity")
+
+    if fleet.max_time is not None and time_matrix is not None:
+        time_callback_index = routing.RegisterTransitMatrix(QuantizeMatrix(time_matrix).tolist())
+        routing.AddDimension(time_callback_index, 0, int(fleet.max_time * quantize), True, "Time")
+
+    if fleet.drop_penalty is not None:
+        for node in set(range(n)) - set(depots):
+            routing.AddDisjunction([manager.NodeToIndex(node)], int(fleet.drop_penalty))
+
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+    search_parameters.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION
+    search_parameters.local_search_metaheuristic = routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+    search_parameters.time_limit.FromMilliseconds(max(1, int(1000 * duration)))
+
+    solution = routing.SolveWithParameters(search_parameters)
+    return manager, routing, solution
+
+def GetRoutes(manager, routing, solution):
+    """
+    Walks a VRPSolver solution and returns one route per vehicle, each a list of nodes from its depot back to its depot.
+
+    """
+    routes = []
+    for vehicle in range(routing.vehicles()):
+        index = routing.Start(vehicle)
+        route = []
+        while not routing.IsEnd(index):
+            route.append(manager.IndexToNode(index))
+            index = solution.Value(routing.NextVar(index))
+        route.append(manager.IndexToNode(index))
+        routes.append(route)
+    return routes
+
+def SubMatrices(world, nodes):
+    """
+    The int32 quantized (3, m, m) distance, time and safety matrices between just these nodes, built from the world's float
+    ones so the full n x n quantized copies are never needed.
+
+    """
+    ix = np.ix_(nodes, nodes)
+    return np.stack([QuantizeCosts(getattr(world, name)[ix], world.Blocked(name, *ix)) for name in ("distance", "time", "safety")])
+
+def KMeans(points, k, seed=0, iterations=25):
+    """
+    Plain Lloyd's k-means, returning a cluster label per point.
+
+    """
+    rng = np.random.RandomState(seed)
+    centres = points[rng.choice(len(points), k, replace=False)]
+    for _ in range(iterations):
+        labels = np.argmin(((points[:, None, :] - centres[None, :, :]) ** 2).sum(axis=2), axis=1)
+        moved = np.array([points[labels == c].mean(axis=0) if np.any(labels == c) else centres[c] for c in range(k)])
+        if np.allclose(moved, centres):
+            break
+        centres = moved
+    return labels
+
+def ClusterFleet(world, fleet, cluster_size, seed=0):
+    """
+    Splits a big fleet problem into sub-problems of about cluster_size nodes (never more than there are vehicles) by k-means on
+    the node locations. Each cluster gets a share of the vehicles in proportion to its demand, at least one, taking the vehicles
+    whose depots are nearest to it, and then stops are moved out of any cluster with more demand than its vehicles can carry.
+
+    Returns a list of (nodes, vehicle indices), where nodes are the cluster's nodes in the world with its depots first.
+
+    """
+    depots = fleet.Depots()
+    demands = np.ones(world.num) if fleet.demands is None else np.asarray(fleet.demands, dtype=float)
+    stops = np.setdiff1d(np.arange(world.num), depots)
+    k = int(min(fleet.vehicles, max(1, -(-len(stops) // cluster_size))))
+    locations = np.asarray(world.locations, dtype=float)
+    labels = KMeans(locations[stops], k, seed)
+
+    # Vehicles per cluster by demand, largest remainder, at least one each
+    load = np.array([demands[stops[labels == c]].sum() for c in range(k)])
+    share = load / max(load.sum(), 1) * (fleet.vehicles - k)
+    counts = 1 + np.floor(share).astype(int)
+    counts[np.argsort(share - np.floor(share))[::-1][:fleet.vehicles - counts.sum()]] += 1
+
+    points = locations[stops]
+    centres = np.array([points[labels == c].mean(axis=0) for c in range(k)])
+    free = list(range(fleet.vehicles))
+    vehicles = {}
+    for c in np.argsort(load)[::-1]:
+        free.sort(key=lambda v: np.sum((locations[depots[v]] - centres[c]) ** 2))
+        vehicles[c], free = free[:counts[c]], free[counts[c]:]
+
+    # k-means knows nothing of capacity, so move the stops furthest out of any over-full cluster to the nearest one with room
+    if fleet.demands is not None and fleet.capacities is not None:
+        capacity = np.array([sum(fleet.Capacities()[v] for v in vehicles[c]) for c in range(k)])
+        for c in range(k):
+            while load[c] > capacity[c]:
+                members = np.flatnonzero(labels == c)
+                far = members[np.argmax(np.sum((points[members] - centres[c]) ** 2, axis=1))]
+                room = load + demands[stops[far]] <= capacity
+                room[c] = False
+                if not room.any():
+                    break
+                target = np.argmin(np.where(room, np.sum((centres - points[far]) ** 2, axis=1), np.inf))
+                labels[far] = target
+                load[c] -= demands[stops[far]]
+                load[target] += demands[stops[far]]
+
+    clusters = []
+    for c in np.argsort(load)[::-1]:
+        nodes = stops[labels == c]
+        clusters.append((np.concatenate([np.unique([depots[v] for v in vehicles[c]]), nodes]), vehicles[c]))
+    return clusters
+
+def PolishRoute(matrix, route, duration, time_matrix=None, max_time=None):
+    """
+    ImproveTour on one vehicle's route, which only visits some of the nodes - it is polished on the matrix between just those.
+
+    The polished route visits the same stops, so its load is unchanged, but a cheaper blend can take longer. With a max_time (in
+    hours, against the quantized time_matrix like VRPSolver's time dimension) a polished route over it is thrown away and the
+    route comes back as it was.
+
+    """
+    nodes = np.array(route[:-1])
+    if len(nodes) < 4:
+        return route
+    polished = [int(nodes[k]) for k in ImproveTour(matrix[np.ix_(nodes, nodes)], list(range(len(nodes))) + [0],
+                                                   duration=duration).route]
+    if max_time is not None and time_matrix is not None:
+        taken = np.asarray(time_matrix)[polished[:-1], polished[1:]].sum(dtype=np.int64)
+        if taken > int(max_time * quantize):
+            return route
+    return polished
+
+def _solve_cluster(matrices, weights, fleet, duration, polish):
+    blend = BlendMatrices(matrices, weights)
+    manager, routing, solution = VRPSolver(blend, fleet, matrices[1], duration)
+    if solution is None:
+        return None
+    routes = GetRoutes(manager, routing, solution)
+    if polish:
+        routes = [PolishRoute(blend, route, polish, matrices[1], fleet.max_time) for route in routes]
+    return routes
+
+def SolveFleet(world, fleet, weights=OBJECTIVES["custom"], duration=duration, cluster_size=500, max_workers=None, polish=None,
+               seed=0):
+    """
+    Plans routes for a whole fleet (see Fleet) on a CostMatrices, optimising a weighted blend of distance, time and safety and
+    costing every vehicle's route on all three.
+
+    Up to cluster_size nodes this is one VRPSolver call. Bigger instances are decomposed - the nodes are clustered
+    (see ClusterFleet), each cluster with its share of the vehicles is solved on a process pool at once, and the per-cluster
+    routes are stitched back together into one plan in world node numbers. polish, in seconds, runs ImproveTour on every route
+    afterwards.
+
+    Returns a FleetPlan.
+
+    """
+    start = time.perf_counter()
+    depots = fleet.Depots()
+    if len(depots) != fleet.vehicles:
+        raise ValueError(f"Fleet has {fleet.vehicles} vehicles but {len(depots)} depots")
+
+    if world.num <= cluster_size or fleet.vehicles == 1:
+        clusters = [(np.arange(world.num), list(range(fleet.vehicles)))]
+    else:
+        clusters = ClusterFleet(world, fleet, cluster_size, seed)
+
+    jobs = []
+    for nodes, vehicles in clusters:
+        local = {node: k for k, node in enumerate(nodes)}
+        sub = replace(fleet, vehicles=len(vehicles), depots=tuple(local[depots[v]] for v in vehicles),
+                      demands=None if fleet.demands is None else [fleet.demands[node] for node in nodes],
+                      capacities=None if fleet.capacities is None else [fleet.Capacities()[v] for v in vehicles])
+        jobs.append((SubMatrices(world, nodes), weights, sub, duration, polish))
+
+    if len(jobs) == 1:
+        results = [_solve_cluster(*jobs[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=min(len(jobs), max_workers or os.cpu_count() or 1)) as pool:
+            results = list(pool.map(_solve_cluster, *zip(*jobs)))
+
+    # Stitch the cluster routes back together, in world node numbers and vehicle order
+    routes = [[depot, depot] for depot in depots]
+    for (nodes, vehicles), result in zip(clusters, results):
+        if result is None:
+            continue
+        for vehicle, route in zip(vehicles, result):
+            routes[vehicle] = [int(nodes[node]) for node in route]
+
+    visited = set(node for route in routes for node in route)
+    dropped = [node for node in range(world.num) if node not in visited]
+    demands = np.zeros(world.num) if fleet.demands is None else np.asarray(fleet.demands, dtype=float)
+    costs = EvaluateRoutes(routes, [world.distance, world.time, world.safety], world.infeasible)
+    wall_time = time.perf_counter() - start
+
+    records = [SolveRecord(name=f"vehicle {v}", weights=tuple(float(w) for w in weights), route=route,
+                           distance=float(cost[0]), time=float(cost[1]), safety=float(cost[2]), wall_time=wall_time)
+               for v, (route, cost) in enumerate(zip(routes, costs))]
+    distance, route_time, safety = costs.sum(axis=0)
+    return FleetPlan(routes=routes, records=records, loads=[float(demands[route].sum()) for route in routes], dropped=dropped,
+                     distance=float(distance), time=float(route_time), safety=float(safety), clusters=len(clusters),
+                     wall_time=wall_time)
@@ -0,0 +1,47 @@
+import time
+import numpy as np
+import solver.budget
+from solver.budget import Budget
+from solver.tsp_solver import TSPSolver
+
+
+def points(n, seed=0):
+    locations = np.random.default_rng(seed).random((n, 2)) * 1000
+    return np.sqrt(((locations[:, None] - locations[None]) ** 2).sum(axis=-1))
+
+
+def test_budget_seconds():
+    assert Budget(seconds=2).Seconds(500) == 2
+    assert Budget(per_node=0.01, maximum=3).Seconds(100) == 1
+    assert Budget(per_node=0.01, maximum=3).Seconds(1000) == 3
+    assert Budget(per_node=0.01).Seconds(1) == Budget().minimum
+    assert Budget(seconds=2).Seconds(500, spent=0.5) == 1.5
+    assert Budget(seconds=2).Seconds(500, spent=5) == Budget().minimum
+
+
+def test_patience_stops_the_search_early():
+    matrix = points(120)
+    start = time.perf_counter()
+    _, _, solution = TSPSolver(matrix, budget=Budget(seconds=20, patience=0.2))
+    assert solution is not None
+    assert time.perf_counter() - start < 10
+
+
+def test_gap_stops_once_the_bound_is_met():
+    matrix = points(12)
+    start = time.perf_counter()
+    _, _, solution = TSPSolver(matrix, budget=Budget(seconds=20, gap=10.0))
+    assert solution is not None
+    assert time.perf_counter() - start < 10
+
+
+def test_the_bound_comes_out_of_the_time_limit(monkeypatch):
+    def slow_bound(quantized):
+        time.sleep(1)
+        return 0                                       #Never met, so only the time limit stops the search
+
+    monkeypatch.setattr(solver.budget, "LowerBound", slow_bound)
+    start = time.perf_counter()
+    _, _, solution = TSPSolver(points(60), budget=Budget(seconds=2, gap=0.01))
+    assert solution is not None
+    assert time.perf_counter() - start < 2.5
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from models.cost_matrices import CostMatrices
+from models.world_cache import CachedWorld, WorldKey, WorldIdentity
+from solver.checkpoint import SolveCheckpoint
+from solver.solve_pool import SolvePool
+
+
+def locations(n=12, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.uniform(25, 49, n), rng.uniform(-124, -67, n)])
+
+
+def test_resume_picks_up_the_best_saved_tour(tmp_path):
+    meta = {"world": "abc", "weights": [1.0, 0.0, 0.0], "nodes": 4}
+    with SolveCheckpoint(str(tmp_path), "distance", meta=meta) as saver:
+        saver.Improved(0.1, 50, lambda: [0, 1, 2, 3, 0])
+        saver.Finish(0.5, 40, [0, 2, 1, 3, 0])
+
+    resumed = SolveCheckpoint(str(tmp_path), "distance", meta=meta)
+    assert resumed.Resume() == [0, 2, 1, 3, 0]
+    assert resumed.offset == 0.5
+    assert SolveCheckpoint(str(tmp_path / "empty"), "distance", meta=meta).Resume() is None
+
+
+def test_resume_refuses_another_world(tmp_path):
+    with SolveCheckpoint(str(tmp_path), "distance", meta={"world": "abc", "nodes": 4}) as saver:
+        saver.Finish(0.5, 40, [0, 2, 1, 3, 0])
+
+    with pytest.raises(ValueError):
+        SolveCheckpoint(str(tmp_path), "distance", meta={"world": "xyz", "nodes": 4}).Resume()
+
+
+def test_world_identity(tmp_path):
+    points = locations()
+    world = CachedWorld(points, 5, cache_dir=str(tmp_path), congestion_zones=3)
+    assert WorldIdentity(world) == WorldKey(points, 5, 3)
+    # And the same once it comes back out of the cache
+    assert WorldIdentity(CachedWorld(points, 5, cache_dir=str(tmp_path), congestion_zones=3)) == WorldKey(points, 5, 3)
+    assert WorldIdentity(CostMatrices(points)) is None
+
+
+def test_solve_pool_only_resumes_seeded_worlds(tmp_path):
+    with pytest.raises(ValueError):
+        SolvePool(CostMatrices(locations()), checkpoint=str(tmp_path), resume=True)
@@ -0,0 +1,88 @@
+import math
+import itertools
+import numpy as np
+import pytest
+from config import avgspeed
+from utils.geometry import RouteCircleIntersect
+from models.cost_matrices import CostMatrices
+from models.sparse_cost_matrices import SparseCostMatrices
+
+
+def locations(n=40, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.uniform(25, 49, n), rng.uniform(-124, -67, n)])
+
+
+def test_seeded_world_is_the_same_whichever_matrix_is_built_first():
+    points = locations()
+    worlds = []
+    for order in itertools.permutations(("distance", "time", "safety")):
+        world = CostMatrices(points, seed=7)
+        for name in order:
+            getattr(world, name)
+        worlds.append(world)
+
+    first = worlds[0]
+    for world in worlds[1:]:
+        for name in ("distance", "time", "safety", "infeasible"):
+            assert np.array_equal(getattr(world, name), getattr(first, name))
+        assert np.array_equal(world.blocked, first.blocked)
+        assert world.major == first.major
+
+
+def test_weighted_blend():
+    world = CostMatrices(locations(), seed=3, block_size=100)
+    weights = (0.2, 0.0, 0.8)
+    expected = 0.2 * world.distance.astype(np.float64) + 0.8 * world.safety
+    assert np.allclose(world.Weighted(weights), expected, rtol=1e-6)
+    assert world._time is None
+
+    sparse = SparseCostMatrices(locations(), k=5, seed=3)
+    expected = 0.2 * sparse.distance.astype(np.float64) + 0.8 * sparse.safety
+    assert np.allclose(sparse.Weighted(weights), expected, rtol=1e-6)
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371 * math.asin(math.sqrt(a))
+
+
+def reference(world):
+    """
+    The three matrices worked out a route at a time, the way the original double loop did.
+
+    """
+    n = world.num
+    distance, time, safety = np.zeros((n, n)), np.zeros((n, n)), np.zeros((n, n))
+    rng = np.random.RandomState(world.safety_seed)
+    for i in range(n):
+        for j in range(i + 1, n):
+            (lat1, lon1), (lat2, lon2) = world.locations[i], world.locations[j]
+            distance[i, j] = distance[j, i] = haversine(lat1, lon1, lat2, lon2)
+            time[i, j] = time[j, i] = distance[i, j] / avgspeed
+            for r, b1, a1, type, scale in world.scaler:
+                if RouteCircleIntersect(lon1, lat1, lon2, lat2, a1, b1, r):
+                    time[i, j] *= scale
+                    time[j, i] = time[j, i] / scale if type == 0 else time[j, i] * scale
+            safety[i, j] = safety[j, i] = rng.uniform(-n, n)
+
+    if world.major is not None:
+        others = np.arange(n) != world.major
+        time[others, world.major] *= 1e10
+        time[world.major, others] *= 1e10
+    if safety.min() < 0:
+        safety -= safety.min()
+        np.fill_diagonal(safety, 0)
+    return distance, time, safety
+
+
+@pytest.mark.parametrize("seed, zone_index", [(8, "brute"), (8, "grid"), (5, "auto")])
+def test_matrices_match_a_route_by_route_reference(seed, zone_index):
+    # Seed 8 has a major issue, and the small blocks make every matrix take several
+    world = CostMatrices(locations(30), seed=seed, dtype=np.float64, block_size=50, congestion_zones=20, zone_index=zone_index)
+    assert (world.major is not None) == (seed == 8)
+    distance, time, safety = reference(world)
+    assert np.allclose(world.distance, distance, rtol=1e-9)
+    assert np.allclose(world.time, time, rtol=1e-9)
+    assert np.allclose(world.safety, safety, rtol=1e-9)
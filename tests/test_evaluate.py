@@ -0,0 +1,32 @@
+import numpy as np
+from solver.evaluate import EvaluateRoutes, RouteCosts
+
+
+def matrices(n=6, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.random((n, n)) for _ in range(3)]
+
+
+def test_evaluate_matches_a_walk():
+    costs = matrices()
+    routes = [[0, 3, 1, 2, 0], [0, 5, 4, 0]]
+    totals = EvaluateRoutes(routes, costs)
+    for route, total in zip(routes, totals):
+        for matrix, cost in zip(costs, total):
+            assert np.isclose(cost, sum(matrix[i, j] for i, j in zip(route[:-1], route[1:])))
+
+
+def test_infeasible_columns():
+    costs = matrices()
+    infeasible = np.zeros((6, 6), dtype=bool)
+    infeasible[3, 1] = True
+    routes = [[0, 3, 1, 2, 0], [0, 5, 4, 0]]
+
+    time_only = EvaluateRoutes(routes, costs, infeasible)
+    assert np.isinf(time_only[0, 1]) and np.isfinite(time_only[0, [0, 2]]).all()
+    assert np.isfinite(time_only[1]).all()
+
+    everything = EvaluateRoutes(routes, costs, infeasible, columns=slice(None))
+    assert np.isinf(everything[0]).all() and np.isfinite(everything[1]).all()
+
+    assert np.isinf(RouteCosts(routes[0], costs, infeasible, columns=[0, 2])).tolist() == [True, False, True]
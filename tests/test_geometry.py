@@ -0,0 +1,28 @@
+import numpy as np
+from utils.geometry import haversine_distance, RouteCircleIntersect, RouteCircleIntersectMany
+
+
+def test_haversine_known_distances():
+    assert np.isclose(haversine_distance(0, 0, 0, 1), 6371 * np.pi / 180)
+    assert np.isclose(haversine_distance(0, 0, 0, 180), 6371 * np.pi)
+    # New York to Los Angeles
+    assert abs(haversine_distance(40.7128, -74.0060, 34.0522, -118.2437) - 3936) < 5
+
+
+def test_batched_intersections_match_one_at_a_time():
+    rng = np.random.default_rng(1)
+    x1, y1, x2, y2 = rng.uniform(-10, 10, (4, 300))
+    # Some routes of zero length, and some on lines just touching the top of a circle
+    x2[:10], y2[:10] = x1[:10], y1[:10]
+    a1, b1 = rng.uniform(-10, 10, (2, 40))
+    r = rng.uniform(0.1, 6, 40)
+    y1[10:20] = y2[10:20] = b1[:10] + r[:10]
+
+    mask = RouteCircleIntersectMany(x1[:, None], y1[:, None], x2[:, None], y2[:, None], a1[None], b1[None], r[None])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        expected = np.array([[RouteCircleIntersect(x1[p], y1[p], x2[p], y2[p], a1[z], b1[z], r[z]) for z in range(40)]
+                             for p in range(300)])
+    assert mask.shape == (300, 40)
+    assert np.array_equal(mask, expected)
+    assert not mask[:10].any()
+    assert mask.any() and not mask.all()
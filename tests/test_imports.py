@@ -0,0 +1,14 @@
+import pytest
+from benchmark import ImportProbe
+
+
+@pytest.mark.parametrize("module", ["solve", "models.cost_matrices", "solver.tsp_solver", "service"])
+def test_headless_imports_stay_light(module):
+    _, loaded = ImportProbe(module)
+    assert "matplotlib" not in loaded
+    assert "openai" not in loaded
+
+
+def test_failed_import_is_reported():
+    with pytest.raises(RuntimeError, match="no_such_module"):
+        ImportProbe("no_such_module")
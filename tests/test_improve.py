@@ -0,0 +1,57 @@
+import numpy as np
+from models.cost_matrices import INFEASIBLE
+from solver.improve import ImproveTour, ExchangeDeltas
+
+
+def asymmetric(n=30, seed=0):
+    rng = np.random.default_rng(seed)
+    matrix = rng.integers(1, 1000, (n, n))
+    np.fill_diagonal(matrix, 0)
+    return matrix
+
+
+def cost(matrix, route):
+    return int(sum(matrix[i, j] for i, j in zip(route[:-1], route[1:])))
+
+
+def test_exchange_deltas_match_the_recomputed_cost():
+    matrix = asymmetric()
+    tour = np.random.default_rng(1).permutation(30)
+    a, b, c = np.sort(np.random.default_rng(2).choice(np.arange(30), (200, 3)), axis=1).T
+    keep = (a < b) & (b < c)
+    a, b, c = a[keep], b[keep], c[keep]
+
+    before = cost(matrix, list(tour) + [tour[0]])
+    for move, delta in zip(zip(a, b, c), ExchangeDeltas(matrix, tour, a, b, c)):
+        lo, mid, hi = move
+        moved = np.concatenate([tour[:lo + 1], tour[mid + 1:hi + 1], tour[lo + 1:mid + 1], tour[hi + 1:]])
+        assert cost(matrix, list(moved) + [moved[0]]) - before == delta
+
+
+def test_improve_tour_on_an_asymmetric_matrix():
+    matrix = asymmetric(40, seed=3)
+    route = [0] + list(np.random.default_rng(4).permutation(np.arange(1, 40))) + [0]
+
+    previous = cost(matrix, route)
+    for passes in range(1, 6):
+        result = ImproveTour(matrix, route, duration=10, max_passes=passes)
+        assert result.route[0] == result.route[-1] == 0
+        assert sorted(result.route[:-1]) == list(range(40))
+        assert result.before == cost(matrix, route)
+        assert result.after == cost(matrix, result.route)
+        assert result.after <= previous
+        previous = result.after
+    assert previous < cost(matrix, route)
+
+
+def test_improve_tour_gets_rid_of_infeasible_arcs():
+    matrix = asymmetric(25, seed=5)
+    route = [0] + list(range(1, 25)) + [0]
+    # Block a few arcs of the starting tour, one way only
+    for i in (3, 10, 17):
+        matrix[route[i], route[i + 1]] = INFEASIBLE
+
+    result = ImproveTour(matrix, route, duration=10)
+    assert sorted(result.route[:-1]) == list(range(25))
+    assert result.after == cost(matrix, result.route) < INFEASIBLE
+    assert all(matrix[i, j] < INFEASIBLE for i, j in zip(result.route[:-1], result.route[1:]))
@@ -0,0 +1,114 @@
+import numpy as np
+from config import quantize
+from models.cost_matrices import CostMatrices, BoxPairs, INFEASIBLE
+from utils.spatial_index import ZoneHits
+from solver.tsp_solver import Reoptimise, GetRoute
+
+
+def locations(n=40, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.uniform(25, 49, n), rng.uniform(-124, -67, n)])
+
+
+def all_pairs_through(world, zone):
+    i, j = np.triu_indices(world.num, 1)
+    lat, lon = world.locations[:, 0], world.locations[:, 1]
+    route, _ = ZoneHits(lon[i], lat[i], lon[j], lat[j], np.atleast_2d(zone))
+    return i[route], j[route]
+
+
+def rebuilt(points, scaler):
+    world = CostMatrices(points, seed=0)
+    world.scaler = scaler
+    world.time = None
+    return world
+
+
+def test_box_pairs_cover_every_route_near_the_box():
+    rng = np.random.default_rng(3)
+    x, y = rng.uniform(0, 10, 60), rng.uniform(0, 10, 60)
+    box = (3, 6, 2, 5)
+    found = set()
+    for i, j in BoxPairs(x, y, box, max_pairs=50):
+        assert (i < j).all()
+        found.update(zip(i.tolist(), j.tolist()))
+    for i in range(60):
+        for j in range(i + 1, 60):
+            overlaps = (max(x[i], x[j]) >= box[0] and min(x[i], x[j]) <= box[1] and
+                        max(y[i], y[j]) >= box[2] and min(y[i], y[j]) <= box[3])
+            assert overlaps == ((i, j) in found)
+
+
+def test_routes_through_matches_all_pairs():
+    world = CostMatrices(locations(), seed=0)
+    rng = np.random.default_rng(5)
+    zones = [[radius, rng.uniform(25, 49), rng.uniform(-124, -67), 1, 1.5] for radius in (0.5, 2, 6, 30)]
+    for zone in zones:
+        i, j = world.RoutesThrough(zone)
+        a, b = all_pairs_through(world, zone)
+        assert set(zip(i.tolist(), j.tolist())) == set(zip(a.tolist(), b.tolist()))
+
+
+def test_zone_updates_match_a_rebuilt_world():
+    points = locations()
+    world = CostMatrices(points, seed=0)
+    before = world.time.copy()
+    world.TakeDirty()
+
+    zone = [5, 38, -100, 3, 2.5]
+    k = world.AddZone(*zone)
+    assert np.allclose(world.time, rebuilt(points, world.scaler.copy()).time, rtol=1e-5)
+
+    i, j = world.RoutesThrough(zone)
+    dirty = world.TakeDirty()
+    assert dirty == set(zip(i.tolist(), j.tolist())) | set(zip(j.tolist(), i.tolist()))
+    changed = set(zip(*np.nonzero(world.time != before)))
+    assert changed and changed <= dirty
+
+    world.MoveZone(k, 42, -90, radius=3)
+    assert np.allclose(world.time, rebuilt(points, world.scaler.copy()).time, rtol=1e-5)
+    world.RemoveZone(k)
+    assert np.allclose(world.time, before, rtol=1e-5)
+    assert world.TakeDirty() and world.TakeDirty() == set()
+
+
+def test_block_and_unblock_keep_the_quantized_copy_current():
+    world = CostMatrices(locations(), seed=0)
+    quantized = world.Quantized("time")
+    i, j = next((i, j) for i in range(world.num) for j in range(world.num) if i != j and not world.infeasible[i, j])
+    world.TakeDirty()
+
+    world.BlockEdge(i, j)
+    assert world.infeasible[i, j] and world.infeasible[j, i]
+    assert world.TakeDirty() == {(i, j), (j, i)}
+    assert quantized[i, j] == quantized[j, i] == INFEASIBLE
+    # The kept copy is patched in place, and matches one built from scratch
+    assert world.Quantized("time") is quantized
+    assert np.array_equal(quantized, world.Quantized("time", scale=quantize))
+
+    world.UnblockEdge(i, j)
+    assert not world.infeasible[i, j] and not world.infeasible[j, i]
+    assert np.array_equal(quantized, CostMatrices(locations(), seed=0).Quantized("time"))
+
+
+def test_safety_region_scales_only_routes_through_it():
+    world = CostMatrices(locations(), seed=0)
+    before = world.safety.copy()
+    world.TakeDirty()
+    world.SetSafetyRegion(38, -100, 6, 2.0)
+    i, j = world.RoutesThrough([6, 38, -100, 0, 1])
+    assert len(i)
+    assert np.allclose(world.safety[i, j], 2 * before[i, j]) and np.allclose(world.safety[j, i], 2 * before[j, i])
+    untouched = np.ones_like(before, dtype=bool)
+    untouched[i, j] = untouched[j, i] = False
+    assert np.array_equal(world.safety[untouched], before[untouched])
+    assert world.TakeDirty() == set(zip(i.tolist(), j.tolist())) | set(zip(j.tolist(), i.tolist()))
+
+
+def test_reoptimise_gives_a_tour_after_an_update():
+    world = CostMatrices(locations(20), seed=0)
+    route = list(range(20)) + [0]
+    world.AddZone(5, 38, -100, 1, 3.0)
+    manager, routing, solution = Reoptimise(world.Quantized("time"), route, world.TakeDirty(), duration=0.2)
+    tour = GetRoute(manager, routing, solution)
+    assert tour[0] == tour[-1] == 0 and sorted(tour[:-1]) == list(range(20))
@@ -0,0 +1,34 @@
+import itertools
+import numpy as np
+from solver.pareto import NonDominated, Hypervolume
+
+
+def test_non_dominated():
+    points = [[1, 2, 3], [2, 1, 3], [2, 2, 3], [1, 2, 3], [0, 5, 5], [3, 3, 3]]
+    # Equal points do not dominate each other
+    assert NonDominated(points).tolist() == [True, True, False, True, True, False]
+    assert NonDominated(np.empty((0, 3))).tolist() == []
+
+
+def test_hypervolume_of_known_fronts():
+    reference = np.ones(3)
+    assert Hypervolume([[0, 0, 0]], reference) == 1
+    # Two boxes of 0.25 and 0.5, overlapping in 0.125
+    assert np.isclose(Hypervolume([[0, 0.5, 0.5], [0.5, 0, 0]], reference), 0.625)
+    # Dominated points and points past the reference add nothing
+    assert np.isclose(Hypervolume([[0, 0.5, 0.5], [0.5, 0, 0], [0.6, 0.6, 0.6], [2, 0, 0]], reference), 0.625)
+
+
+def test_hypervolume_matches_counting_unit_cubes():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        points = rng.integers(0, 8, (rng.integers(1, 10), 3))
+        covered = sum(np.any(np.all(points <= cell, axis=1)) for cell in itertools.product(range(8), repeat=3))
+        assert np.isclose(Hypervolume(points, np.full(3, 8)), covered)
+
+
+def test_hypervolume_without_finite_points_is_zero():
+    assert Hypervolume(np.empty((0, 3))) == 0.0
+    assert Hypervolume([[1, np.inf, 2], [np.inf, 1, 1]]) == 0.0
+    # Infinite points are left out of the normalisation too
+    assert Hypervolume([[0, 0, 0], [1, np.inf, 1]]) == Hypervolume([[0, 0, 0]])
@@ -0,0 +1,59 @@
+import numpy as np
+from models.cost_matrices import CostMatrices
+from solver.pareto_local_search import TourCosts, TwoOptMoves, OrOptMoves, ApplyMove, Archive, ParetoLocalSearch
+
+
+def stacked(n=20, seed=0):
+    rng = np.random.default_rng(seed)
+    matrices = rng.integers(1, 1000, (3, n, n))
+    for matrix in matrices:
+        np.fill_diagonal(matrix, 0)
+    return matrices
+
+
+def dominated(costs):
+    # Whether any row is dominated by (or equal to) another
+    return any(np.all(costs[j] <= costs[i]) for i in range(len(costs)) for j in range(len(costs)) if i != j)
+
+
+def test_move_deltas_match_full_re_evaluation():
+    matrices = stacked()
+    rng = np.random.RandomState(1)
+    tour = np.concatenate([[0], 1 + np.random.default_rng(2).permutation(19)])
+    forward = matrices[:, tour, np.roll(tour, -1)].astype(np.int64)
+    cost = TourCosts(matrices, tour)
+
+    moves = [("2opt", *TwoOptMoves(matrices, tour, forward, 10 ** 6, rng))]
+    moves += [(length, *OrOptMoves(matrices, tour, forward, length, 10 ** 6, rng)) for length in (1, 2, 3)]
+    for kind, a, b, delta in moves:
+        assert len(a) > 0
+        for k in range(len(a)):
+            moved = ApplyMove(tour, kind, a[k], b[k])
+            assert moved[0] == 0 and sorted(moved) == list(range(20))
+            assert np.array_equal(TourCosts(matrices, moved) - cost, delta[:, k])
+
+
+def test_archive_stays_non_dominated():
+    rng = np.random.default_rng(3)
+    archive = Archive(max_size=15)
+    for k in range(500):
+        cost = rng.integers(0, 100, 3)
+        added = archive.Add(np.array([k]), cost)
+        if not added:
+            assert np.any(np.all(archive.costs <= cost, axis=1))
+        assert not dominated(archive.costs)
+        assert len(archive.tours) == len(archive.costs) == len(archive.explored) <= 15
+
+    # Dominating everything leaves just the one tour
+    assert archive.Add(np.array([-1]), np.array([-1, -1, -1]))
+    assert len(archive.tours) == 1 and archive.costs.tolist() == [[-1, -1, -1]]
+
+
+def test_search_returns_a_non_dominated_front():
+    rng = np.random.default_rng(4)
+    points = np.column_stack([rng.uniform(25, 49, 25), rng.uniform(-124, -67, 25)])
+    front = ParetoLocalSearch(CostMatrices(points, seed=4), duration=1, seed=0)
+    assert len(front.records) >= 2
+    for record in front.records:
+        assert record.route[0] == record.route[-1] == 0 and sorted(record.route[:-1]) == list(range(25))
+    assert not dominated(np.array([[r.distance, r.time, r.safety] for r in front.records]))
@@ -0,0 +1,43 @@
+import numpy as np
+from utils.plotting import PlotEdges
+from models.sparse_cost_matrices import NearestNeighbours
+
+
+def locations(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.uniform(25, 49, n), rng.uniform(-124, -67, n)])
+
+
+def test_every_route_while_there_are_few():
+    i, j = PlotEdges(locations(20), max_edges=190)
+    assert len(i) == 190 and (i < j).all()
+
+
+def test_sample_is_exactly_max_edges_spread_over_every_node():
+    num = 2000
+    for max_edges in (1000, 100000, num * (num - 1) // 2 - 1):
+        i, j = PlotEdges(locations(num), max_edges=max_edges)
+        assert len(i) == max_edges
+        assert (i < j).all() and i.min() >= 0 and j.max() < num
+        assert len(np.unique(i * num + j)) == max_edges
+
+    # Every route as likely as any other, so each node is at either end of about 2 * max_edges / num of them, whatever its number
+    i, j = PlotEdges(locations(num), max_edges=100000, seed=1)
+    ends = np.bincount(np.concatenate([i, j]), minlength=num)
+    assert np.all(ends > 0)
+    quarters = ends.reshape(4, -1).sum(axis=1)
+    assert np.allclose(quarters / quarters.mean(), 1, atol=0.03)
+
+    assert np.array_equal(PlotEdges(locations(num), max_edges=1000)[0], PlotEdges(locations(num), max_edges=1000)[0])
+
+
+def test_nearest_neighbour_routes_are_never_cut():
+    points = locations(3000)
+    i, j = PlotEdges(points, max_edges=1000, k=5)
+    assert len(i) > 1000 and (i < j).all()
+
+    drawn = set((i * 3000 + j).tolist())
+    nearest = NearestNeighbours(points, 5)
+    for a in range(3000):
+        for b in nearest[a]:
+            assert min(a, b) * 3000 + max(a, b) in drawn
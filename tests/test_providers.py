@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from data.providers import LocationProvider, RandomProvider, CachedProvider, AsyncOpenAIProvider, FileProvider
+from data.mock_server import MockLocationServer
+
+
+def test_provider_must_implement_get_and_key():
+    class Partial(LocationProvider):
+        def get(self):
+            return np.zeros((2, 2))
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_random_provider_is_deterministic():
+    first = RandomProvider(30, seed=4).get()
+    assert first.shape == (30, 2)
+    assert np.array_equal(first, RandomProvider(30, seed=4).get())
+    assert RandomProvider(30, seed=4).key() != RandomProvider(30, seed=5).key()
+
+
+def test_cached_provider_reads_back_from_disk(tmp_path):
+    calls = []
+
+    class Counting(LocationProvider):
+        def get(self):
+            calls.append(1)
+            return RandomProvider(20, seed=1).get()
+
+        def key(self):
+            return "counting"
+
+    first = CachedProvider(Counting(), cache_dir=str(tmp_path)).get()
+    second = CachedProvider(Counting(), cache_dir=str(tmp_path)).get()
+    assert len(calls) == 1
+    assert np.array_equal(first, second)
+
+
+def test_async_provider_against_mock_server():
+    with MockLocationServer(count=20, bad_responses=1) as server:
+        sets = AsyncOpenAIProvider(api_key="test", base_url=server.url, retries=1, count=20).get_many(3)
+        requests = server.requests
+
+    assert len(sets) == 3
+    assert all(locations.shape == (20, 2) for locations in sets)
+    # The malformed first response is retried, so one set costs an extra request
+    assert requests == 4
+
+
+def test_async_provider_gives_up_after_retries():
+    with MockLocationServer(count=20, bad_responses=5) as server:
+        with pytest.raises(ValueError):
+            AsyncOpenAIProvider(api_key="test", base_url=server.url, retries=1, count=20).get_many(1)
+
+
+def test_file_provider_rejects_bad_files(tmp_path):
+    good = RandomProvider(10, seed=2).get()
+    np.savetxt(tmp_path / "good.csv", good, delimiter=",", header="lat,lon", comments="")
+    assert np.allclose(FileProvider(str(tmp_path / "good.csv")).get(), good)
+
+    (tmp_path / "words.csv").write_text("lat,lon\nnorth,west\n")
+    (tmp_path / "bad.json").write_text("[[40, -100], [40]]")
+    for name in ("words.csv", "bad.json"):
+        with pytest.raises(ValueError):
+            FileProvider(str(tmp_path / name)).get()
+
+
+def test_parquet_needs_lat_and_lon_columns(tmp_path):
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("pyarrow")
+    good = RandomProvider(10, seed=2).get()
+    pd.DataFrame({"Latitude": good[:, 0], "Longitude": good[:, 1]}).to_parquet(tmp_path / "good.parquet")
+    assert np.allclose(FileProvider(str(tmp_path / "good.parquet")).get(), good)
+
+    pd.DataFrame({"x": good[:, 0], "y": good[:, 1]}).to_parquet(tmp_path / "bad.parquet")
+    with pytest.raises(ValueError, match="lat and lon"):
+        FileProvider(str(tmp_path / "bad.parquet")).get()
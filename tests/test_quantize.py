@@ -0,0 +1,103 @@
+import numpy as np
+from models.cost_matrices import CostMatrices, QuantizeCosts, INFEASIBLE
+from solver.solve_pool import BlendMatrices
+from solver.tsp_solver import TSPSolver, GetRoute, QuantizeMatrix
+
+
+def locations(n=30, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.uniform(25, 49, n), rng.uniform(-124, -67, n)])
+
+
+def test_capped_costs_never_reach_a_blocked_route():
+    cap = INFEASIBLE // 16
+    quantized = QuantizeCosts(np.array([1e30, np.inf, 5.0]), scale=1)
+    assert quantized.tolist() == [cap, cap, 5]
+    assert QuantizeCosts(np.array([1.0, 2.0]), np.array([False, True]), scale=1).tolist() == [1, INFEASIBLE]
+
+    # Up to 16 capped routes add up in int32 without wrapping, and 2 of them (in and out of a major node) are still well under
+    # one blocked route
+    assert QuantizeCosts(np.full(16, 1e30), scale=1).sum(dtype=np.int32) == 16 * cap
+    assert 2 * cap < INFEASIBLE
+
+
+def test_a_tour_through_a_major_node_beats_a_blocked_route():
+    rng = np.random.default_rng(1)
+    points = rng.random((8, 2)) * 1000
+    matrix = QuantizeCosts(np.sqrt(((points[:, None] - points[None]) ** 2).sum(axis=-1)), scale=1)
+    matrix[3, :] = matrix[:, 3] = QuantizeCosts(np.full(8, 1e30), scale=1)          #Node 3 has a major issue
+    matrix[3, 3] = 0
+    blocked = np.zeros(matrix.shape, dtype=bool)
+    blocked[0, 1:3] = blocked[1:3, 0] = True
+    matrix[blocked] = INFEASIBLE
+
+    route = GetRoute(*TSPSolver(matrix, duration=1))
+    assert sorted(route[:-1]) == list(range(8))
+    assert not blocked[route[:-1], route[1:]].any()
+
+
+def test_blocked_only_masks_time():
+    world = CostMatrices(locations(), seed=2)
+    world.BlockEdge(4, 9)
+    assert world.Blocked("distance", 4, 9) is None and world.Blocked("safety", 4) is None
+    assert world.Blocked("time", 4, 9) and world.Blocked("time", 9, 4)
+
+    assert world.Quantized("time")[4, 9] == INFEASIBLE
+    for name in ("distance", "safety"):
+        quantized = world.Quantized(name)
+        assert quantized[4, 9] < INFEASIBLE
+        assert quantized[4, 9] == QuantizeCosts(getattr(world, name)[4, 9])
+
+
+def test_quantized_fills_out():
+    world = CostMatrices(locations(), seed=3, block_size=100)
+    for name in ("distance", "time", "safety"):
+        out = np.full((world.num, world.num), -1, dtype=np.int32)
+        assert world.Quantized(name, out=out) is out
+        # Not kept, since the caller owns out
+        assert name not in world.quantized
+        assert np.array_equal(out, world.Quantized(name))
+
+        # Once a copy is kept, out gets a copy of it
+        again = np.zeros_like(out)
+        assert world.Quantized(name, out=again) is again
+        assert np.array_equal(again, out)
+
+
+def test_blockwise_blend_matches_the_one_shot_blend():
+    # More than one block of rows (1000000 // 1100 = 909 rows a block)
+    n = 1100
+    rng = np.random.default_rng(4)
+    matrices = rng.integers(0, 100000, (3, n, n), dtype=np.int32)
+    matrices[1][rng.random((n, n)) < 0.01] = INFEASIBLE
+
+    for weights in ((0.3, 0.3, 0.4), (1.0, 0.0, 0.0), (0.0, 0.5, 0.5), (0.25, 0.0, 0.75)):
+        expected = np.zeros((n, n))
+        for w, matrix in zip(weights, matrices):
+            if w != 0:
+                expected += w * matrix
+        expected = np.rint(expected).astype(np.int64)
+        if weights[1] != 0:
+            expected[matrices[1] == INFEASIBLE] = INFEASIBLE
+
+        blend = BlendMatrices(matrices, weights)
+        assert blend.dtype == np.int64
+        assert np.array_equal(blend, expected)
+
+
+def test_quantize_matrix_passes_integer_matrices_through():
+    matrix = np.arange(16, dtype=np.int64).reshape(4, 4)
+    assert QuantizeMatrix(matrix) is matrix
+
+    small = matrix.astype(np.int32)
+    assert QuantizeMatrix(small).dtype == np.int64
+    assert np.array_equal(QuantizeMatrix(small), matrix)
+
+    # Out of range integers are still capped, and floats still truncated
+    huge = matrix.copy()
+    huge[0, 1] = np.iinfo(np.int64).max
+    assert QuantizeMatrix(huge)[0, 1] == np.iinfo(np.int64).max // 8
+    capped = QuantizeMatrix(np.array([[0.0, 2.7], [1e30, 0.0]]))
+    assert capped[0, 1] == 2
+    # The float cap rounds to the nearest double, but a whole tour of them still fits
+    assert 2 * int(capped[1, 0]) <= np.iinfo(np.int64).max
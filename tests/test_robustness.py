@@ -0,0 +1,43 @@
+import numpy as np
+from models.cost_matrices import CostMatrices
+from solver.robustness import DetourCosts, ScoreTours, WORLD_MAJOR
+
+
+def world_with_major(n=30):
+    rng = np.random.default_rng(1)
+    points = np.column_stack([rng.uniform(25, 49, n), rng.uniform(-124, -67, n)])
+    for seed in range(200):
+        world = CostMatrices(points, seed=seed)
+        if world.major is not None and world.infeasible.any():
+            return world
+    raise AssertionError("no seed gave a major issue")
+
+
+def test_detours_avoid_blocked_legs_and_the_major_issue():
+    world = world_with_major()
+    weights = np.array([0.3, 0.3, 0.4])
+    blend = world.Weighted(weights).astype(np.float64)
+    u = np.array([i for i in range(world.num) for j in range(world.num) if i != j])
+    v = np.array([j for i in range(world.num) for j in range(world.num) if i != j])
+    detours = DetourCosts(world, u, v, weights)
+
+    for k, (i, j) in enumerate(zip(u, v)):
+        options = [w for w in range(world.num)
+                   if w not in (i, j) and not world.infeasible[i, w] and not world.infeasible[w, j]]
+        if not options:
+            continue
+        w = min(options, key=lambda w: blend[i, w] + blend[w, j])
+        assert not world.infeasible[i, w] and not world.infeasible[w, j]
+        if world.major not in (i, j):
+            assert w != world.major or all(option == world.major for option in options)
+        assert np.isclose(detours[k, 0], world.distance[i, w] + world.distance[w, j], rtol=1e-5)
+        assert detours[k, 1] < WORLD_MAJOR
+
+
+def test_score_tours_is_finite():
+    world = world_with_major()
+    route = list(range(world.num)) + [0]
+    costs, infeasible, detours = ScoreTours(world, [route], scenarios=200, seed=0)
+    assert costs.shape == (1, 200, 4)
+    assert np.isfinite(costs).all()
+    assert infeasible.shape == (1, 200)
@@ -0,0 +1,134 @@
+import json
+import threading
+import http.client
+import pytest
+from urllib.parse import urlparse
+from service import RoutingService, ServiceClient, HTTPError, QuantizeWeights, CheckDuration
+
+
+@pytest.fixture(scope="module")
+def service(tmp_path_factory):
+    # Seeded worlds go through the world cache, which lives under the working directory
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(tmp_path_factory.mktemp("service"))
+        with RoutingService(max_workers=2, duration=0.2) as running:
+            yield running
+
+
+@pytest.fixture
+def client(service):
+    client = ServiceClient(service.url)
+    yield client
+    client.Close()
+
+
+def test_quantize_weights_and_duration():
+    assert QuantizeWeights([1, 1, 2]) == (0.25, 0.25, 0.5)
+    for weights in ([1, 1], [-1, 1, 1], [0, 0, 0], [float("nan"), 1, 1], [float("inf"), 1, 1], ["x", 1, 1]):
+        with pytest.raises(ValueError):
+            QuantizeWeights(weights)
+    assert CheckDuration(None) is None
+    assert CheckDuration(2) == 2.0
+    for duration in ("x", -1, float("nan"), float("inf"), True, [1]):
+        with pytest.raises(ValueError):
+            CheckDuration(duration)
+
+
+def test_cache_hit(client):
+    world = client.LoadWorld(nodes=15, seed=1)
+    assert client.LoadWorld(nodes=15, seed=1) == world
+
+    first = client.Solve(world, (0.5, 0.2, 0.3))
+    second = client.Solve(world, (0.5001, 0.2, 0.3))
+    assert not first["cached"] and second["cached"]
+    assert second["route"] == first["route"]
+    assert first["duration"] == 0.2
+    assert sorted(first["route"][:-1]) == list(range(15))
+
+
+def test_identical_requests_share_one_solve(service, client):
+    world = client.LoadWorld(nodes=15, seed=2)
+    before = client.Stats()
+    barrier = threading.Barrier(3)
+    results = []
+
+    def solve():
+        other = ServiceClient(service.url)
+        barrier.wait()
+        results.append(other.Solve(world, (0.1, 0.1, 0.8), duration=1.0))
+        other.Close()
+
+    threads = [threading.Thread(target=solve) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    after = client.Stats()
+    assert after["solves"] - before["solves"] == 1
+    assert sum(result["coalesced"] for result in results) == 2
+    assert len(set(tuple(result["route"]) for result in results)) == 1
+
+
+@pytest.mark.parametrize("body, status", [
+    ({"world": "nope"}, 404),
+    ({"world": [1]}, 400),
+    ({"world": None}, 400),
+    ({"weights": [1, 1]}, 400),
+    ({"weights": [float("nan"), 1, 1]}, 400),
+    ({"duration": "x"}, 400),
+    ({"duration": float("nan")}, 400),
+    ({"duration": -1}, 400),
+])
+def test_bad_solves(client, body, status):
+    world = client.LoadWorld(nodes=15, seed=1)
+    with pytest.raises(HTTPError) as error:
+        client.Request("POST", "/solve", {"world": world, **body})
+    assert error.value.status == status
+
+
+def test_bad_requests(service, client):
+    with pytest.raises(HTTPError) as error:
+        client.Request("GET", "/nowhere")
+    assert error.value.status == 404
+    with pytest.raises(HTTPError) as error:
+        client.Request("DELETE", "/solve")
+    assert error.value.status == 405
+    with pytest.raises(HTTPError) as error:
+        client.Request("POST", "/worlds", {"nodes": "many"})
+    assert error.value.status == 400
+
+    parsed = urlparse(service.url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port)
+    connection.request("POST", "/solve", body=b"{not json")
+    response = connection.getresponse()
+    assert response.status == 400 and "Bad JSON" in json.loads(response.read())["error"]
+    connection.close()
+
+
+@pytest.mark.parametrize("body", [
+    {"nodes": -5},
+    {"nodes": 1},
+    {"nodes": 2.5},
+    {"congestion": -1},
+    {"seed": "abc"},
+    {"seed": 1.5},
+    {"seed": -1},
+    {"seed": True},
+    {"locations": [[40, -100], [41]]},
+    {"locations": [[40, -100], [40, -100]]},
+    {"locations": [[40, -100], [0, 0]]},
+    {"locations": [[40, -100]]},
+    {"locations": "no_such_file.csv"},
+    {"locations": "no_such_source"},
+    {"locations": 7},
+])
+def test_bad_worlds(client, body):
+    with pytest.raises(HTTPError) as error:
+        client.Request("POST", "/worlds", {"nodes": 10, **body})
+    assert error.value.status == 400
+
+
+def test_world_from_a_list(client):
+    world = client.LoadWorld(locations=[[40, -100], [41, -101], [42, -99]], seed=None)
+    assert sorted(client.Solve(world, (0.5, 0.2, 0.3))["route"][:-1]) == [0, 1, 2]
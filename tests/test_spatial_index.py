@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from utils.geometry import RouteCircleIntersectMany
+from utils.spatial_index import ZoneGrid, ZoneHits
+
+
+def zones(count, seed=0, large=5):
+    rng = np.random.default_rng(seed)
+    radius = rng.uniform(0.2, 1.5, count)
+    radius[:large] = rng.uniform(8, 15, large)         #Far bigger than a cell, so kept aside by the grid
+    return np.column_stack([radius, rng.uniform(25, 49, count), rng.uniform(-124, -67, count),
+                            rng.integers(0, 4, count), rng.uniform(0.5, 2, count)])
+
+
+def routes(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-124, -67, count), rng.uniform(25, 49, count), rng.uniform(-124, -67, count), rng.uniform(25, 49, count)
+
+
+def grid_line_routes(grid):
+    # Routes exactly along vertical and horizontal grid lines, and diagonals through grid corners
+    xs = grid.x0 + grid.h * np.arange(2, grid.nx - 2, 3)
+    ys = grid.y0 + grid.h * np.arange(2, grid.ny - 2, 3)
+    y_low, y_high = grid.y0 + grid.h, grid.y0 + grid.h * (grid.ny - 1)
+    x_low, x_high = grid.x0 + grid.h, grid.x0 + grid.h * (grid.nx - 1)
+    steps = np.arange(1, min(grid.nx, grid.ny) - 2)
+    x1 = np.concatenate([xs, np.full(len(ys), x_low), np.full(len(steps), x_low)])
+    y1 = np.concatenate([np.full(len(xs), y_low), ys, np.full(len(steps), y_low)])
+    x2 = np.concatenate([xs, np.full(len(ys), x_high), x_low + grid.h * steps])
+    y2 = np.concatenate([np.full(len(xs), y_high), ys, y_low + grid.h * steps])
+    return x1, y1, x2, y2
+
+
+def brute_force(x1, y1, x2, y2, zones):
+    mask = RouteCircleIntersectMany(x1[:, None], y1[:, None], x2[:, None], y2[:, None],
+                                    zones[None, :, 2], zones[None, :, 1], zones[None, :, 0])
+    return np.nonzero(mask)
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_grid_hits_match_brute_force(seed):
+    scaler = zones(200, seed)
+    grid = ZoneGrid(scaler)
+    assert len(grid.large) >= 5
+
+    x1, y1, x2, y2 = [np.concatenate(parts) for parts in zip(routes(3000, seed), grid_line_routes(grid))]
+    route, zone = ZoneHits(x1, y1, x2, y2, scaler, grid, chunk=50000)
+    expected_route, expected_zone = brute_force(x1, y1, x2, y2, scaler)
+    assert np.array_equal(route, expected_route)
+    assert np.array_equal(zone, expected_zone)
+    # Without a grid, in chunks, gives the same
+    assert all(np.array_equal(a, b) for a, b in zip(ZoneHits(x1, y1, x2, y2, scaler, chunk=50000), (route, zone)))
+
+
+def test_cells_cover_every_point_of_a_route():
+    grid = ZoneGrid(zones(100, 1))
+    x1, y1, x2, y2 = routes(500, 1)
+    route, cell = grid.Cells(x1, y1, x2, y2)
+    visited = set((route * grid.nx * grid.ny + cell).tolist())
+
+    t = np.random.default_rng(2).random((500, 50))
+    x = x1[:, None] + t * (x2 - x1)[:, None]
+    y = y1[:, None] + t * (y2 - y1)[:, None]
+    cells = grid.Cell(y, grid.y0, grid.ny) * grid.nx + grid.Cell(x, grid.x0, grid.nx)
+    assert all(p * grid.nx * grid.ny + c in visited for p, row in enumerate(cells) for c in row)
+
+
+def test_a_route_through_grid_corners_enters_every_cell_on_the_diagonal():
+    grid = ZoneGrid(zones(100, 3))
+    start = 1
+    for steps in range(1, min(grid.nx, grid.ny) - 2):
+        x1, y1 = grid.x0 + grid.h * start, grid.y0 + grid.h * start
+        _, cells = grid.Cells(np.array([x1]), np.array([y1]), np.array([x1 + grid.h * steps]), np.array([y1 + grid.h * steps]))
+        assert set(k * grid.nx + k for k in range(start, start + steps)) <= set(cells.tolist())
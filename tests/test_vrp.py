@@ -0,0 +1,70 @@
+import numpy as np
+from config import quantize
+from models.cost_matrices import CostMatrices, INFEASIBLE
+from solver.vrp_solver import Fleet, SolveFleet, PolishRoute, SubMatrices
+
+
+def locations(n=40, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.uniform(25, 49, n), rng.uniform(-124, -67, n)])
+
+
+def route_time(world, route):
+    return SubMatrices(world, np.arange(world.num))[1][route[:-1], route[1:]].sum(dtype=np.int64)
+
+
+def check_plan(world, fleet, plan):
+    # Every stop is visited once or dropped, and every route runs from its depot back to it
+    stops = [node for route in plan.routes for node in route[1:-1]]
+    assert len(stops) == len(set(stops))
+    assert sorted(stops + plan.dropped) == list(range(1, world.num))
+    for route, depot in zip(plan.routes, fleet.Depots()):
+        assert route[0] == route[-1] == depot
+    # The routes are in world node numbers, so costing them on the world gives the plan's totals back
+    assert np.isclose(plan.distance, sum(world.distance[route[:-1], route[1:]].sum() for route in plan.routes), rtol=1e-5)
+
+
+def test_capacity_and_max_time_hold_even_after_polishing():
+    world = CostMatrices(locations(), seed=5)
+    fleet = Fleet(vehicles=4, demands=[0] + [1] * 39, capacities=10, max_time=150, drop_penalty=INFEASIBLE)
+    plan = SolveFleet(world, fleet, duration=1, polish=0.2)
+
+    check_plan(world, fleet, plan)
+    assert all(load <= 10 for load in plan.loads)
+    assert all(route_time(world, route) <= fleet.max_time * quantize for route in plan.routes)
+
+
+def test_stops_that_do_not_fit_are_dropped():
+    world = CostMatrices(locations(), seed=5)
+    fleet = Fleet(vehicles=3, demands=[0] + [1] * 39, capacities=5, drop_penalty=INFEASIBLE)
+    plan = SolveFleet(world, fleet, duration=1)
+
+    check_plan(world, fleet, plan)
+    assert all(load <= 5 for load in plan.loads)
+    assert len(plan.dropped) == 39 - 15
+
+
+def test_clusters_are_stitched_back_in_world_node_numbers():
+    world = CostMatrices(locations(60, seed=1), seed=6)
+    fleet = Fleet(vehicles=4, demands=[0] + [1] * 59, capacities=20, drop_penalty=INFEASIBLE)
+    plan = SolveFleet(world, fleet, duration=1, cluster_size=20, max_workers=2)
+
+    assert plan.clusters > 1
+    check_plan(world, fleet, plan)
+    assert plan.dropped == []
+    assert all(load <= 20 for load in plan.loads)
+
+
+def test_polishing_keeps_a_route_that_would_break_max_time():
+    route = [0, 1, 2, 3, 4, 5, 0]
+    # The given order is slow on the blend but the only quick one
+    time_matrix = np.full((6, 6), 100)
+    blend = np.ones((6, 6), dtype=np.int64)
+    for i, j in zip(route[:-1], route[1:]):
+        time_matrix[i, j] = 1
+        blend[i, j] = 1000
+
+    polished = PolishRoute(blend, route, 0.2)
+    assert polished != route and sorted(polished[:-1]) == sorted(route[:-1])
+    assert PolishRoute(blend, route, 0.2, time_matrix, max_time=50 / quantize) == route
+    assert PolishRoute(blend, route, 0.2, time_matrix, max_time=1000 / quantize) == polished
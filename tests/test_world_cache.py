@@ -0,0 +1,46 @@
+import numpy as np
+from models.cost_matrices import CostMatrices
+from models.world_cache import CachedWorld
+
+
+def locations(n=30, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.uniform(25, 49, n), rng.uniform(-124, -67, n)])
+
+
+def update(world):
+    k = world.AddZone(4, 38, -100, 0, 2.0)
+    world.MoveZone(k, 40, -95)
+    world.BlockEdge(1, 2)
+    world.SetSafetyRegion(35, -90, 5, 1.5)
+    world.RemoveZone(0)
+    return world.TakeDirty()
+
+
+def test_cached_world_matches_a_fresh_one(tmp_path):
+    points = locations()
+    CachedWorld(points, 0, cache_dir=str(tmp_path))
+    cached = CachedWorld(points, 0, cache_dir=str(tmp_path))
+    fresh = CostMatrices(points, seed=0)
+
+    for name in ("block_size", "zone_index", "safety_seed", "major"):
+        assert getattr(cached, name) == getattr(fresh, name)
+    assert np.dtype(cached.dtype) == np.dtype(fresh.dtype)
+    for name in ("distance", "time", "safety", "infeasible", "scaler"):
+        assert np.array_equal(getattr(cached, name), getattr(fresh, name))
+
+
+def test_cached_world_takes_incremental_updates(tmp_path):
+    points = locations()
+    CachedWorld(points, 0, cache_dir=str(tmp_path))
+    cached = CachedWorld(points, 0, cache_dir=str(tmp_path))
+    fresh = CostMatrices(points, seed=0)
+
+    assert update(cached) == update(fresh)
+    for name in ("time", "safety", "infeasible", "scaler"):
+        assert np.array_equal(getattr(cached, name), getattr(fresh, name))
+    # The copy-on-write maps never write back to the cache
+    again = CachedWorld(points, 0, cache_dir=str(tmp_path))
+    untouched = CostMatrices(points, seed=0)
+    for name in ("time", "safety", "infeasible"):
+        assert np.array_equal(getattr(again, name), getattr(untouched, name))
@@ -44,3 +44,33 @@ def RouteCircleIntersect(x1,y1, x2, y2, a1, b1, r):
     int2 = (-b - np.sqrt(D)) / (2*a)
 
     return (0<= int1 <= 1) or (0 <= int2 <= 1) or (int1 < 0 and int2 > 1)
+
+def RouteCircleIntersectMany(x1, y1, x2, y2, a1, b1, r):
+
+    """
+    Batched version of RouteCircleIntersect. The route endpoints are arrays of shape (P, 1) and the circles arrays of shape (1, Z)
+    (or anything else that broadcasts), and we get back a (P, Z) boolean mask of which routes pass through which circles.
+
+    The maths is exactly the same as above, so degenerate routes (both nodes at the same place) still never intersect.
+
+    """
+
+    dx = x2 - x1
+    dy = y2 - y1
+
+    fx = x1 - a1
+    fy = y1 - b1
+
+    a = dx*dx + dy*dy
+    b = 2 * (fx*dx + fy*dy)
+    c = fx*fx + fy*fy - r*r
+
+    D = b*b - 4*a*c
+    hit = D >= 0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        root = np.sqrt(np.where(hit, D, 0))
+        int1 = (-b + root) / (2*a)
+        int2 = (-b - root) / (2*a)
+
+    return hit & (((0 <= int1) & (int1 <= 1)) | ((0 <= int2) & (int2 <= 1)) | ((int1 < 0) & (int2 > 1)))
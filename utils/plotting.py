@@ -0,0 +1,215 @@
+import numpy as np
+
+# matplotlib is only imported inside the functions that draw, so importing this module (and everything that uses it, like
+# CostMatrices) stays cheap for runs that never plot
+
+MAX_EDGES = 100000      #Most routes drawn on one figure, past this we draw a sample (or just the k nearest neighbour routes)
+
+ZONE_NAMES = ["Hill", "Bad Terrain", "Good Terrain", "Bottleneck"]
+ZONE_COLOURS = ["yellow", "orange", "green", "red"]
+
+def PlotEdges(locations, max_edges=MAX_EDGES, k=None, seed=0):
+    """
+    Picks which routes (i < j) to draw, as (i, j) index arrays.
+
+    Every route is drawn while there are at most max_edges of them. Past that, with k set we draw every route between each node
+    and its k nearest neighbours (however many that is), and otherwise a repeatable random sample of exactly max_edges routes,
+    every route as likely as any other, so it is spread over the whole node range.
+
+    """
+    num = len(locations)
+    if max_edges is None or num * (num - 1) // 2 <= max_edges:
+        i, j = np.triu_indices(num, k=1)
+        return i, j
+
+    if k:
+        from models.sparse_cost_matrices import NearestNeighbours
+        nearest = NearestNeighbours(locations, k)
+        i = np.repeat(np.arange(num), nearest.shape[1])
+        j = nearest.ravel()
+        keys = np.unique(np.minimum(i, j) * num + np.maximum(i, j))
+        return keys // num, keys % num
+
+    # Exactly max_edges of the num * (num - 1) / 2 routes, numbered row by row along the upper triangle, without replacement
+    starts = np.concatenate([[0], np.cumsum(np.arange(num - 1, 0, -1))])
+    picked = np.sort(np.random.default_rng(seed).choice(starts[-1], max_edges, replace=False))
+    i = np.searchsorted(starts, picked, side="right") - 1
+    return i, picked - starts[i] + i + 1
+
+def EdgeCollection(locations, i, j, **kwargs):
+    """
+    One LineCollection for all the routes i -> j, instead of a Line2D per route. kwargs go to LineCollection (colors can be an
+    array with a colour per route).
+
+    """
+    from matplotlib.collections import LineCollection
+    points = locations[:, ::-1]
+    return LineCollection(np.stack([points[i], points[j]], axis=1), **kwargs)
+
+def _axes(fig, locations, title, size):
+    fig.set_size_inches(*size)
+    ax = fig.add_subplot()
+    x = locations[:,1]
+    y = locations[:,0]
+    ax.scatter(x, y, color="navy", zorder=10)
+    ax.set_title(title)
+    ax.set_xlabel("Longitude")
+    ax.set_ylabel("Latitude")
+    ax.grid()
+    ax.set_xlim(x.min()-5, x.max()+5)
+    ax.set_ylim(y.min()-5, y.max()+5)
+    return ax
+
+def DrawNetwork(fig, locations, i, j):
+    """
+    Our nodes and the routes between them.
+
+    """
+    ax = _axes(fig, locations, "Plot of Nodes and All Possible Routes in our TSP", (10, 8))
+    ax.add_collection(EdgeCollection(locations, i, j, colors="gray", alpha=0.35, linewidths=0.5))
+
+def DrawTimeEffect(fig, locations, scaler, i, j):
+    """
+    Our time affecting zones over our nodes and routes. Each kind of zone has its own colour, more opaque the more it scales time.
+
+    """
+    from matplotlib.collections import PatchCollection
+    from matplotlib.patches import Circle, Patch
+    from matplotlib.colors import to_rgba
+    ax = _axes(fig, locations, "Plot of Locations and Real World Time Distortions in our TSP", (12, 8))
+
+    scale = scaler[:,4]
+    span = scale.max() - scale.min()
+    alpha = 0.25 + 0.25 * ((scale - scale.min()) / span if span > 0 else 0)
+    kinds = scaler[:,3].astype(int)
+
+    handles = []
+    for kind in dict.fromkeys(kinds.tolist()):
+        zones = kinds == kind
+        circles = [Circle((lon, lat), radius) for radius, lat, lon in scaler[zones, :3]]
+        colours = np.tile(to_rgba(ZONE_COLOURS[kind]), (zones.sum(), 1))
+        colours[:, 3] = alpha[zones]
+        ax.add_collection(PatchCollection(circles, facecolors=colours, edgecolors=colours, zorder=5))
+        handles.append(Patch(color=ZONE_COLOURS[kind], alpha=0.5, label=ZONE_NAMES[kind]))
+
+    ax.add_collection(EdgeCollection(locations, i, j, colors="gray", alpha=0.15, linewidths=0.5, zorder=1))
+    ax.legend(handles=handles, bbox_to_anchor=(1.05, 1), loc="upper left")
+    ax.axis("equal")
+
+def DrawSafetyScale(fig, locations, i, j, safety):
+    """
+    Our nodes and routes, each route shaded by its safety cost. Darker colours imply less safe (and so costlier) routes.
+
+    """
+    from matplotlib import colormaps
+    ax = _axes(fig, locations, "Plot of Locations and Routes, shaded by safety level (darker is worse)", (10, 8))
+    span = safety.max() - safety.min() if len(safety) else 0
+    shade = (safety - safety.min()) / span if span > 0 else np.zeros(len(safety))
+    ax.add_collection(EdgeCollection(locations, i, j, colors=colormaps["YlOrRd"](shade), alpha=0.6, linewidths=1))
+    ax.axis("equal")
+
+def DrawRoute(ax, route, locations, title, color_code="blue"):
+    """
+    Plots a route on a given matplotlib axis.
+
+    """
+    x = locations[:,1]
+    y = locations[:,0]
+    route_x = x[np.asarray(route)]
+    route_y = y[np.asarray(route)]
+
+    ax.scatter(x, y, color="navy", zorder=10, s=20)
+    ax.plot(route_x, route_y, color=color_code, alpha=0.7, linewidth=1.5, zorder=5)
+
+    # Mark start/end
+    ax.scatter(route_x[0], route_y[0], color="green", s=50, label="Start", zorder=15)
+    ax.scatter(route_x[-1], route_y[-1], color="red", s=50, label="End", zorder=15)
+
+    ax.set_title(title)
+    ax.set_xlabel("Longitude")
+    ax.set_ylabel("Latitude")
+    ax.grid(True)
+
+def DrawCollage(fig, locations, panels):
+    """
+    Up to four routes side by side in a 2 x 2 collage. panels is a list of (route, title, colour).
+
+    """
+    fig.set_size_inches(20, 16)
+    axs = fig.subplots(2, 2).ravel()
+    for ax, (route, title, colour) in zip(axs, panels):
+        DrawRoute(ax, route, locations, title, color_code=colour)
+    fig.tight_layout()
+
+def DrawFleet(fig, locations, routes, title):
+    """
+    Every vehicle's route of a fleet plan on one figure, a colour per vehicle, with the depots marked.
+
+    """
+    from matplotlib import colormaps
+    ax = _axes(fig, locations, title, (12, 8))
+    colours = colormaps["tab20"](np.arange(len(routes)) % 20)
+    for vehicle, (route, colour) in enumerate(zip(routes, colours)):
+        if len(route) > 2:
+            ax.plot(locations[route, 1], locations[route, 0], color=colour, linewidth=1.5, zorder=5, label=f"Vehicle {vehicle}")
+    depots = sorted(set(route[0] for route in routes))
+    ax.scatter(locations[depots, 1], locations[depots, 0], color="red", marker="s", s=80, zorder=15, label="Depot")
+    if len(routes) <= 20:
+        ax.legend(bbox_to_anchor=(1.05, 1), loc="upper left")
+
+def DrawConvergence(fig, curves):
+    """
+    Solver improvement curves, one per (label, elapsed, relative objective, search time). Each curve is a step plot of the best
+    objective so far, carried on to the end of its search, with the first solution marked.
+
+    """
+    fig.set_size_inches(10, 6)
+    ax = fig.add_subplot()
+    for label, elapsed, objective, search_time in curves:
+        lines = ax.step(np.append(elapsed, search_time), np.append(objective, objective[-1]), where="post", label=label)
+        ax.scatter(elapsed[:1], objective[:1], color=lines[0].get_color(), zorder=5)
+    ax.set_title("Solver convergence (first solutions marked)")
+    ax.set_xlabel("Search time (s)")
+    ax.set_ylabel("Objective / final objective")
+    ax.set_yscale("log")
+    ax.grid(True)
+    if curves:
+        ax.legend()
+
+def Preload():
+    """
+    Imports the parts of matplotlib the Draw functions use. Worth calling before forking a pool of processes to render in, so
+    they all start with it loaded rather than each importing it on their first figure.
+
+    """
+    import matplotlib.figure, matplotlib.backends.backend_agg, matplotlib.collections, matplotlib.patches, matplotlib.colors
+
+def SaveFigure(draw, save_path, *args):
+    """
+    Draws a figure with draw(fig, *args) on a plain Agg canvas and saves it. No pyplot state is involved, so this is safe to run
+    in worker processes.
+
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    draw(fig, *args)
+    fig.savefig(save_path, bbox_inches="tight")
+
+def Render(draw, save_path, *args, pool=None):
+    """
+    Saves the figure draw(fig, *args) to save_path - in the background if a process pool is given, in which case the Future is
+    returned. Without a save_path the figure is shown in a pyplot window instead.
+
+    """
+    if save_path is None:
+        import matplotlib.pyplot as plt
+        draw(plt.figure(), *args)
+        plt.show()
+        return None
+
+    if pool is not None:
+        return pool.submit(SaveFigure, draw, save_path, *args)
+    SaveFigure(draw, save_path, *args)
+    return None
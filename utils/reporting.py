@@ -0,0 +1,39 @@
+import sys
+import numpy as np
+
+# Nodes written at a time by print_route
+CHUNK = 1000
+
+def FormatCosts(route_distance, route_time, route_safety):
+    """
+    A route's "cost" across the three domains of Distance, Time and Safety, as text ready to print.
+
+    """
+    plan_output = f"Distance: {np.round(route_distance, 2)} km\n"
+    plan_output += f"Time: {np.round(route_time,2)} hr\n"
+    plan_output += f"Safety: {np.round(route_safety,2)}\n"
+    return plan_output
+
+def FormatRoute(route, route_distance, route_time, route_safety):
+    """
+    A route and its "cost" across the three domains of Distance, Time and Safety, as text ready to print.
+
+    """
+    plan_output = "Route:\n"
+    plan_output += "".join(f" {node_index} ->" for node_index in route[:-1])
+    plan_output += f" {route[-1]}\n"
+    plan_output += FormatCosts(route_distance, route_time, route_safety)
+    return plan_output
+
+def print_route(route, route_distance, route_time, route_safety):
+    """
+    Prints out a route and its "cost" across the three domains of Distance, Time and Safety - the same text as FormatRoute, but
+    written CHUNK nodes at a time, so a 100k node route never becomes one giant string.
+
+    """
+    out = sys.stdout
+    out.write("Route:\n")
+    for start in range(0, len(route) - 1, CHUNK):
+        out.write("".join(f" {node_index} ->" for node_index in route[start:min(start + CHUNK, len(route) - 1)]))
+    out.write(f" {route[-1]}\n")
+    out.write(FormatCosts(route_distance, route_time, route_safety) + "\n")
@@ -0,0 +1,154 @@
+import numpy as np
+from utils.geometry import RouteCircleIntersectMany
+
+class ZoneGrid:
+    """
+    A uniform grid over our time zones (rows of [radius, lat, lon, type, scale] like TimeWorldElements gives us), so that each
+    route only has to be tested against the zones whose bounding boxes it actually passes through.
+
+    The cells are about the size of a typical zone. Each cell lists the zones whose box overlaps it, and a route is walked cell by
+    cell from one end to the other (every cell it enters is found from where it crosses the grid lines, no sampling). Zones that
+    are much bigger than a cell would be listed in hundreds of cells, so those few are kept aside and checked against every route.
+
+    """
+    def __init__(self, zones, cells=None, max_cells=256):
+        self.zones = zones
+        radius, cy, cx = zones[:,0], zones[:,1], zones[:,2]
+
+        extent = max((cx + radius).max() - (cx - radius).min(), (cy + radius).max() - (cy - radius).min(), 1e-9)
+        if cells is None:
+            cells = np.clip(extent / (2 * np.median(radius)), np.sqrt(len(zones)), max_cells)
+        self.h = extent / cells
+
+        self.large = np.nonzero(radius > 2 * self.h)[0]
+        small = np.nonzero(radius <= 2 * self.h)[0]
+
+        # A tiny margin, so a route running exactly along a grid line still sees the zones on both sides
+        margin = self.h * 1e-6
+        xmin, xmax = cx[small] - radius[small] - margin, cx[small] + radius[small] + margin
+        ymin, ymax = cy[small] - radius[small] - margin, cy[small] + radius[small] + margin
+
+        self.x0 = (cx - radius).min() - self.h
+        self.y0 = (cy - radius).min() - self.h
+        self.nx = int(np.ceil(((cx + radius).max() - self.x0) / self.h)) + 2
+        self.ny = int(np.ceil(((cy + radius).max() - self.y0) / self.h)) + 2
+
+        gx0, gx1 = self.Cell(xmin, self.x0, self.nx), self.Cell(xmax, self.x0, self.nx)
+        gy0, gy1 = self.Cell(ymin, self.y0, self.ny), self.Cell(ymax, self.y0, self.ny)
+
+        cell_ids = [np.empty(0, dtype=np.int64)]
+        zone_ids = [np.empty(0, dtype=np.int64)]
+        for k, zone in enumerate(small):
+            gx, gy = np.meshgrid(np.arange(gx0[k], gx1[k] + 1), np.arange(gy0[k], gy1[k] + 1))
+            ids = (gy * self.nx + gx).ravel()
+            cell_ids.append(ids)
+            zone_ids.append(np.full(len(ids), zone))
+
+        cell_ids = np.concatenate(cell_ids)
+        zone_ids = np.concatenate(zone_ids)
+
+        # CSR layout - the zones of cell c are cell_zones[cell_ptr[c]:cell_ptr[c+1]]
+        self.cell_zones = zone_ids[np.argsort(cell_ids, kind="stable")]
+        self.cell_ptr = np.zeros(self.nx * self.ny + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cell_ids, minlength=self.nx * self.ny), out=self.cell_ptr[1:])
+
+    def Cell(self, v, origin, count):
+        return np.clip(np.floor((v - origin) / self.h).astype(np.int64), 0, count - 1)
+
+    def Cells(self, x1, y1, x2, y2):
+        """
+        Returns (route, cell) index arrays of every grid cell each route passes through - the cell it starts in, plus the cell
+        it enters every time it crosses a vertical or horizontal grid line. Where a route goes through a grid corner both
+        crossings there give both cells beyond it, so no cell is missed to rounding, and the repeats only cost a candidate.
+
+        """
+        margin = self.h * 1e-6
+        routes = [np.arange(len(x1))]
+        cells = [self.Cell(y1, self.y0, self.ny) * self.nx + self.Cell(x1, self.x0, self.nx)]
+
+        for a1, a2, b1, b2, a0, b0, na, nb, along_x in ((x1, x2, y1, y2, self.x0, self.y0, self.nx, self.ny, True),
+                                                        (y1, y2, x1, x2, self.y0, self.x0, self.ny, self.nx, False)):
+            g1 = self.Cell(a1, a0, na)
+            g2 = self.Cell(a2, a0, na)
+            crossings = np.abs(g2 - g1)
+
+            route = np.repeat(np.arange(len(a1)), crossings)
+            k = np.arange(len(route)) - np.repeat(np.cumsum(crossings) - crossings, crossings) + 1
+            step = np.sign(g2 - g1)[route]
+
+            # Entering cell g1 + k*step through the grid line between it and the cell before
+            entered = g1[route] + k * step
+            line = a0 + self.h * np.where(step > 0, entered, entered + 1)
+            t = (line - a1[route]) / (a2[route] - a1[route])
+            crossing = b1[route] + t * (b2[route] - b1[route])
+
+            # Through (or a rounding error away from) a grid corner, the route enters the cells on both sides of the other line
+            other = self.Cell(crossing - margin, b0, nb)
+            after = self.Cell(crossing + margin, b0, nb)
+            corner = after != other
+            route = np.concatenate([route, route[corner]])
+            entered = np.concatenate([entered, entered[corner]])
+            other = np.concatenate([other, after[corner]])
+
+            routes.append(route)
+            cells.append(other * self.nx + entered if along_x else entered * self.nx + other)
+
+        return np.concatenate(routes), np.concatenate(cells)
+
+    def Candidates(self, x1, y1, x2, y2):
+        """
+        Returns (route, zone) index arrays of every zone whose box each route passes through (plus every large zone), for
+        routes given as 1D arrays of endpoints. A pair can be repeated when the route meets the zone in several cells.
+
+        """
+        route, cell = self.Cells(x1, y1, x2, y2)
+
+        # Expand every (route, cell) into the zones listed for that cell
+        counts = self.cell_ptr[cell + 1] - self.cell_ptr[cell]
+        route = np.repeat(route, counts)
+        offsets = np.arange(len(route)) - np.repeat(np.cumsum(counts) - counts, counts)
+        zone = self.cell_zones[np.repeat(self.cell_ptr[cell], counts) + offsets]
+
+        # Cheap check of the route's own box against the zone's box before the exact test
+        radius, cy, cx = self.zones[zone, 0], self.zones[zone, 1], self.zones[zone, 2]
+        near = ((np.minimum(x1[route], x2[route]) <= cx + radius) & (np.maximum(x1[route], x2[route]) >= cx - radius) &
+                (np.minimum(y1[route], y2[route]) <= cy + radius) & (np.maximum(y1[route], y2[route]) >= cy - radius))
+        route, zone = route[near], zone[near]
+
+        if len(self.large):
+            route = np.concatenate([route, np.repeat(np.arange(len(x1)), len(self.large))])
+            zone = np.concatenate([zone, np.tile(self.large, len(x1))])
+
+        return route, zone
+
+
+def ZoneHits(x1, y1, x2, y2, zones, grid=None, chunk=2000000):
+    """
+    Finds which routes pass through which zones, returned as (route, zone) index arrays of the hits, sorted by route then zone.
+
+    With a ZoneGrid the exact RouteCircleIntersect test is only run on the candidates the grid gives us, otherwise every route
+    is tested against every zone in one (routes x zones) mask, which is quicker when there are only a handful of zones.
+    Either way the routes are taken a chunk at a time, so that no more than about chunk route/zone tests are in memory at once.
+
+    """
+    radius, b1, a1 = zones[:,0], zones[:,1], zones[:,2]
+    if grid is None:
+        per_chunk = max(1, chunk // len(zones))
+    else:
+        per_chunk = max(1, chunk // (len(grid.large) + 2 * (grid.nx + grid.ny)))
+
+    routes = [np.empty(0, dtype=np.int64)]
+    hits = [np.empty(0, dtype=np.int64)]
+    for start in range(0, len(x1), per_chunk):
+        part = slice(start, start + per_chunk)
+        if grid is None:
+            mask = RouteCircleIntersectMany(x1[part, None], y1[part, None], x2[part, None], y2[part, None], a1[None, :], b1[None, :], radius[None, :])
+            route, zone = np.nonzero(mask)
+        else:
+            route, zone = grid.Candidates(x1[part], y1[part], x2[part], y2[part])
+            hit = RouteCircleIntersectMany(x1[part][route], y1[part][route], x2[part][route], y2[part][route], a1[zone], b1[zone], radius[zone])
+            route, zone = np.divmod(np.unique(route[hit] * len(zones) + zone[hit]), len(zones))
+        routes.append(route + start)
+        hits.append(zone)
+
+    return np.concatenate(routes), np.concatenate(hits)
@@ -1,6 +1,14 @@
 import numpy as np
 
-def TimeWorldElements(locations, num):
+def ZoneCount(num):
+    """
+    How many regional zones TimeWorldElements draws for num locations. They come first in CostMatrices.scaler, ahead of any
+    congestion layer.
+
+    """
+    return int(np.round(4 + 5 * np.log10(num)))   #Number of Zones = n^0.7 to n^0.9
+
+def TimeWorldElements(locations, num, rng=np.random):
     """
     This function takes in the locations array, and the number of locations.
 
@@ -22,6 +30,8 @@ def TimeWorldElements(locations, num):
     After creating these zones, we also show a plot of how this compares to our network. Then we scale our time matrix per route based on if it intersects with 
     any of these zones.
 
+    rng is where the random draws come from - the global np.random by default, or a seeded np.random.RandomState to rebuild the same zones.
+
 
     """
     x = locations[:,1]
@@ -35,27 +45,25 @@ def TimeWorldElements(locations, num):
         var = 0.2
     else:
         var = 0.1
-    NumberofZones = int(np.round(4 + 5 * np.log10(num)))   #Number of Zones = n^0.7 to n^0.9
-    gridx = np.linspace(longmin, longmax, num*1000)
-    gridy = np.linspace(latmin, latmax, num*1000)
+    NumberofZones = ZoneCount(num)
 
     timezones = np.ndarray((NumberofZones, 5))
-    radius = np.abs(np.random.uniform((latmax-latmin)*0.05, (latmax-latmin)*0.25, NumberofZones))
+    radius = np.abs(rng.uniform((latmax-latmin)*0.05, (latmax-latmin)*0.25, NumberofZones))
 
 
-    latloc = np.random.uniform(gridy.min(),gridy.max(),NumberofZones)
-    longloc = np.random.uniform(gridx.min(),gridx.max(),NumberofZones)
-    type = np.random.choice(4, NumberofZones, p=[0.3, 0.3, 0.25, 0.15])
+    latloc = rng.uniform(latmin,latmax,NumberofZones)
+    longloc = rng.uniform(longmin,longmax,NumberofZones)
+    type = rng.choice(4, NumberofZones, p=[0.3, 0.3, 0.25, 0.15])
     scale = np.ndarray(NumberofZones)
     for i in range(NumberofZones):
         if type[i] == 0:
-            scale[i] = np.random.uniform(1.25,1.75)
+            scale[i] = rng.uniform(1.25,1.75)
         elif type[i] == 1:
-            scale[i] = np.random.uniform(1.1,1.5)
+            scale[i] = rng.uniform(1.1,1.5)
         elif type[i] == 2:
-            scale[i] = np.random.uniform(0.5,0.9)
+            scale[i] = rng.uniform(0.5,0.9)
         elif type[i] == 3:
-            scale[i] = np.random.uniform(1.8,3)
+            scale[i] = rng.uniform(1.8,3)
 
     timezones[:,0] = radius
     timezones[:,1] = latloc
@@ -64,3 +72,25 @@ def TimeWorldElements(locations, num):
     timezones[:,4] = scale
 
     return timezones
+
+def CongestionZones(locations, count, rng=np.random):
+    """
+    Dense urban congestion layer - count small zones, each centred close to one of our locations, in the same
+    [radius, lat, lon, type, scale] format as TimeWorldElements so the two can simply be stacked.
+
+    Most of them are Bad Terrain (slow city streets), the rest Bottlenecks. They are much smaller than the regional zones,
+    so there can be thousands of them without every route going through most of them.
+
+    """
+    y = locations[:,0]
+    latspan = y.max() - y.min()
+
+    centres = locations[rng.randint(0, len(locations), count)]
+    zones = np.ndarray((count, 5))
+    zones[:,0] = rng.uniform(latspan*0.002, latspan*0.015, count)
+    zones[:,1] = centres[:,0] + rng.normal(0, latspan*0.01, count)
+    zones[:,2] = centres[:,1] + rng.normal(0, latspan*0.01, count)
+    zones[:,3] = rng.choice([1, 3], count, p=[0.7, 0.3])
+    zones[:,4] = np.where(zones[:,3] == 1, rng.uniform(1.1, 1.5, count), rng.uniform(1.8, 3, count))
+
+    return zones